@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Set
+
+from discord import AudioSource
+from discord.opus import Encoder as OpusEncoder
+from discord.player import OPUS_SILENCE
+
+from audio.pool import WarmSource
+from audio.sources import source_failed, source_pid
+from metrics import METRICS
+from my_types.audio import StreamKey
+
+
+_log = logging.getLogger(__name__)
+
+PCM_SILENCE = b'\x00' * OpusEncoder.FRAME_SIZE
+READER_BUFFER_FRAMES = 100  # 2 seconds of 20 ms frames
+REBUFFER_FRAMES = 25        # collected after underrun before playing again
+RECONNECT_DELAY = 0.5       # seconds, doubled after each failed reconnect
+RECONNECT_DELAY_MAX = 30
+
+SourceFactory = Callable[[StreamKey], AudioSource]
+FailureCallback = Callable[[StreamKey], None]
+
+
+class StationReader(AudioSource):
+    """
+    Lightweight per guild AudioSource.
+    Reads frames pushed by StationBroadcaster from bounded ring buffer
+    and plays silence while upstream is reconnecting
+    """
+
+    def __init__(self, broadcaster: 'StationBroadcaster') -> None:
+        self.__broadcaster = broadcaster
+        self.__silence = OPUS_SILENCE if broadcaster.key.opus else PCM_SILENCE
+        self.__frames = deque(maxlen=READER_BUFFER_FRAMES)
+        self.__wanted = 1   # frames needed before playing
+        self.__closed = False
+
+    @property
+    def key(self) -> StreamKey:
+        """Stream key of broadcaster this reader listen to"""
+        return self.__broadcaster.key
+
+    def push(self, frame: bytes) -> None:
+        """Called from broadcaster thread with next decoded frame"""
+        self.__frames.append(frame)
+
+    def close(self) -> None:
+        """Called from broadcaster thread when upstream is finished"""
+        self.__closed = True
+
+    def read(self) -> bytes:
+        if self.__wanted:
+            if len(self.__frames) < self.__wanted:
+                return b'' if self.__closed else self.__silence
+            self.__wanted = 0
+        try:
+            return self.__frames.popleft()
+        except IndexError:
+            if self.__closed:
+                return b''
+            self.__wanted = REBUFFER_FRAMES
+            METRICS.inc(f'audio.underruns.{self.key.radio}')
+            return self.__silence
+
+    def is_opus(self) -> bool:
+        return self.__broadcaster.key.opus
+
+    def cleanup(self) -> None:
+        self.__broadcaster.unsubscribe(self)
+
+
+class StationBroadcaster:  # pylint: disable=too-many-instance-attributes
+    """
+    Open upstream of radio station once and fan out every frame
+    to all subscribed StationReader. Dropped upstream is reconnected with backoff
+    """
+
+    def __init__(self, key: StreamKey, source_factory: SourceFactory,
+                 on_close: Callable[['StationBroadcaster'], None],
+                 on_failure: FailureCallback = None) -> None:
+        self.key = key
+        self.pid: int | None = None
+        self.__source_factory = source_factory
+        self.__on_close = on_close
+        self.__on_failure = on_failure
+        self.__readers: Set[StationReader] = set()
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__thread = threading.Thread(
+            target=self.__run, daemon=True, name=f'broadcast:{key.radio}')
+
+    @property
+    def listeners(self) -> int:
+        """Count of subscribed readers"""
+        return len(self.__readers)
+
+    def start(self) -> None:
+        """Start upstream reading thread"""
+        self.__thread.start()
+
+    def stop(self) -> None:
+        """Ask upstream thread to finish"""
+        self.__stopped.set()
+
+    def subscribe(self) -> StationReader | None:
+        """Get new reader or None if broadcaster is already shutting down"""
+        with self.__lock:
+            if self.__stopped.is_set():
+                return None
+            reader = StationReader(self)
+            self.__readers.add(reader)
+            return reader
+
+    def unsubscribe(self, reader: StationReader) -> None:
+        """Remove reader, last leaving reader shutdown broadcaster"""
+        with self.__lock:
+            self.__readers.discard(reader)
+            if not self.__readers:
+                self.__stopped.set()
+
+    def __run(self) -> None:
+        delay = RECONNECT_DELAY
+        try:
+            while not self.__stopped.is_set():
+                if self.__stream():
+                    delay = RECONNECT_DELAY
+                if self.__stopped.is_set():
+                    break
+                METRICS.inc(f'audio.reconnects.{self.key.radio}')
+                _log.warning('Upstream of "%s" dropped, reconnect in %.1f s',
+                             self.key.radio, delay)
+                self.__stopped.wait(delay)
+                delay = min(delay * 2, RECONNECT_DELAY_MAX)
+        finally:
+            self.__stopped.set()
+            with self.__lock:
+                readers = tuple(self.__readers)
+            for reader in readers:
+                reader.close()
+            self.__on_close(self)
+
+    def __stream(self) -> bool:
+        """Read upstream until it ends, return True if any frame was received"""
+        source = None
+        first_frame = True
+        failed = False
+        try:
+            started = time.perf_counter()
+            source = self.__source_factory(self.key)
+            self.pid = source_pid(source)
+            while not self.__stopped.is_set():
+                frame = source.read()
+                if not frame:
+                    # ffmpeg which exits before first frame or with error can't decode upstream
+                    failed = first_frame or source_failed(source)
+                    break
+                if first_frame:
+                    first_frame = False
+                    self.__report_first_frame(source, time.perf_counter() - started)
+                with self.__lock:
+                    readers = tuple(self.__readers)
+                for reader in readers:
+                    reader.push(frame)
+        except Exception:   # pylint: disable=broad-exception-caught
+            failed = True
+            _log.exception('Broadcast of "%s" failed', self.key.radio)
+        finally:
+            self.pid = None
+            if source is not None:
+                source.cleanup()
+        if failed and self.__on_failure is not None:
+            self.__on_failure(self.key)
+        return not first_frame
+
+    def __report_first_frame(self, source: AudioSource, seconds: float) -> None:
+        kind = 'warm' if isinstance(source, WarmSource) else 'cold'
+        METRICS.observe(f'audio.ttff.{kind}', seconds)
+        _log.info('First frame of "%s" after %.3f s (%s start)',
+                  self.key.radio, seconds, kind)
+
+
+class BroadcastManager:
+    """Keep one StationBroadcaster per stream key"""
+
+    def __init__(self, on_failure: FailureCallback = None) -> None:
+        self.__on_failure = on_failure
+        self.__broadcasters: Dict[StreamKey, StationBroadcaster] = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def broadcasters(self) -> Dict[StreamKey, StationBroadcaster]:
+        """Snapshot of running broadcasters"""
+        with self.__lock:
+            return dict(self.__broadcasters)
+
+    def subscribe(self, key: StreamKey, source_factory: SourceFactory) -> StationReader:
+        """
+        Get reader for stream key, upstream is opened only for the first listener.
+        source_factory is called from broadcaster thread on start and on every reconnect
+        """
+        with self.__lock:
+            broadcaster = self.__broadcasters.get(key)
+            reader = broadcaster.subscribe() if broadcaster else None
+            if reader is None:
+                broadcaster = StationBroadcaster(
+                    key, source_factory, self.__remove, self.__on_failure)
+                reader = broadcaster.subscribe()
+                self.__broadcasters[key] = broadcaster
+                broadcaster.start()
+            return reader
+
+    def close(self) -> None:
+        """Stop all broadcasters"""
+        for broadcaster in self.broadcasters.values():
+            broadcaster.stop()
+
+    def __remove(self, broadcaster: StationBroadcaster) -> None:
+        with self.__lock:
+            if self.__broadcasters.get(broadcaster.key) is broadcaster:
+                del self.__broadcasters[broadcaster.key]
@@ -0,0 +1,90 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Iterable
+
+from discord import VoiceChannel
+
+EMPTY_CHANNEL_GRACE = 30  # seconds before leaving channel without listeners
+
+EmptyCallback = Callable[[VoiceChannel], Awaitable[None]]
+
+
+def count_listeners(channel: VoiceChannel) -> int:
+    """Human members of voice channel"""
+    return sum(not member.bot for member in channel.members)
+
+
+class ListenerCounter:
+    """
+    Human listeners of voice channels where bot plays, updated by voice state events.
+    Channel left without listeners is reported after grace period, unless somebody rejoins
+    """
+
+    def __init__(self, on_empty: EmptyCallback, grace: float = EMPTY_CHANNEL_GRACE) -> None:
+        self.__on_empty = on_empty
+        self.__grace = grace
+        self.__listeners: Dict[int, int] = {}   # voice channel id -> human members
+        self.__leaving: Dict[int, asyncio.Task] = {}  # voice channel id -> empty report
+
+    def listeners(self, channel_id: int) -> int | None:
+        """Listeners of channel or None if bot isn't there"""
+        return self.__listeners.get(channel_id)
+
+    def leaving(self, channel_id: int) -> bool:
+        """True if empty channel is going to be left"""
+        return channel_id in self.__leaving
+
+    def bot_moved(self, before: VoiceChannel | None, after: VoiceChannel | None) -> None:
+        """Bot left before channel and joined after one, None if not in voice"""
+        if before is not None:
+            self.forget(before.id)
+        if after is not None:
+            self.track(after)
+
+    def member_moved(self, before: VoiceChannel | None, after: VoiceChannel | None) -> None:
+        """Human member left before channel and joined after one, None if not in voice"""
+        for channel, change in ((before, -1), (after, 1)):
+            if channel is not None and channel.id in self.__listeners:
+                self.__listeners[channel.id] = max(0, self.__listeners[channel.id] + change)
+                self.__check(channel)
+
+    def track(self, channel: VoiceChannel) -> None:
+        """Count listeners of channel where bot plays"""
+        self.__listeners[channel.id] = count_listeners(channel)
+        self.__check(channel)
+
+    def forget(self, channel_id: int) -> None:
+        """Stop counting channel which bot left"""
+        self.__listeners.pop(channel_id, None)
+        task = self.__leaving.pop(channel_id, None)
+        if task is not None:
+            task.cancel()
+
+    def sync(self, channels: Iterable[VoiceChannel]) -> None:
+        """Recount channels where bot is now and forget the others"""
+        channels = {channel.id: channel for channel in channels}
+        for channel_id in set(self.__listeners) - set(channels):
+            self.forget(channel_id)
+        for channel in channels.values():
+            self.track(channel)
+
+    def close(self) -> None:
+        """Cancel pending empty channel reports"""
+        for task in self.__leaving.values():
+            task.cancel()
+        self.__leaving.clear()
+
+    def __check(self, channel: VoiceChannel) -> None:
+        if self.__listeners.get(channel.id):
+            task = self.__leaving.pop(channel.id, None)
+            if task is not None:
+                task.cancel()
+        elif channel.id not in self.__leaving:
+            self.__leaving[channel.id] = asyncio.create_task(self.__leave(channel))
+
+    async def __leave(self, channel: VoiceChannel) -> None:
+        try:
+            await asyncio.sleep(self.__grace)
+        except asyncio.CancelledError:
+            return
+        self.__leaving.pop(channel.id, None)
+        await self.__on_empty(channel)
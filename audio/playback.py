@@ -0,0 +1,60 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict
+
+COALESCE_WINDOW = 0.75  # seconds
+
+StartCallback = Callable[[], Awaitable[bool]]
+
+
+class GuildPlayback:    # pylint: disable=too-few-public-methods
+    """Pending station request of one guild"""
+    __slots__ = ('startup', 'last_request')
+
+    def __init__(self) -> None:
+        self.startup: asyncio.Future | None = None
+        self.last_request = 0.0
+
+
+class PlaybackQueue:
+    """
+    Per guild command queue for station requests.
+    Request coming soon after previous one waits short window, so only the last
+    of burst starts decoder. Superseded startup in progress is cancelled
+    """
+
+    def __init__(self, window: float = COALESCE_WINDOW) -> None:
+        self.__window = window
+        self.__guilds: Dict[int, GuildPlayback] = {}
+
+    async def request(self, guild_id: int, start: StartCallback) -> bool:
+        """Run start callback unless newer request of guild supersedes it"""
+        guild = self.__guilds.setdefault(guild_id, GuildPlayback())
+        now = time.monotonic()
+        delay = self.__window if now - guild.last_request < self.__window else 0
+        guild.last_request = now
+        if guild.startup is not None:
+            guild.startup.cancel()
+        startup = asyncio.ensure_future(self.__start(delay, start))
+        guild.startup = startup
+        try:
+            return await asyncio.shield(startup)
+        except asyncio.CancelledError:
+            if startup.cancelled():
+                return False
+            raise
+        finally:
+            if guild.startup is startup:
+                guild.startup = None
+
+    def cancel(self, guild_id: int) -> None:
+        """Drop pending request of guild"""
+        guild = self.__guilds.pop(guild_id, None)
+        if guild is not None and guild.startup is not None:
+            guild.startup.cancel()
+
+    @staticmethod
+    async def __start(delay: float, start: StartCallback) -> bool:
+        if delay:
+            await asyncio.sleep(delay)
+        return await start()
@@ -0,0 +1,215 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple
+
+from discord import AudioSource
+
+from audio.sources import source_pid
+from metrics import METRICS
+from my_types.audio import StreamKey, Upstream
+
+
+_log = logging.getLogger(__name__)
+
+POOL_SIZE = 4
+POOL_SIZE_PER_STATION = 1
+IDLE_TIMEOUT = 120  # seconds
+DRAIN_FRAMES = 5  # 20 ms frames kept by pooled reader
+
+KeySourceFactory = Callable[[StreamKey, Upstream], AudioSource]
+
+
+class WarmSource(AudioSource):
+    """
+    Pre-spawned ffmpeg source which already got first frame from upstream.
+    While pooled it is drained so upstream doesn't drop it as slow client,
+    only the latest frames are kept for the player
+    """
+
+    def __init__(self, source: AudioSource, first_frame: bytes) -> None:
+        self.created = time.monotonic()
+        self.original = source
+        self.__frames: Deque[bytes] = deque([first_frame], maxlen=DRAIN_FRAMES)
+        self.__taken = False
+        self.__lock = threading.Lock()
+
+    def drain(self) -> bool:
+        """Read next frame while pooled, False once reader is played or upstream ended"""
+        with self.__lock:
+            if self.__taken:
+                return False
+            frame = self.original.read()
+            if frame:
+                self.__frames.append(frame)
+            return bool(frame)
+
+    def read(self) -> bytes:
+        with self.__lock:
+            self.__taken = True
+            if self.__frames:
+                return self.__frames.popleft()
+        return self.original.read()
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
+
+
+class WarmPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Pool of connected ffmpeg readers for most played stations.
+    Taken reader is refilled in background, pooled readers are drained by their spawn
+    thread. Reader which isn't taken in idle timeout is stopped and its station
+    isn't warmed until it is played again
+    """
+
+    def __init__(self, source_factory: KeySourceFactory, size: int = POOL_SIZE,
+                 size_per_station: int = POOL_SIZE_PER_STATION,
+                 idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.__source_factory = source_factory
+        self.__size = size
+        self.__size_per_station = size_per_station
+        self.__idle_timeout = idle_timeout
+        self.__targets: Dict[StreamKey, Upstream] = {}
+        self.__hits: Dict[StreamKey, float] = {}  # stream key -> last take
+        self.__ready: Dict[StreamKey, List[WarmSource]] = {}
+        self.__spawning: Dict[StreamKey, int] = {}
+        self.__lock = threading.Lock()
+
+    @property
+    def ready(self) -> int:
+        """Count of readers ready to use"""
+        with self.__lock:
+            return sum(len(sources) for sources in self.__ready.values())
+
+    @property
+    def decoders(self) -> int:
+        """Count of ffmpeg processes owned by pool, connecting ones included"""
+        with self.__lock:
+            return sum(len(sources) for sources in self.__ready.values()) + \
+                sum(self.__spawning.values())
+
+    @property
+    def pids(self) -> List[Tuple[StreamKey, int]]:
+        """Stream key and ffmpeg pid of every ready reader"""
+        with self.__lock:
+            readers = [(key, source) for key, sources in self.__ready.items()
+                       for source in sources]
+        return [(key, pid) for key, pid in
+                ((key, source_pid(source)) for key, source in readers) if pid]
+
+    def shed(self) -> bool:
+        """Stop the oldest ready reader to free decoder, False if pool has none"""
+        with self.__lock:
+            readers = [(source.created, key) for key, sources in self.__ready.items()
+                       for source in sources]
+            if not readers:
+                return False
+            key = min(readers)[1]
+            source = self.__ready[key].pop(0)
+        METRICS.inc('pool.shed')
+        source.cleanup()
+        return True
+
+    def set_targets(self, targets: Dict[StreamKey, Upstream]) -> None:
+        """Set stream keys with upstreams to keep warm, new ones are warmed at once"""
+        now = time.monotonic()
+        with self.__lock:
+            # New target has one idle timeout to be taken
+            self.__hits = {key: self.__hits.get(key, now) for key in targets}
+            new = set(targets) - set(self.__targets)
+            self.__targets = dict(targets)
+        self.maintain()
+        for key in new:
+            self.__fill(key)
+
+    def take(self, key: StreamKey) -> WarmSource | None:
+        """Get warm reader for stream key or None if pool doesn't have it"""
+        with self.__lock:
+            sources = self.__ready.get(key)
+            source = sources.pop(0) if sources else None
+            if key in self.__targets:
+                self.__hits[key] = time.monotonic()
+        METRICS.inc('pool.hit' if source else 'pool.miss')
+        self.__fill(key)
+        return source
+
+    def maintain(self) -> None:
+        """Stop readers which weren't taken in idle timeout, they aren't refilled"""
+        expired = []
+        now = time.monotonic()
+        with self.__lock:
+            for key, sources in self.__ready.items():
+                for source in sources:
+                    if key not in self.__targets or \
+                            now - source.created > self.__idle_timeout:
+                        expired.append(source)
+                sources[:] = [x for x in sources if x not in expired]
+        for source in expired:
+            source.cleanup()
+
+    def close(self) -> None:
+        """Stop all pooled readers"""
+        self.set_targets({})
+
+    def __fill(self, key: StreamKey) -> None:
+        with self.__lock:
+            if key not in self.__targets or \
+                    time.monotonic() - self.__hits[key] > self.__idle_timeout:
+                return
+            station = len(self.__ready.get(key, ())) + self.__spawning.get(key, 0)
+            total = sum(len(x) for x in self.__ready.values()) + \
+                sum(self.__spawning.values())
+            if station >= self.__size_per_station or total >= self.__size:
+                return
+            self.__spawning[key] = self.__spawning.get(key, 0) + 1
+            upstream = self.__targets[key]
+        threading.Thread(target=self.__spawn, args=(key, upstream),
+                         daemon=True, name=f'warm-pool:{key.radio}').start()
+
+    def __spawn(self, key: StreamKey, upstream: Upstream) -> None:
+        warm = self.__connect(key, upstream)
+        if warm is None:
+            return
+        try:
+            while warm.drain():
+                pass
+        except Exception:   # pylint: disable=broad-exception-caught
+            _log.exception('Warm reader of "%s" failed while pooled', key.radio)
+        with self.__lock:
+            sources = self.__ready.get(key, [])
+            pooled = warm in sources
+            if pooled:
+                sources.remove(warm)
+        if pooled:
+            _log.info('Warm reader of "%s" ended while pooled', key.radio)
+            warm.cleanup()
+
+    def __connect(self, key: StreamKey, upstream: Upstream) -> WarmSource | None:
+        """Spawn reader and put it in pool after first frame, pooled reader is returned"""
+        source = warm = None
+        try:
+            started = time.perf_counter()
+            source = self.__source_factory(key, upstream)
+            frame = source.read()
+            if frame:
+                _log.info('Warm reader of "%s" is ready after %.2f s',
+                          key.radio, time.perf_counter() - started)
+                warm, source = WarmSource(source, frame), None
+                with self.__lock:
+                    if key in self.__targets:
+                        self.__ready.setdefault(key, []).append(warm)
+                    else:
+                        source, warm = warm, None
+        except Exception:   # pylint: disable=broad-exception-caught
+            _log.exception('Warm reader of "%s" failed', key.radio)
+        finally:
+            with self.__lock:
+                self.__spawning[key] -= 1
+            if source is not None:
+                source.cleanup()
+        return warm
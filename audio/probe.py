@@ -0,0 +1,55 @@
+import asyncio
+import json
+import logging
+
+from my_types.radio import StationProbe
+
+
+_log = logging.getLogger(__name__)
+
+PROBE_TIMEOUT = 30  # seconds
+FAST_PROBE_SIZE = 32  # bytes, minimal value accepted by ffmpeg
+
+
+async def probe_station(url: str, executable: str = 'ffprobe') -> StationProbe | None:
+    """Find out format, codec, sample rate and channels of upstream"""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            executable, '-v', 'error', '-select_streams', 'a:0',
+            '-show_entries', 'format=format_name:stream=codec_name,sample_rate,channels',
+            '-of', 'json', url,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL)
+    except OSError:
+        _log.exception('Could not run %s', executable)
+        return None
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), PROBE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        _log.warning('Probe of %s timed out', url)
+        return None
+    return parse_probe(output)
+
+
+def parse_probe(output: bytes) -> StationProbe | None:
+    """Parse ffprobe json output"""
+    try:
+        content: dict = json.loads(output)
+        stream = content['streams'][0]
+        return StationProbe(
+            # ffprobe may give list of demuxers as "mov,mp4,m4a"
+            format_name=content['format']['format_name'].split(',')[0],
+            codec=stream['codec_name'],
+            sample_rate=int(stream['sample_rate']),
+            channels=int(stream['channels']),
+        )
+    except (json.decoder.JSONDecodeError, KeyError, IndexError, ValueError):
+        return None
+
+
+def before_options(probe: StationProbe | None) -> str | None:
+    """ffmpeg input options which skip format analysis for known upstream"""
+    if probe is None:
+        return None
+    return f'-f {probe.format_name} -probesize {FAST_PROBE_SIZE} -analyzeduration 0'
@@ -0,0 +1,94 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Callable, Deque
+
+from my_types.audio import DecoderUsage, StreamKey
+
+
+MAX_DECODERS = 2 * (os.cpu_count() or 1)
+MAX_LOAD_PER_CPU = 1.5  # host load average per CPU which counts as saturated
+QUEUE_TIMEOUT = 15      # seconds to wait for free decoder before reject
+QUEUE_POLL = 0.5        # seconds
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def process_usage(pid: int, proc: str = '/proc') -> DecoderUsage | None:
+    """Read average CPU usage and RSS of process from /proc"""
+    try:
+        with open(f'{proc}/{pid}/stat', 'r', encoding='utf-8') as stat_file:
+            # process name may contain spaces, fields after it are fixed
+            stat = stat_file.read().rsplit(')', 1)[1].split()
+        with open(f'{proc}/{pid}/statm', 'r', encoding='utf-8') as statm_file:
+            rss_pages = int(statm_file.read().split()[1])
+        with open(f'{proc}/uptime', 'r', encoding='utf-8') as uptime_file:
+            uptime = float(uptime_file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+    cpu_seconds = (int(stat[11]) + int(stat[12])) / CLOCK_TICKS    # utime + stime
+    lifetime = uptime - int(stat[19]) / CLOCK_TICKS                 # since starttime
+    cpu_percent = 100 * cpu_seconds / lifetime if lifetime > 0 else 0.0
+    return DecoderUsage(pid, cpu_percent, rss_pages * PAGE_SIZE / 2 ** 20)
+
+
+def host_saturated(max_load_per_cpu: float = MAX_LOAD_PER_CPU) -> bool:
+    """Check host load average against CPU count"""
+    try:
+        load = os.getloadavg()[0]
+    except OSError:
+        return False
+    return load / (os.cpu_count() or 1) > max_load_per_cpu
+
+
+class PlaybackScheduler:
+    """
+    Admission control for new ffmpeg decoders.
+    Listening to already decoded stream is always allowed, new decoder waits
+    in FIFO queue while decoders limit is reached or host is saturated.
+    Idle decoders are shed before listener has to wait
+    """
+
+    def __init__(self, is_decoding: Callable[[StreamKey], bool],  # pylint: disable=too-many-arguments
+                 live_decoders: Callable[[], int], max_decoders: int = MAX_DECODERS,
+                 queue_timeout: float = QUEUE_TIMEOUT,
+                 shed: Callable[[], bool] = lambda: False) -> None:
+        self.max_decoders = max_decoders
+        self.__is_decoding = is_decoding
+        self.__live_decoders = live_decoders
+        self.__shed = shed
+        self.__queue_timeout = queue_timeout
+        self.__queue: Deque[object] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Count of requests waiting for decoder"""
+        return len(self.__queue)
+
+    async def admit(self, key: StreamKey) -> bool:
+        """Wait for decoder of stream key, False if host stays saturated"""
+        if self.__is_decoding(key) or not self.__queue and self.__has_capacity():
+            return True
+        ticket = object()
+        self.__queue.append(ticket)
+        try:
+            deadline = time.monotonic() + self.__queue_timeout
+            while time.monotonic() < deadline:
+                await asyncio.sleep(QUEUE_POLL)
+                if self.__is_decoding(key):
+                    return True
+                if self.__queue[0] is ticket and self.__has_capacity():
+                    return True
+            return False
+        finally:
+            self.__queue.remove(ticket)
+
+    def __has_capacity(self) -> bool:
+        if host_saturated():
+            return False
+        while self.__live_decoders() >= self.max_decoders:
+            if not self.__shed():
+                return False
+        return True
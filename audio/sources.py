@@ -0,0 +1,70 @@
+import subprocess
+
+from discord import AudioSource, FFmpegOpusAudio, FFmpegPCMAudio
+
+from my_types.audio import StreamKey, Upstream
+from my_types.radio import StationAddress
+
+
+def station_url(station_address: StationAddress) -> str:
+    """Build upstream url from station address"""
+    params = '&'.join(['='.join(x) for x in station_address.params.items()])
+    return station_address.url + '?' + params
+
+
+EXIT_TIMEOUT = 1  # seconds to wait for ffmpeg exit after its output ended
+
+BITRATE_TIERS = (32, 64, 96, 128, 256, 384)   # kbps
+# libopus complexity per tier, low bitrate channels don't gain from slow encoding
+ENCODER_COMPLEXITY = {32: 4, 64: 6, 96: 8, 128: 10, 256: 10, 384: 10}
+
+
+def bitrate_tier(channel_bitrate: int) -> int:
+    """Highest encoder tier in kbps which fits into voice channel bitrate in bps"""
+    fitting = [tier for tier in BITRATE_TIERS if tier * 1000 <= channel_bitrate]
+    return fitting[-1] if fitting else BITRATE_TIERS[0]
+
+
+def ffmpeg_options(key: StreamKey) -> str | None:
+    """ffmpeg output options for stream key, volume is applied by ffmpeg filter"""
+    options = []
+    if key.volume != 100:
+        options.append(f'-filter:a volume={key.volume / 100:.2f}')
+    if key.opus:
+        options.append(f'-compression_level {ENCODER_COMPLEXITY[key.bitrate]}')
+    return ' '.join(options) or None
+
+
+def ffmpeg_source(key: StreamKey, upstream: Upstream) -> AudioSource:
+    """Spawn ffmpeg process which gives PCM or ready Opus packets"""
+    if key.opus:
+        return FFmpegOpusAudio(upstream.url, bitrate=key.bitrate,
+                               before_options=upstream.before_options,
+                               options=ffmpeg_options(key))
+    return FFmpegPCMAudio(upstream.url, before_options=upstream.before_options,
+                          options=ffmpeg_options(key))
+
+
+def source_pid(source: AudioSource) -> int | None:
+    """pid of ffmpeg process behind source and its wrappers"""
+    while hasattr(source, 'original'):
+        source = source.original
+    return getattr(getattr(source, '_process', None), 'pid', None)
+
+
+def source_failed(source: AudioSource, timeout: float = EXIT_TIMEOUT) -> bool:
+    """
+    True if ffmpeg behind ended source and its wrappers exited with error.
+    Must be checked before cleanup, it kills ffmpeg and discord ignores exit code then
+    """
+    while hasattr(source, 'original'):
+        source = source.original
+    if getattr(source, '_current_error', None) is not None:
+        return True
+    process = getattr(source, '_process', None)
+    if not hasattr(process, 'wait'):
+        return False
+    try:
+        return process.wait(timeout) != 0
+    except subprocess.TimeoutExpired:
+        return False
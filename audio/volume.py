@@ -0,0 +1,74 @@
+import threading
+
+import numpy
+from discord import AudioSource, ClientException
+from discord.opus import Encoder as OpusEncoder
+
+
+MAX_VOLUME = 2.0
+SAMPLES_PER_FRAME = OpusEncoder.SAMPLES_PER_FRAME
+CHANNELS = OpusEncoder.CHANNELS
+
+
+class VolumeTransformer(AudioSource):
+    """
+    Volume control for PCM AudioSource.
+    Gain is applied to the whole frame with numpy, volume changes
+    are ramped over one frame to avoid clicks
+    """
+
+    def __init__(self, original: AudioSource, volume: float = 1.0) -> None:
+        # Assigned before check, cleanup of rejected source is called on its deletion
+        self.original = original
+        if original.is_opus():
+            raise ClientException('AudioSource must not be Opus encoded.')
+        self.__lock = threading.Lock()
+        self.__gain = self.__clamp(volume)
+        self.__ramp: numpy.ndarray | None = None
+
+    @property
+    def volume(self) -> float:
+        """Volume as a floating point percentage (e.g. 1.0 for 100%)"""
+        return self.__gain
+
+    @volume.setter
+    def volume(self, value: float) -> None:
+        gain = self.__clamp(value)
+        with self.__lock:
+            if gain == self.__gain:
+                return
+            # gain of every sample pair goes from old to new value within one frame
+            ramp = numpy.linspace(self.__gain, gain, SAMPLES_PER_FRAME,
+                                  endpoint=False, dtype=numpy.float32)
+            self.__ramp = numpy.repeat(ramp, CHANNELS)
+            self.__gain = gain
+
+    def read(self) -> bytes:
+        frame = self.original.read()
+        with self.__lock:
+            gain, ramp, self.__ramp = self.__gain, self.__ramp, None
+        if ramp is None and gain == 1.0 or not frame:
+            return frame
+        if ramp is None and gain == 0.0:
+            return bytes(len(frame))
+
+        samples = numpy.frombuffer(frame, dtype=numpy.int16)
+        if ramp is not None and len(ramp) == len(samples):
+            scaled = samples * ramp
+            peak = max(ramp[0], gain)
+        else:
+            scaled = samples * numpy.float32(gain)
+            peak = gain
+        if peak > 1.0:
+            numpy.clip(scaled, -32768, 32767, out=scaled)
+        return scaled.astype(numpy.int16).tobytes()
+
+    def is_opus(self) -> bool:
+        return False
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
+
+    @staticmethod
+    def __clamp(value: float) -> float:
+        return min(max(float(value), 0.0), MAX_VOLUME)
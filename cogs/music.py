@@ -1,24 +1,65 @@
-from discord import FFmpegPCMAudio, PCMVolumeTransformer
+import asyncio
+from collections import Counter
+from dataclasses import replace
+
+from discord import AudioSource, Member, VoiceChannel, VoiceClient, VoiceState
+from discord.abc import GuildChannel
 from discord.ext import commands, tasks
 
+from audio.broadcast import BroadcastManager, StationReader
+from audio.listeners import ListenerCounter
+from audio.playback import PlaybackQueue
+from audio.pool import WarmPool
+from audio.probe import before_options, probe_station
+from audio.scheduler import PlaybackScheduler, process_usage
+from audio.sources import bitrate_tier, ffmpeg_source, station_url
+from audio.volume import VolumeTransformer
+from metrics import METRICS
+from my_types.audio import StreamKey, Upstream
+
+OPUS_PASSTHROUGH = True
+VOLUME_STEP = 10
+WARM_STATIONS = 3
+UPSTREAM_TIMEOUT = 30  # seconds broadcaster thread waits for upstream from database
+
 
-class Radio(commands.Cog):
+class Radio(commands.Cog):  # pylint: disable=too-many-instance-attributes
     """
     Support module for retranslate radio on voice chat and control him
     """
 
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
-        self.__db = self.bot.connector
+        self.__db = self.bot.database
+        self.__guilds = self.bot.guild_registry
+        self.__broadcasts = BroadcastManager(on_failure=self.__forget_probe)
+        self.__volumes = {}
+        self.__probing = set()
+        self.__pool = WarmPool(ffmpeg_source)
+        self.__playback = PlaybackQueue()
+        # Warm readers are decoders too, they are stopped before listener has to wait
+        self.__scheduler = PlaybackScheduler(
+            lambda key: key in self.__broadcasts.broadcasters,
+            lambda: len(self.__broadcasts.broadcasters) + self.__pool.decoders,
+            shed=self.__pool.shed)
+        self.__listeners = ListenerCounter(self.__leave_empty_channel)
 
         self.is_listening.start()   # pylint: disable=no-member
+        self.warm_pool.start()      # pylint: disable=no-member
+
+    async def cog_unload(self) -> None:
+        self.is_listening.cancel()  # pylint: disable=no-member
+        self.warm_pool.cancel()     # pylint: disable=no-member
+        self.__broadcasts.close()
+        self.__pool.close()
+        self.__listeners.close()
 
     @commands.command()
     async def info(self, ctx):
         """Available radio list"""
 
         radios = "List access radio stations:\n"
-        for radio in self.__db.get_radio_list():
+        for radio in await self.__db.get_radio_list():
             radios += f'{radio}\n'
         await ctx.send(radios)
 
@@ -26,23 +67,83 @@ class Radio(commands.Cog):
     async def play(self, ctx, *, radio: str = None):
         """<Radio name> Plays radio"""
 
-        if radio and radio in self.__db.get_radio_list():
-            station_address = self.__db.get_radio_station_address(radio)
-            params = '&'.join(['='.join(x)
-                              for x in station_address.params.items()])
-            radio_url = station_address.url + '?' + params
-            source = PCMVolumeTransformer(FFmpegPCMAudio(radio_url))
-
-            guild_id = ctx.message.guild.id
-            channel_id = ctx.message.channel.id
-            self.__db.set_radio_activity(guild_id, channel_id, radio)
-            if self.__db.get_from_silence_group(guild_id):
-                await ctx.send("Silence mod is active, if you wanna turn off, "
-                               "just send '>silence off'")
-
-            ctx.voice_client.play(source, after=lambda e: print(
+        if radio and radio in await self.__db.get_radio_list():
+            await self.__playback.request(ctx.message.guild.id,
+                                          lambda: self.__start(ctx, radio))
+
+    async def __start(self, ctx, radio: str) -> bool:
+        voice_client = ctx.voice_client
+        if voice_client is None:
+            return False
+        current = self.__current_key(voice_client)
+        if current is not None and current.radio == radio:
+            return True
+
+        guild_id = ctx.message.guild.id
+        volume = self.__volumes.get(guild_id, 100)
+        tier = bitrate_tier(voice_client.channel.bitrate)
+        key = self.__stream_key(radio, volume, tier)
+        if not await self.__scheduler.admit(key):
+            await ctx.send("Too many radio streams are playing right now, "
+                           "please try again in a minute")
+            if not voice_client.is_playing():
+                await voice_client.disconnect()
+            return False
+        if not voice_client.is_connected():
+            return False
+
+        # Upstream starts connecting while database is written
+        source = self.__subscribe(key, volume)
+        channel_id = ctx.message.channel.id
+        try:
+            await self.__db.add_radio_play(radio)
+            await self.__guilds.listen(guild_id, channel_id, radio)
+        except asyncio.CancelledError:
+            # Superseded or stopped before playing, release reader so its decoder can stop
+            source.cleanup()
+            raise
+        if voice_client.is_playing():
+            self.__swap_source(voice_client, source, tier)
+        else:
+            voice_client.play(source, bitrate=tier, after=lambda e: print(
                 f'Player error: {e}') if e else None)
 
+        if self.__guilds.is_silenced(guild_id):
+            await ctx.send("Silence mod is active, if you wanna turn off, "
+                           "just send '>silence off'")
+        return True
+
+    @staticmethod
+    def __swap_source(voice_client: VoiceClient, source: AudioSource, tier: int) -> None:
+        previous = voice_client.source
+        voice_client.source = source
+        previous.cleanup()
+        if not source.is_opus():
+            voice_client.encoder.set_bitrate(tier)
+
+    async def __retune(self, voice_client: VoiceClient) -> None:
+        """Match encoder tier to bitrate of channel where bot plays now"""
+        key = self.__current_key(voice_client)
+        tier = bitrate_tier(voice_client.channel.bitrate)
+        if key is None:
+            return
+        if not key.opus:
+            voice_client.encoder.set_bitrate(tier)
+        elif key.bitrate != tier:
+            key = replace(key, bitrate=tier)
+            if await self.__scheduler.admit(key) and self.__current_key(voice_client):
+                volume = self.__volumes.get(voice_client.guild.id, 100)
+                self.__swap_source(voice_client, self.__subscribe(key, volume), tier)
+
+    @staticmethod
+    def __current_key(voice_client) -> StreamKey | None:
+        source = voice_client.source
+        if isinstance(source, VolumeTransformer):
+            source = source.original
+        if isinstance(source, StationReader) and voice_client.is_playing():
+            return source.key
+        return None
+
     @commands.command()
     async def volume(self, ctx, volume: int = 50):
         """Changes the player's volume"""
@@ -50,14 +151,117 @@ class Radio(commands.Cog):
         if ctx.voice_client is None:
             return await ctx.send("Not connected to a voice channel.")
 
-        ctx.voice_client.source.volume = volume / 100
+        volume = max(0, min(volume, 100))
+        self.__volumes[ctx.message.guild.id] = volume
+        source = ctx.voice_client.source
+        if isinstance(source, StationReader):
+            # Opus packets can't be scaled, switch guild to stream with ffmpeg gain
+            key = self.__stream_key(source.key.radio, volume, source.key.bitrate)
+            if not await self.__scheduler.admit(key):
+                return await ctx.send("Too many radio streams are playing right now, "
+                                      "please try again in a minute")
+            self.__swap_source(ctx.voice_client, self.__subscribe(key, volume), key.bitrate)
+            volume = key.volume
+        elif source is not None:
+            source.volume = volume / 100
         await ctx.send(f"Changed volume to {volume}%")
 
+    @staticmethod
+    def __stream_key(radio: str, volume: int = 100,
+                     bitrate: int = StreamKey.bitrate) -> StreamKey:
+        if OPUS_PASSTHROUGH:
+            volume = round(volume / VOLUME_STEP) * VOLUME_STEP
+            return StreamKey(radio, opus=True, volume=volume, bitrate=bitrate)
+        # PCM is shared by all tiers, every voice client encodes it itself
+        return StreamKey(radio)
+
+    def __subscribe(self, key: StreamKey, volume: int) -> StationReader | VolumeTransformer:
+        self.__ensure_probe(key.radio)
+        reader = self.__broadcasts.subscribe(key, self.__open_upstream)
+        if key.opus:
+            return reader
+        return VolumeTransformer(reader, volume / 100)
+
+    def __open_upstream(self, key: StreamKey) -> AudioSource:
+        # Called from broadcaster thread on start and on every reconnect,
+        # queries go through database thread in order with the others
+        source = self.__pool.take(key)
+        if source is None:
+            upstream = asyncio.run_coroutine_threadsafe(
+                self.__upstream(key.radio), self.bot.loop).result(UPSTREAM_TIMEOUT)
+            source = ffmpeg_source(key, upstream)
+        return source
+
+    async def __upstream(self, radio: str) -> Upstream:
+        url = station_url(await self.__db.get_radio_station_address(radio))
+        return Upstream(url, before_options(await self.__db.get_station_probe(radio)))
+
+    def __ensure_probe(self, radio: str) -> None:
+        if radio not in self.__probing:
+            self.__probing.add(radio)
+            self.bot.loop.create_task(self.__probe(radio))
+
+    async def __probe(self, radio: str) -> None:
+        try:
+            if await self.__db.get_station_probe(radio) is not None:
+                return
+            url = station_url(await self.__db.get_radio_station_address(radio))
+            probe = await probe_station(url)
+            if probe is not None:
+                await self.__db.set_station_probe(radio, probe)
+        finally:
+            self.__probing.discard(radio)
+
+    def __forget_probe(self, key: StreamKey) -> None:
+        # Called from broadcaster thread, cached format is wrong if ffmpeg failed decoding
+        if not self.bot.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(
+                self.__db.delete_station_probe(key.radio), self.bot.loop)
+
+    @commands.command()
+    async def status(self, ctx):
+        """Radio decoders load on this host"""
+        broadcasters = self.__broadcasts.broadcasters
+        decoders = len(broadcasters) + self.__pool.decoders
+        lines = [f"Decoders: {decoders}/{self.__scheduler.max_decoders}, "
+                 f"queued: {self.__scheduler.queued}, warm: {self.__pool.ready}"]
+        usages = []
+        for key, broadcaster in broadcasters.items():
+            usage = process_usage(broadcaster.pid) if broadcaster.pid else None
+            usages.append(usage)
+            load = f"{usage.cpu_percent:.1f}% CPU, {usage.rss_mb:.1f} MB" \
+                if usage else "connecting"
+            lines.append(f"{key.radio} (volume {key.volume}%): "
+                         f"{broadcaster.listeners} listeners, {load}")
+        for key, pid in self.__pool.pids:
+            usage = process_usage(pid)
+            usages.append(usage)
+            if usage:
+                lines.append(f"{key.radio} (volume {key.volume}%): warm, "
+                             f"{usage.cpu_percent:.1f}% CPU, {usage.rss_mb:.1f} MB")
+        usages = [usage for usage in usages if usage]
+        if usages:
+            lines.append(f"Total: {sum(usage.cpu_percent for usage in usages):.1f}% CPU, "
+                         f"{sum(usage.rss_mb for usage in usages):.1f} MB")
+        tiers = Counter(key.bitrate for key in broadcasters if key.opus)
+        tiers.update(bitrate_tier(voice_client.channel.bitrate)
+                     for voice_client in self.bot.voice_clients
+                     if not getattr(voice_client.source, 'is_opus', lambda: True)())
+        if tiers:
+            lines.append("Encoders: " + ', '.join(
+                f"{tier} kbps: {count}" for tier, count in sorted(tiers.items())))
+        for kind in ('warm', 'cold'):
+            ttff = METRICS.percentiles(f'audio.ttff.{kind}', (50, 95))
+            if ttff:
+                lines.append(f"First frame {kind}: p50 {ttff[0]:.2f} s, p95 {ttff[1]:.2f} s")
+        await ctx.send('\n'.join(lines))
+
     @commands.command()
     async def stop(self, ctx):
         """Stops and disconnects the bot from voice"""
         if ctx.voice_client is not None:
-            self.__db.delete_radio_activity(ctx.message.guild.id)
+            self.__playback.cancel(ctx.message.guild.id)
+            await self.__guilds.leave(ctx.message.guild.id)
             await ctx.voice_client.disconnect()
 
     @play.before_invoke
@@ -70,8 +274,6 @@ class Radio(commands.Cog):
                 await ctx.author.voice.channel.connect()
         elif ctx.voice_client.is_playing():
             if ctx.author.voice:
-                self.__db.delete_radio_activity(ctx.message.guild.id)
-                ctx.voice_client.stop()
                 if ctx.author.voice.channel.id != ctx.voice_client.channel.id:
                     await ctx.voice_client.move_to(ctx.author.voice.channel)
             else:
@@ -80,20 +282,51 @@ class Radio(commands.Cog):
                 raise commands.CommandInvokeError(
                     'User tried change condition without connecting in voice channel')
 
-    @tasks.loop(seconds=30)
+    @tasks.loop(minutes=1)
+    async def warm_pool(self):
+        """Keep ffmpeg readers of most played stations connected for fast start"""
+        targets = {}
+        for radio in await self.__db.get_popular_radio(WARM_STATIONS):
+            self.__ensure_probe(radio)
+            targets[self.__stream_key(radio)] = await self.__upstream(radio)
+        self.__pool.set_targets(targets)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member: Member, before: VoiceState,
+                                    after: VoiceState):
+        """Count human listeners of channels where bot plays radio"""
+        if before.channel == after.channel:
+            return
+        if member.id == self.bot.user.id:
+            self.__listeners.bot_moved(before.channel, after.channel)
+            if before.channel is not None and after.channel is not None and \
+                    member.guild.voice_client is not None:
+                await self.__retune(member.guild.voice_client)
+        elif not member.bot:
+            self.__listeners.member_moved(before.channel, after.channel)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_update(self, before: GuildChannel, after: GuildChannel):
+        """Retune encoder when bitrate of channel where bot plays is changed"""
+        voice_client = after.guild.voice_client
+        if getattr(before, 'bitrate', None) != getattr(after, 'bitrate', None) and \
+                voice_client is not None and voice_client.channel.id == after.id:
+            await self.__retune(voice_client)
+
+    async def __leave_empty_channel(self, channel: VoiceChannel) -> None:
+        voice_client = channel.guild.voice_client
+        if voice_client is not None and voice_client.channel.id == channel.id:
+            voice_client.stop()
+            await self.__guilds.leave(channel.guild.id)
+            await voice_client.disconnect()
+
+    @tasks.loop(minutes=5)
     async def is_listening(self):
         """
-        Checking radio listeners on voice chat.
-        If voice chat is empty then bot stop radio and disconnecting from voice chat
+        Consistency check of listeners counters updated by voice state events.
+        Empty voice chat is left after grace period
         """
-        for ctx in self.bot.voice_clients:
-            bot_count = 0
-            for member in ctx.channel.members:
-                bot_count += member.bot
-            if len(ctx.channel.members) - bot_count < 1:
-                ctx.stop()
-                self.__db.delete_radio_activity(ctx.channel.guild.id)
-                await ctx.disconnect()
+        self.__listeners.sync(voice_client.channel for voice_client in self.bot.voice_clients)
 
 
 async def setup(bot: commands.Bot) -> None:
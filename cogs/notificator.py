@@ -1,13 +1,28 @@
-from typing import List
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Dict, List, Tuple
 
+import discord
 from discord.ext import commands, tasks
 
-from db.database import RadioActivity
-from my_types.radio import StationScoreboardAddress
-from radio import what_plays_on_asiadreamradio
+from metrics import METRICS
+from my_types.radio import MusicInfo
+from scoreboard.breaker import CLOSED, CircuitBreakers
+from scoreboard.dispatch import NotificationDispatcher
+from scoreboard.icy import IcyWatcher
+from scoreboard.providers import ProviderRegistry
+from scoreboard.schedule import MIN_INTERVAL, PollScheduler
+from scoreboard.state import TrackState
 
+_log = logging.getLogger(__name__)
 
-class RadioNotify(commands.Cog):
+POLL_CONCURRENCY = 8
+POLL_TIMEOUT = 10  # seconds
+
+
+class RadioNotify(commands.Cog):   # pylint: disable=too-many-instance-attributes
     """
     Support module for checking info updates on radio station and
     sending notification to radio listeners
@@ -15,9 +30,30 @@ class RadioNotify(commands.Cog):
 
     def __init__(self, bot: commands.Bot) -> None:
         self.bot = bot
-        self.__db = self.bot.connector
+        self.__db = self.bot.database
+        self.__guilds = self.bot.guild_registry
+        self.__schedule = PollScheduler()
+        self.__providers = ProviderRegistry(self.bot.scoreboard_client)
+        self.__breakers = CircuitBreakers()
+        self.__tracks = TrackState(self.__db)
+        self.__dispatch = NotificationDispatcher()
+        # guild id -> (channel id, message id) of now playing message in edit mode
+        self.__now_playing: Dict[int, Tuple[int | None, int | None]] = {}
+        self.__stream_urls: Dict[str, str | None] = {}
+        self.__icy = IcyWatcher(self.bot.scoreboard_client, self.__publish)
+
+    async def cog_load(self) -> None:
+        await self.__tracks.load()
+        self.__now_playing = {
+            message.guild_id: (message.channel_id, message.message_id)
+            for message in await self.__db.get_now_playing_messages()}
         self.send_notification.start()  # pylint: disable=no-member
 
+    async def cog_unload(self) -> None:
+        self.send_notification.cancel()  # pylint: disable=no-member
+        await self.__icy.close()
+        await self.__dispatch.close()
+
     @commands.command()
     async def silence(self, ctx, *, status: str = None):
         """Radio notifiter to turned on or off, send as '>silence on/off'"""
@@ -26,81 +62,140 @@ class RadioNotify(commands.Cog):
 
         match status:
             case "on":
-                self.__add_in_silence_group(guild_id)
+                await self.__guilds.silence(guild_id, True)
                 await ctx.send("Silence mod on")
             case "off":
-                self.__remove_from_silence_group(guild_id)
+                await self.__guilds.silence(guild_id, False)
                 await ctx.send("Silence mod off")
             case _:
                 await ctx.send("If you don't want to be notified what play on radio, "
                                "just send '>silence on'")
 
-    def __add_in_silence_group(self, guild_id: int):
-        if not self.__is_in_silence_group(guild_id):
-            self.__db.add_in_silence_group(guild_id)
-
-    def __remove_from_silence_group(self, guild_id: int):
-        if self.__is_in_silence_group(guild_id):
-            self.__db.delete_from_silence_group(guild_id)
-
-    def __is_in_silence_group(self, guild_id: int) -> bool:
-        if self.__db.get_from_silence_group(guild_id):
-            return True
-        return False
-
-    def __is_new_radio_data(self, radio_name: str) -> bool:
-        last_data = self.__db.get_last_scoreboard(radio_name)
-        current_data = self.__db.get_current_scoreboard(radio_name)
-        if last_data == current_data or current_data is None:
-            return False
-        return True
-
-    def __radio_listens(self, activity: List[RadioActivity]) -> List[str]:
-        radios = []
-        if activity is None:
-            return radios
-        for channel in activity:
-            radios.append(channel.radio)
-        return radios
-
-    def __update_last_scoreboard_data(self, radio_name: str, data: str):
-        if self.__db.get_last_scoreboard(radio_name):
-            self.__db.update_last_scoreboard(radio_name, data)
-        else:
-            self.__db.set_last_scoreboard(radio_name, data)
-
-    async def __update_current_scoreboard_data(self, radio_name: str,
-                                               scoreboard: StationScoreboardAddress):
-
-        data = await what_plays_on_asiadreamradio(scoreboard)
-        last_data = self.__db.get_current_scoreboard(radio_name)
-        if data is None:
-            pass
-        elif last_data is None:
-            self.__db.set_current_scoreboard(radio_name, repr(data))
-        elif last_data != repr(data):
-            self.__db.update_current_scoreboard(radio_name, repr(data))
-
-    @tasks.loop(seconds=30)
+    @commands.command()
+    async def nowplaying(self, ctx, *, mode: str = None):
+        """Now playing message mode, send as '>nowplaying edit/new'"""
+
+        guild_id = ctx.message.guild.id
+
+        match mode:
+            case "edit":
+                if guild_id not in self.__now_playing:
+                    self.__now_playing[guild_id] = (None, None)
+                    await self.__db.set_now_playing_message(guild_id, None, None)
+                await ctx.send("Now playing message will be edited on song change")
+            case "new":
+                if self.__now_playing.pop(guild_id, None) is not None:
+                    await self.__db.delete_now_playing_message(guild_id)
+                await ctx.send("New message will be sent on song change")
+            case _:
+                await ctx.send("If you want one now playing message which is edited "
+                               "on song change, just send '>nowplaying edit'")
+
+    async def __show_now_playing(self, guild_id: int, channel, message: str) -> None:
+        """Edit now playing message of guild, send new one if it was deleted"""
+        channel_id, message_id = self.__now_playing.get(guild_id, (None, None))
+        if channel_id == channel.id and message_id is not None:
+            try:
+                await channel.get_partial_message(message_id).edit(content=message)
+                return
+            except discord.NotFound:
+                pass
+        sent = await channel.send(message)
+        if guild_id in self.__now_playing:
+            self.__now_playing[guild_id] = (channel.id, sent.id)
+            await self.__db.set_now_playing_message(guild_id, channel.id, sent.id)
+
+    async def __load_stream_urls(self, radios: List[str]) -> None:
+        """
+        Remember stream urls of stations with ICY provider, ICY watcher asks for them
+        synchronously. Stations of other providers have None and are polled
+        """
+        for radio in radios:
+            if radio not in self.__stream_urls:
+                station = await self.__db.get_radio(radio)
+                provider = await self.__db.get_station_provider(radio)
+                self.__stream_urls[radio] = self.__providers.icy_url(station, provider)
+
+    async def __poll(self, radio_name: str, semaphore: asyncio.Semaphore) -> MusicInfo | None:
+        station = await self.__db.get_radio(radio_name)
+        provider = await self.__db.get_station_provider(radio_name)
+        endpoint = self.__providers.endpoint(station, provider)
+        if endpoint is None:
+            return None
+
+        async def request() -> MusicInfo | None:
+            async with semaphore:
+                return await asyncio.wait_for(
+                    self.__providers.now_playing(station, provider), POLL_TIMEOUT)
+        return await self.__breakers.call(endpoint, request)
+
+    @commands.command()
+    async def scoreboard(self, ctx):
+        """Scoreboard polling health"""
+        lines = []
+        for name, title in (('scoreboard.poll', 'Poll'), ('scoreboard.tick', 'Tick'),
+                            ('notify.delivery', 'Delivery')):
+            timing = METRICS.percentiles(name)
+            if timing:
+                lines.append(f"{title}: p50 {timing[0]:.2f} s, p95 {timing[1]:.2f} s, "
+                             f"p99 {timing[2]:.2f} s")
+        lines.append(f"Notifications queued: {self.__dispatch.queued}, "
+                     f"superseded: {METRICS.counter('notify.superseded')}")
+        lines.append(f"ICY metadata: {self.__icy.live} stations live")
+        now = time.monotonic()
+        for endpoint, health in self.__breakers.endpoints.items():
+            if health.state != CLOSED:
+                retry = max(0, health.retry_at - now)
+                lines.append(f"Broken: {endpoint} {health.state}, {health.failures} failures, "
+                             f"retry in {retry:.0f} s, {health.last_error}")
+        await ctx.send('\n'.join(lines))
+
+    async def __publish(self, radio: str, data: MusicInfo | None) -> None:
+        """Save song of station and queue notification of its listeners if song is changed"""
+        if data is None or not await self.__tracks.update(radio, data):
+            return
+        message = f'Radio: {radio}\n{data}'
+        for guild_id, channel_id in self.__guilds.subscribers(radio):
+            if self.__guilds.is_silenced(guild_id):
+                continue
+            ctx = self.bot.get_channel(channel_id)
+            if ctx is None:
+                await self.__guilds.leave(guild_id)
+            elif guild_id in self.__now_playing:
+                self.__dispatch.submit(channel_id, partial(
+                    self.__show_now_playing, guild_id, ctx, message))
+            else:
+                self.__dispatch.submit(channel_id, partial(ctx.send, message))
+
+    @tasks.loop(seconds=MIN_INTERVAL)
     async def send_notification(self):
-        """Send info about song play in dicord channel. Check every 30 seconds"""
-        active_channels: List[RadioActivity] = self.__db.get_radio_activity()
-        radio_list = self.__radio_listens(active_channels)
-        for radio in radio_list:
-            scoreboard = self.__db.get_radio_scoreboard_address(radio)
-            await self.__update_current_scoreboard_data(radio, scoreboard)
-            if self.__is_new_radio_data(radio):
-                data = self.__db.get_current_scoreboard(radio)
-                self.__update_last_scoreboard_data(radio, data)
-                for channel in active_channels:
-                    if channel.radio == radio and \
-                            not self.__is_in_silence_group(channel.guild_id):
-                        ctx = self.bot.get_channel(channel.channel_id)
-                        if ctx is not None:
-                            message = f'Radio: {radio}\n{data}'
-                            await ctx.send(message)
-                        else:
-                            self.__db.delete_radio_activity(channel.guild_id)
+        """
+        Send info about song play in dicord channel.
+        Stations with ICY metadata report song changes by themselves,
+        others are polled when their scoreboard is due by track duration
+        """
+        listened = self.__guilds.radios
+        await self.__load_stream_urls(listened)
+        self.__icy.watch(listened, self.__stream_urls.get)
+        radio_list = self.__schedule.due(
+            [radio for radio in listened if not self.__icy.covers(radio)], time.monotonic())
+        if not radio_list:
+            return
+        started = time.perf_counter()
+
+        semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+        results = await asyncio.gather(
+            *(self.__poll(radio, semaphore) for radio in radio_list), return_exceptions=True)
+        METRICS.observe('scoreboard.poll', time.perf_counter() - started)
+
+        for radio, result in zip(radio_list, results):
+            if isinstance(result, Exception):
+                # Failed station is polled again later, others of the tick are published
+                _log.error('Poll of "%s" failed', radio, exc_info=result)
+                result = None
+            self.__schedule.update(radio, result, time.monotonic())
+            await self.__publish(radio, result)
+        METRICS.observe('scoreboard.tick', time.perf_counter() - started)
 
 
 async def setup(bot: commands.Bot) -> None:
@@ -1,20 +1,29 @@
 import ast
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 
-from typing import Any, List, Tuple
-from my_types.database import Connector, Engine, RadioActivity
+from typing import Any, Callable, Dict, List, Tuple, TypeVar
+from db.migrations import MIGRATIONS
+from my_types.database import Connector, Engine, NowPlayingMessage, RadioActivity
 from my_types.radio import (
     Station,
     StationAddress,
+    StationProbe,
+    StationProvider,
     StationScoreboardAddress
 )
 
+T = TypeVar('T')
 
-class Connect(Connector):
+
+class Connect(Connector):   # pylint: disable=too-many-public-methods
     """API for working between SQL Engine and Discord Bot"""
 
     def __init__(self, engine: Engine) -> None:
         self.tables = engine.tables
         self.execute = engine.execute
+        self.__engine = engine
 
         self.__create_tables()
 
@@ -32,6 +41,20 @@ class Connect(Connector):
             self.tables.current_radio_scoreboard_data.create, method="commit")
         self.execute(self.tables.radio_activity.create, method="commit")
         self.execute(self.tables.silence_group.create, method="commit")
+        self.execute(self.tables.radio_play_count.create, method="commit")
+        self.execute(self.tables.station_probe.create, method="commit")
+        self.execute(self.tables.station_provider.create, method="commit")
+        self.execute(self.tables.now_playing_message.create, method="commit")
+        self.execute(self.tables.schema_version.create, method="commit")
+        self.__migrate()
+
+    def __migrate(self) -> None:
+        version = self.get_schema_version()
+        for migration in MIGRATIONS:
+            if migration.version > version:
+                self.__engine.execute_transaction(
+                    [(command, ()) for command in migration.commands] +
+                    [(self.tables.schema_version.set, (migration.version, migration.name))])
 
     def get_radio_list(self) -> List[str | None]:
         raw = self.execute(self.tables.radio.list, method="fetchall")
@@ -67,6 +90,24 @@ class Connect(Connector):
                 self.execute(self.tables.scoreboard_address_params.set,
                              (scoreboard_id, str(scoreboard_params)))
 
+    def set_radios(self, stations: List[Station]) -> None:
+        exists = set(self.get_radio_list())
+        stations = [station for station in stations if station.name not in exists]
+        scoreboards = [station for station in stations if station.scoreboard_address]
+        radio_import = self.tables.radio_import
+        self.__engine.execute_batch([
+            (radio_import.radio, [(station.name,) for station in stations]),
+            (radio_import.station_address,
+             [(station.name, station.station_address.url) for station in stations]),
+            (radio_import.station_address_params,
+             [(station.name, str(station.station_address.params)) for station in stations]),
+            (radio_import.scoreboard_address,
+             [(station.name, station.scoreboard_address.url) for station in scoreboards]),
+            (radio_import.scoreboard_address_params,
+             [(station.name, str(station.scoreboard_address.params))
+              for station in scoreboards if station.scoreboard_address.params]),
+        ])
+
     def get_radio(self, radio_name: str) -> Station:
         if radio_name not in self.get_radio_list():
             raise BaseException(
@@ -86,6 +127,14 @@ class Connect(Connector):
         raw = self.execute(self.tables.radio_activity.list, method="fetchall")
         return self.__normalize_radio_activity(raw)
 
+    def get_radio_activity_by_radio(self) -> Dict[str, List[RadioActivity]]:
+        raw = self.execute(self.tables.radio_activity.by_radio, method="fetchall")
+        return {radio: [RadioActivity(*activity) for activity in activities]
+                for radio, activities in groupby(raw, key=lambda activity: activity[0])}
+
+    def clear_radio_activity(self) -> None:
+        self.execute(self.tables.radio_activity.clear)
+
     def get_last_scoreboard(self, radio_name: str) -> str | None:
         raw = self.execute(
             self.tables.last_radio_scoreboard_data.get, (radio_name,), "fetchone")
@@ -124,6 +173,62 @@ class Connect(Connector):
         self.execute(
             self.tables.current_radio_scoreboard_data.delete, (radio_name,))
 
+    def upsert_scoreboard(self, radio_name: str, data: str) -> None:
+        self.__engine.execute_batch([
+            (self.tables.current_radio_scoreboard_data.upsert, [(radio_name, data)]),
+            (self.tables.last_radio_scoreboard_data.upsert, [(radio_name, data)]),
+        ])
+
+    def add_radio_play(self, radio_name: str) -> None:
+        self.execute(self.tables.radio_play_count.set, (radio_name,))
+
+    def get_popular_radio(self, limit: int) -> List[str]:
+        raw = self.execute(self.tables.radio_play_count.list,
+                           (limit,), "fetchall")
+        return self.__normalize_list(raw)
+
+    def get_station_probe(self, radio_name: str) -> StationProbe | None:
+        raw = self.execute(self.tables.station_probe.get,
+                           (radio_name,), "fetchone")
+        if raw is None:
+            return None
+        return StationProbe(*raw)
+
+    def set_station_probe(self, radio_name: str, probe: StationProbe) -> None:
+        self.execute(self.tables.station_probe.set,
+                     (radio_name, probe.format_name, probe.codec,
+                      probe.sample_rate, probe.channels))
+
+    def delete_station_probe(self, radio_name: str) -> None:
+        self.execute(self.tables.station_probe.delete, (radio_name,))
+
+    def get_station_provider(self, radio_name: str) -> StationProvider | None:
+        raw = self.execute(self.tables.station_provider.get,
+                           (radio_name,), "fetchone")
+        if raw is None:
+            return None
+        return StationProvider(raw[0], ast.literal_eval(raw[1]))
+
+    def set_station_provider(self, radio_name: str, provider: StationProvider) -> None:
+        self.execute(self.tables.station_provider.set,
+                     (radio_name, provider.kind, str(provider.options)))
+
+    def get_now_playing_messages(self) -> List[NowPlayingMessage]:
+        raw = self.execute(self.tables.now_playing_message.list, method="fetchall")
+        return [NowPlayingMessage(*message) for message in raw]
+
+    def set_now_playing_message(self, guild_id: int, channel_id: int | None,
+                                message_id: int | None) -> None:
+        self.execute(self.tables.now_playing_message.set,
+                     (guild_id, channel_id, message_id))
+
+    def delete_now_playing_message(self, guild_id: int) -> None:
+        self.execute(self.tables.now_playing_message.delete, (guild_id,))
+
+    def get_silence_group(self) -> List[int]:
+        raw = self.execute(self.tables.silence_group.list, method="fetchall")
+        return self.__normalize_list(raw)
+
     def get_from_silence_group(self, guild_id: int) -> Tuple[int]:
         return self.execute(self.tables.silence_group.get, (guild_id,), "fetchone")
 
@@ -133,6 +238,13 @@ class Connect(Connector):
     def add_in_silence_group(self, guild_id: int) -> None:
         self.execute(self.tables.silence_group.set, (guild_id,))
 
+    def get_schema_version(self) -> int:
+        raw = self.execute(self.tables.schema_version.get, method="fetchone")
+        return raw[0] or 0
+
+    def close(self) -> None:
+        self.__engine.close()
+
     def __normalize_list(self, data: List[Tuple[Any]]) -> List[str]:
         return [x[0] for x in data]
 
@@ -157,3 +269,105 @@ class Connect(Connector):
         for activity in data:
             activity_list.append(RadioActivity(*activity))
         return activity_list
+
+
+class AsyncConnect:     # pylint: disable=too-many-public-methods
+    """
+    Awaitable API of Connector for cogs.
+    Every query runs on one dedicated database thread, so slow disk or network
+    never blocks event loop which drives voice packets, and queries keep their order
+    """
+
+    def __init__(self, connector: Connector) -> None:
+        self.connector = connector
+        self.__executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        """Run function which uses connector on database thread"""
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, function, *args)
+
+    async def get_radio_list(self) -> List[str | None]:
+        """Get all data from radio table"""
+        return await self.run(self.connector.get_radio_list)
+
+    async def get_radio_station_address(self, radio_name: str) -> None | StationAddress:
+        """Get data from station address table"""
+        return await self.run(self.connector.get_radio_station_address, radio_name)
+
+    async def get_radio(self, radio_name: str) -> Station:
+        """Get data from radio table"""
+        return await self.run(self.connector.get_radio, radio_name)
+
+    async def set_radio_activity(self, guild_id: int, channel_id: int, radio_name: str) -> None:
+        """Insert data into radio activity table"""
+        await self.run(self.connector.set_radio_activity, guild_id, channel_id, radio_name)
+
+    async def delete_radio_activity(self, guild_id: int) -> None:
+        """Delete data from radio activity table"""
+        await self.run(self.connector.delete_radio_activity, guild_id)
+
+    async def get_radio_activity_by_radio(self) -> Dict[str, List[RadioActivity]]:
+        """Get all data from radio activity table grouped by radio name"""
+        return await self.run(self.connector.get_radio_activity_by_radio)
+
+    async def get_last_scoreboard(self, radio_name: str) -> str | None:
+        """Get data from last scoreboard table"""
+        return await self.run(self.connector.get_last_scoreboard, radio_name)
+
+    async def upsert_scoreboard(self, radio_name: str, data: str) -> None:
+        """Insert or update radio_name row in current and last scoreboard tables at once"""
+        await self.run(self.connector.upsert_scoreboard, radio_name, data)
+
+    async def add_radio_play(self, radio_name: str) -> None:
+        """Increase play counter of radio"""
+        await self.run(self.connector.add_radio_play, radio_name)
+
+    async def get_popular_radio(self, limit: int) -> List[str]:
+        """Get most played radio names"""
+        return await self.run(self.connector.get_popular_radio, limit)
+
+    async def get_station_probe(self, radio_name: str) -> StationProbe | None:
+        """Get cached probe result of radio upstream"""
+        return await self.run(self.connector.get_station_probe, radio_name)
+
+    async def set_station_probe(self, radio_name: str, probe: StationProbe) -> None:
+        """Insert or replace probe result of radio upstream"""
+        await self.run(self.connector.set_station_probe, radio_name, probe)
+
+    async def delete_station_probe(self, radio_name: str) -> None:
+        """Forget probe result of radio upstream"""
+        await self.run(self.connector.delete_station_probe, radio_name)
+
+    async def get_station_provider(self, radio_name: str) -> StationProvider | None:
+        """Get scoreboard provider of radio"""
+        return await self.run(self.connector.get_station_provider, radio_name)
+
+    async def get_now_playing_messages(self) -> List[NowPlayingMessage]:
+        """Get now playing messages of guilds which turned on edit mode"""
+        return await self.run(self.connector.get_now_playing_messages)
+
+    async def set_now_playing_message(self, guild_id: int, channel_id: int | None,
+                                      message_id: int | None) -> None:
+        """Insert or replace now playing message of guild"""
+        await self.run(self.connector.set_now_playing_message, guild_id, channel_id, message_id)
+
+    async def delete_now_playing_message(self, guild_id: int) -> None:
+        """Delete now playing message of guild"""
+        await self.run(self.connector.delete_now_playing_message, guild_id)
+
+    async def get_silence_group(self) -> List[int]:
+        """Get all guild ids from silence group table"""
+        return await self.run(self.connector.get_silence_group)
+
+    async def add_in_silence_group(self, guild_id: int) -> None:
+        """Insert guild id into silence group table"""
+        await self.run(self.connector.add_in_silence_group, guild_id)
+
+    async def delete_from_silence_group(self, guild_id: int) -> None:
+        """Delete guild id from silence group table"""
+        await self.run(self.connector.delete_from_silence_group, guild_id)
+
+    async def close(self) -> None:
+        """Finish queued queries and close database connection"""
+        await self.run(self.connector.close)
+        self.__executor.shutdown()
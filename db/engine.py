@@ -1,6 +1,14 @@
-from typing import List, Tuple
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Tuple, TypeVar
+from weakref import WeakKeyDictionary
+import logging
 import sqlite3
+import threading
+import time
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN, connection, cursor as pg_cursor
+from psycopg2.extras import execute_batch
+from psycopg2.pool import ThreadedConnectionPool
 
 from my_types.database import Engine
 from my_types.database import sql_command
@@ -15,19 +23,74 @@ from my_types.database import (
     CurrentRadioScoreboardDataTable,
     RadioActivityTable,
     SilenceGroupTable,
+    RadioPlayCountTable,
+    StationProbeTable,
+    StationProviderTable,
+    NowPlayingMessageTable,
+    SchemaVersionTable,
+    RadioImportTable,
 )
 
 
 PATH = 'db'
 DATABASE = f'{PATH}/DATABASE.db'
 
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_PRAGMAS = (
+    'PRAGMA journal_mode = WAL;',       # readers don't block writer
+    'PRAGMA synchronous = NORMAL;',     # WAL is durable enough without fsync per commit
+    'PRAGMA cache_size = -8000;',       # 8 MB page cache
+    'PRAGMA temp_store = MEMORY;',
+    'PRAGMA busy_timeout = 5000;',
+)
+
+POSTGRES_POOL_SIZE = 4
+POSTGRES_POOL_MIN = 1
+POSTGRES_CONNECT_TIMEOUT = 5    # seconds
+POSTGRES_KEEPALIVES = {         # dead connection after failover is noticed in ~1 minute
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+}
+POSTGRES_IDLE_CHECK = 10        # seconds idle after which connection is pinged on checkout
+POSTGRES_RETRIES = 2
+POSTGRES_RETRY_DELAY = 0.5      # seconds, doubled after each retry
+POSTGRES_BATCH_PAGE = 100       # rows joined into one statement by execute_batch
+
+_log = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+def is_idempotent(cmd: sql_command) -> bool:
+    """
+    True if repeating statement gives the same result:
+    reads, deletes and upserts which only set the inserted values
+    """
+    statement = cmd.lstrip().upper()
+    if statement.startswith(('SELECT', 'DELETE')):
+        return True
+    action = statement.partition('ON CONFLICT')[2]
+    if 'DO NOTHING' in action:
+        return True
+    assignments = action.partition('DO UPDATE SET')[2]
+    return bool(assignments) and all(
+        assignment.partition('=')[2].strip().startswith('EXCLUDED.')
+        for assignment in assignments.split(','))
+
 
 class SQLite(Engine):   # pylint: disable=too-few-public-methods
     """Engine class for configure tables into SQLite database, set up SQL-commands"""
 
     def __init__(self, db_path: str = DATABASE) -> None:
         super().__init__()
-        self.__path = db_path
+        self.__lock = threading.Lock()
+        # One connection for the whole process, shared between threads under lock
+        self.__connect = sqlite3.connect(
+            db_path, check_same_thread=False, cached_statements=SQLITE_CACHED_STATEMENTS)
+        for pragma in SQLITE_PRAGMAS:
+            self.__connect.execute(pragma)
 
         self.tables = Tables(
             radio=self.__radio,
@@ -38,27 +101,52 @@ class SQLite(Engine):   # pylint: disable=too-few-public-methods
             last_radio_scoreboard_data=self.__last_radio_scoreboard_data,
             current_radio_scoreboard_data=self.__current_radio_scoreboard_data,
             radio_activity=self.__radio_activity,
-            silence_group=self.__silence_group
+            silence_group=self.__silence_group,
+            radio_play_count=self.__radio_play_count,
+            station_probe=self.__station_probe,
+            station_provider=self.__station_provider,
+            now_playing_message=self.__now_playing_message,
+            schema_version=self.__schema_version,
+            radio_import=self.__radio_import
         )
 
     def execute(self, cmd: sql_command, data: tuple = (), method: str = "") \
             -> int | Tuple | List | None:
-        with sqlite3.connect(self.__path) as connect:
+        with self.__lock, self.__connect as connect:
             cursor = connect.cursor()
-            if data:
-                cursor.execute(cmd, data)
-            else:
-                cursor.execute(cmd)
-
-            match method:
-                case "fetchone":
-                    return cursor.fetchone()
-                case "fetchall":
-                    return cursor.fetchall()
-                case "lastrowid":
-                    return cursor.lastrowid
-                case "commit":
-                    connect.commit()
+            try:
+                if data:
+                    cursor.execute(cmd, data)
+                else:
+                    cursor.execute(cmd)
+
+                match method:
+                    case "fetchone":
+                        return cursor.fetchone()
+                    case "fetchall":
+                        return cursor.fetchall()
+                    case "lastrowid":
+                        return cursor.lastrowid
+                    case "commit":
+                        connect.commit()
+            finally:
+                cursor.close()
+
+    def execute_transaction(self, commands: List[Tuple[sql_command, tuple]]) -> None:
+        with self.__lock, self.__connect as connect:
+            # Explicit BEGIN, sqlite3 module doesn't open transaction before DDL
+            connect.execute('BEGIN;')
+            for cmd, data in commands:
+                connect.execute(cmd, data)
+
+    def execute_batch(self, commands: List[Tuple[sql_command, List[tuple]]]) -> None:
+        with self.__lock, self.__connect as connect:
+            for cmd, rows in commands:
+                connect.executemany(cmd, rows)
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connect.close()
 
     @property
     def __radio(self) -> RadioTable:
@@ -137,7 +225,10 @@ class SQLite(Engine):   # pylint: disable=too-few-public-methods
             "WHERE last_scoreboard_data.radio_id = (SELECT id FROM radio WHERE name = ?);"
         delete = "DELETE FROM last_scoreboard_data WHERE "\
             "radio_id = (SELECT id FROM radio WHERE name = ?);"
-        return LastRadioScoreboardDataTable(create, get, insert, update, delete)
+        upsert = "INSERT INTO last_scoreboard_data (radio_id, data) "\
+            "VALUES ((SELECT id FROM radio WHERE name = ?), ?) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET data = excluded.data;"
+        return LastRadioScoreboardDataTable(create, get, insert, update, delete, upsert)
 
     @property
     def __current_radio_scoreboard_data(self) -> CurrentRadioScoreboardDataTable:
@@ -156,7 +247,10 @@ class SQLite(Engine):   # pylint: disable=too-few-public-methods
             "WHERE current_scoreboard_data.radio_id = (SELECT id FROM radio WHERE name = ?);"
         delete = "DELETE FROM current_scoreboard_data WHERE "\
             "radio_id = (SELECT id FROM radio WHERE name = ?);"
-        return CurrentRadioScoreboardDataTable(create, get, insert, update, delete)
+        upsert = "INSERT INTO current_scoreboard_data (radio_id, data) "\
+            "VALUES ((SELECT id FROM radio WHERE name = ?), ?) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET data = excluded.data;"
+        return CurrentRadioScoreboardDataTable(create, get, insert, update, delete, upsert)
 
     @property
     def __radio_activity(self) -> RadioActivityTable:
@@ -166,32 +260,143 @@ class SQLite(Engine):   # pylint: disable=too-few-public-methods
             'guild_id INTEGER NOT NULL, '\
             'channel_id INTEGER NOT NULL);'
         all_data = "SELECT radio_name, guild_id, channel_id FROM radio_activity;"
-        insert = "INSERT INTO radio_activity (radio_name, guild_id, channel_id) VALUES (?, ?, ?);"
+        insert = "INSERT INTO radio_activity (radio_name, guild_id, channel_id) VALUES (?, ?, ?) "\
+            "ON CONFLICT (guild_id) DO UPDATE SET "\
+            "radio_name = excluded.radio_name, channel_id = excluded.channel_id;"
         delete = "DELETE FROM radio_activity WHERE guild_id = ?;"
-        return RadioActivityTable(create, all_data, insert, delete)
+        by_radio = "SELECT radio_name, guild_id, channel_id FROM radio_activity "\
+            "ORDER BY radio_name;"
+        clear = "DELETE FROM radio_activity;"
+        return RadioActivityTable(create, all_data, insert, delete, by_radio, clear)
 
     @property
     def __silence_group(self) -> SilenceGroupTable:
         create = 'CREATE TABLE IF NOT EXISTS silence_group('\
             'id INTEGER PRIMARY KEY AUTOINCREMENT, '\
             'guild_id INTEGER NOT NULL);'
+        select = "SELECT DISTINCT guild_id FROM silence_group;"
         get = "SELECT * FROM silence_group WHERE guild_id = ?;"
-        insert = "INSERT INTO silence_group(guild_id) VALUES(?);"
+        insert = "INSERT INTO silence_group(guild_id) VALUES(?) "\
+            "ON CONFLICT (guild_id) DO NOTHING;"
         delete = "DELETE FROM silence_group WHERE guild_id = ?;"
-        return SilenceGroupTable(create, get, insert, delete)
+        return SilenceGroupTable(create, select, get, insert, delete)
+
+    @property
+    def __radio_play_count(self) -> RadioPlayCountTable:
+        create = 'CREATE TABLE IF NOT EXISTS radio_play_count('\
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '\
+            'radio_id INTEGER NOT NULL UNIQUE, '\
+            'plays INTEGER NOT NULL, '\
+            'FOREIGN KEY (radio_id) REFERENCES radio(id));'
+        top = "SELECT name FROM radio "\
+            "INNER JOIN radio_play_count ON radio.id = radio_play_count.radio_id "\
+            "ORDER BY plays DESC LIMIT ?;"
+        insert = "INSERT INTO radio_play_count (radio_id, plays) "\
+            "VALUES ((SELECT id FROM radio WHERE name = ?), 1) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET plays = radio_play_count.plays + 1;"
+        return RadioPlayCountTable(create, top, insert)
+
+    @property
+    def __station_probe(self) -> StationProbeTable:
+        create = 'CREATE TABLE IF NOT EXISTS station_probe('\
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '\
+            'station_address_id INTEGER NOT NULL UNIQUE, '\
+            'format_name TEXT NOT NULL, '\
+            'codec TEXT NOT NULL, '\
+            'sample_rate INTEGER NOT NULL, '\
+            'channels INTEGER NOT NULL, '\
+            'FOREIGN KEY (station_address_id) REFERENCES station_address(id));'
+        get = "SELECT format_name, codec, sample_rate, channels FROM radio "\
+            "INNER JOIN station_address ON "\
+            "radio.id = station_address.radio_id AND radio.name = ? "\
+            "INNER JOIN station_probe ON "\
+            "station_address.id = station_probe.station_address_id;"
+        insert = "INSERT INTO station_probe "\
+            "(station_address_id, format_name, codec, sample_rate, channels) "\
+            "VALUES ((SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id "\
+            "WHERE radio.name = ?), ?, ?, ?, ?) "\
+            "ON CONFLICT (station_address_id) DO UPDATE SET "\
+            "format_name = excluded.format_name, codec = excluded.codec, "\
+            "sample_rate = excluded.sample_rate, channels = excluded.channels;"
+        delete = "DELETE FROM station_probe WHERE station_address_id IN "\
+            "(SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id "\
+            "WHERE radio.name = ?);"
+        return StationProbeTable(create, get, insert, delete)
+
+    @property
+    def __station_provider(self) -> StationProviderTable:
+        create = 'CREATE TABLE IF NOT EXISTS station_provider('\
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '\
+            'radio_id INTEGER NOT NULL UNIQUE, '\
+            'kind TEXT NOT NULL, '\
+            'options TEXT NOT NULL, '\
+            'FOREIGN KEY (radio_id) REFERENCES radio(id));'
+        get = "SELECT kind, options FROM radio "\
+            "INNER JOIN station_provider ON radio.id = station_provider.radio_id "\
+            "WHERE radio.name = ?;"
+        insert = "INSERT INTO station_provider (radio_id, kind, options) "\
+            "VALUES ((SELECT id FROM radio WHERE name = ?), ?, ?) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET "\
+            "kind = excluded.kind, options = excluded.options;"
+        return StationProviderTable(create, get, insert)
+
+    @property
+    def __now_playing_message(self) -> NowPlayingMessageTable:
+        create = 'CREATE TABLE IF NOT EXISTS now_playing_message('\
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '\
+            'guild_id INTEGER NOT NULL UNIQUE, '\
+            'channel_id INTEGER, '\
+            'message_id INTEGER);'
+        select = "SELECT guild_id, channel_id, message_id FROM now_playing_message;"
+        insert = "INSERT INTO now_playing_message (guild_id, channel_id, message_id) "\
+            "VALUES (?, ?, ?) ON CONFLICT (guild_id) DO UPDATE SET "\
+            "channel_id = excluded.channel_id, message_id = excluded.message_id;"
+        delete = "DELETE FROM now_playing_message WHERE guild_id = ?;"
+        return NowPlayingMessageTable(create, select, insert, delete)
+
+    @property
+    def __schema_version(self) -> SchemaVersionTable:
+        create = 'CREATE TABLE IF NOT EXISTS schema_version('\
+            'version INTEGER PRIMARY KEY, '\
+            'name TEXT NOT NULL);'
+        get = "SELECT MAX(version) FROM schema_version;"
+        insert = "INSERT INTO schema_version (version, name) VALUES (?, ?);"
+        return SchemaVersionTable(create, get, insert)
+
+    @property
+    def __radio_import(self) -> RadioImportTable:
+        radio = "INSERT INTO radio(name) VALUES(?);"
+        station_address = "INSERT INTO station_address(radio_id, url) "\
+            "VALUES((SELECT id FROM radio WHERE name = ?), ?);"
+        station_address_params = "INSERT INTO station_address_params(station_address_id, params) "\
+            "VALUES((SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id WHERE radio.name = ?), ?);"
+        scoreboard_address = "INSERT INTO scoreboard_address(radio_id, url) "\
+            "VALUES((SELECT id FROM radio WHERE name = ?), ?);"
+        scoreboard_address_params = "INSERT INTO scoreboard_address_params"\
+            "(scoreboard_address_id, params) "\
+            "VALUES((SELECT scoreboard_address.id FROM scoreboard_address "\
+            "INNER JOIN radio ON radio.id = scoreboard_address.radio_id WHERE radio.name = ?), ?);"
+        return RadioImportTable(radio, station_address, station_address_params,
+                                scoreboard_address, scoreboard_address_params)
 
 
 class PostgreSQL(Engine):   # pylint: disable=too-few-public-methods
     """Engine class for init connection with PostgreSQL, configure tables, set up SQL-commands"""
 
-    def __init__(self, user: str, password: str, host: str, port: int) -> None:
+    def __init__(self, user: str, password: str, host: str, port: int, *,  # pylint: disable=too-many-arguments
+                 pool_size: int = POSTGRES_POOL_SIZE, pool_min: int = POSTGRES_POOL_MIN) -> None:
         super().__init__()
-        self.__user = user
-        self.__password = password
-        self.__host = host
-        self.__port = port
-
-        self.__connect()
+        # Pool size is per process, keep sum of all bot processes below max_connections
+        self.__pool = ThreadedConnectionPool(
+            pool_min, pool_size, user=user, password=password, host=host, port=port,
+            connect_timeout=POSTGRES_CONNECT_TIMEOUT, **POSTGRES_KEEPALIVES)
+        # getconn() raises instead of waiting when pool is exhausted
+        self.__slots = threading.BoundedSemaphore(pool_size)
+        # Pooled connection -> time it got idle, connections closed by pool drop out
+        self.__returned: WeakKeyDictionary[connection, float] = WeakKeyDictionary()
 
         self.tables = Tables(
             radio=self.__radio,
@@ -202,37 +407,115 @@ class PostgreSQL(Engine):   # pylint: disable=too-few-public-methods
             last_radio_scoreboard_data=self.__last_radio_scoreboard_data,
             current_radio_scoreboard_data=self.__current_radio_scoreboard_data,
             radio_activity=self.__radio_activity,
-            silence_group=self.__silence_group
+            silence_group=self.__silence_group,
+            radio_play_count=self.__radio_play_count,
+            station_probe=self.__station_probe,
+            station_provider=self.__station_provider,
+            now_playing_message=self.__now_playing_message,
+            schema_version=self.__schema_version,
+            radio_import=self.__radio_import
         )
 
-    def __connect(self):
-        self._connect = psycopg2.connect(
-            f"user='{self.__user}' host='{self.__host}' "
-            f"password='{self.__password}' port='{self.__port}'")
+    @contextmanager
+    def __connection(self) -> Iterator[connection]:
+        """Healthy connection from pool, transaction is committed or rolled back on exit"""
+        with self.__slots:
+            connect = self.__checkout()
+            broken = False
+            try:
+                with connect:
+                    yield connect
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                broken = True
+                raise
+            finally:
+                broken = broken or bool(connect.closed)
+                if not broken:
+                    self.__returned[connect] = time.monotonic()
+                self.__pool.putconn(connect, close=broken)
+
+    def __checkout(self) -> connection:
+        """
+        Connection from pool which answers.
+        closed and transaction status change only after a failed operation,
+        so connection idle since before failover is pinged, dead ones are replaced
+        """
+        while True:
+            connect = self.__pool.getconn()
+            idle_since = self.__returned.pop(connect, None)
+            if not connect.closed and \
+                    connect.info.transaction_status != TRANSACTION_STATUS_UNKNOWN and \
+                    (idle_since is None or time.monotonic() - idle_since < POSTGRES_IDLE_CHECK
+                     or self.__alive(connect)):
+                return connect
+            self.__pool.putconn(connect, close=True)
+
+    @staticmethod
+    def __alive(connect: connection) -> bool:
+        try:
+            with connect.cursor() as cur:
+                cur.execute('SELECT 1;')
+            connect.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def __retry(self, work: Callable[[pg_cursor], T], idempotent: bool) -> T:
+        """
+        Run work in one transaction, retry it on a fresh connection if connection is lost.
+        Work may have been applied before connection was lost, so only idempotent one is repeated
+        """
+        attempts = 1 + POSTGRES_RETRIES if idempotent else 1
+        for attempt in range(attempts):
+            try:
+                with self.__connection() as connect, connect.cursor() as cur:
+                    return work(cur)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+                _log.warning('PostgreSQL error, attempt %d of %d: %r', attempt + 1, attempts, error)
+                if attempt + 1 == attempts:
+                    raise
+                time.sleep(POSTGRES_RETRY_DELAY * 2 ** attempt)
+        return None
 
     def execute(self, cmd: sql_command, data: tuple = None, method: str = None) \
             -> int | Tuple | List | None:
-        try:
-            cursor = self._connect.cursor()
-            if data:
-                cursor.execute(cmd, data)
-            else:
-                cursor.execute(cmd)
+        def work(cur: pg_cursor) -> int | Tuple | List | None:
+            cur.execute(cmd, data or None)
             match method:
                 case "fetchone":
-                    return cursor.fetchone()
+                    return cur.fetchone()
                 case "fetchall":
-                    return cursor.fetchall()
+                    return cur.fetchall()
                 case "lastrowid":
-                    return cursor.fetchone()[0]
-            self._connect.commit()
-            cursor.close()
+                    return cur.fetchone()[0]
             return None
-
-        except psycopg2.OperationalError:
-            print("Error:", cmd, data, method)
+        try:
+            return self.__retry(work, is_idempotent(cmd))
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            _log.error('PostgreSQL command failed: %s %s %s', cmd, data, method)
             return None
 
+    def execute_transaction(self, commands: List[Tuple[sql_command, tuple]]) -> None:
+        # Raises, schema must not be used half migrated
+        def work(cur: pg_cursor) -> None:
+            for cmd, data in commands:
+                cur.execute(cmd, data or None)
+        self.__retry(work, all(is_idempotent(cmd) for cmd, _ in commands))
+
+    def execute_batch(self, commands: List[Tuple[sql_command, List[tuple]]]) -> None:
+        def work(cur: pg_cursor) -> None:
+            for cmd, rows in commands:
+                # Unlike cursor.executemany, sends many rows per network round-trip
+                execute_batch(cur, cmd, rows, page_size=POSTGRES_BATCH_PAGE)
+        try:
+            self.__retry(work, all(is_idempotent(cmd) for cmd, _ in commands))
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # Same as execute, lost connection must not stop callers like notification loop
+            _log.error('PostgreSQL batch failed: %s', [cmd for cmd, _ in commands])
+
+    def close(self) -> None:
+        self.__pool.closeall()
+
     @property
     def __radio(self) -> RadioTable:
         create = "CREATE TABLE IF NOT EXISTS radio("\
@@ -307,7 +590,10 @@ class PostgreSQL(Engine):   # pylint: disable=too-few-public-methods
             "WHERE last_scoreboard_data.radio_id = (SELECT id FROM radio WHERE name = %s);"
         delete = "DELETE FROM last_scoreboard_data WHERE "\
             "radio_id = (SELECT id FROM radio WHERE name = %s);"
-        return LastRadioScoreboardDataTable(create, get, insert, update, delete)
+        upsert = "INSERT INTO last_scoreboard_data (radio_id, data) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), %s) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET data = excluded.data;"
+        return LastRadioScoreboardDataTable(create, get, insert, update, delete, upsert)
 
     @property
     def __current_radio_scoreboard_data(self) -> CurrentRadioScoreboardDataTable:
@@ -326,7 +612,10 @@ class PostgreSQL(Engine):   # pylint: disable=too-few-public-methods
             "(SELECT id FROM radio WHERE name = %s);"
         delete = "DELETE FROM current_scoreboard_data WHERE "\
             "radio_id = (SELECT id FROM radio WHERE name = %s);"
-        return CurrentRadioScoreboardDataTable(create, get, insert, update, delete)
+        upsert = "INSERT INTO current_scoreboard_data (radio_id, data) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), %s) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET data = excluded.data;"
+        return CurrentRadioScoreboardDataTable(create, get, insert, update, delete, upsert)
 
     @property
     def __radio_activity(self) -> RadioActivityTable:
@@ -337,16 +626,121 @@ class PostgreSQL(Engine):   # pylint: disable=too-few-public-methods
             "channel_id BIGINT NOT NULL);"
         all_data = "SELECT radio_name, guild_id, channel_id FROM radio_activity;"
         insert = "INSERT INTO radio_activity (radio_name, guild_id, channel_id) "\
-            "VALUES (%s, %s, %s) RETURNING id;"
+            "VALUES (%s, %s, %s) ON CONFLICT (guild_id) DO UPDATE SET "\
+            "radio_name = excluded.radio_name, channel_id = excluded.channel_id RETURNING id;"
         delete = "DELETE FROM radio_activity WHERE guild_id = %s;"
-        return RadioActivityTable(create, all_data, insert, delete)
+        by_radio = "SELECT radio_name, guild_id, channel_id FROM radio_activity "\
+            "ORDER BY radio_name;"
+        clear = "DELETE FROM radio_activity;"
+        return RadioActivityTable(create, all_data, insert, delete, by_radio, clear)
 
     @property
     def __silence_group(self) -> SilenceGroupTable:
         create = "CREATE TABLE IF NOT EXISTS silence_group("\
             "id SERIAL PRIMARY KEY, "\
             "guild_id BIGINT NOT NULL);"
+        select = "SELECT DISTINCT guild_id FROM silence_group;"
         get = "SELECT * FROM silence_group WHERE guild_id = %s;"
-        insert = "INSERT INTO silence_group(guild_id) VALUES(%s) RETURNING id;"
+        insert = "INSERT INTO silence_group(guild_id) VALUES(%s) "\
+            "ON CONFLICT (guild_id) DO NOTHING RETURNING id;"
         delete = "DELETE FROM silence_group WHERE guild_id = %s;"
-        return SilenceGroupTable(create, get, insert, delete)
+        return SilenceGroupTable(create, select, get, insert, delete)
+
+    @property
+    def __radio_play_count(self) -> RadioPlayCountTable:
+        create = "CREATE TABLE IF NOT EXISTS radio_play_count("\
+            "id SERIAL PRIMARY KEY, "\
+            "plays INTEGER NOT NULL, "\
+            "radio_id INTEGER UNIQUE REFERENCES radio (id));"
+        top = "SELECT name FROM radio "\
+            "INNER JOIN radio_play_count ON radio.id = radio_play_count.radio_id "\
+            "ORDER BY plays DESC LIMIT %s;"
+        insert = "INSERT INTO radio_play_count (radio_id, plays) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), 1) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET plays = radio_play_count.plays + 1;"
+        return RadioPlayCountTable(create, top, insert)
+
+    @property
+    def __station_probe(self) -> StationProbeTable:
+        create = "CREATE TABLE IF NOT EXISTS station_probe("\
+            "id SERIAL PRIMARY KEY, "\
+            "format_name TEXT NOT NULL, "\
+            "codec TEXT NOT NULL, "\
+            "sample_rate INTEGER NOT NULL, "\
+            "channels INTEGER NOT NULL, "\
+            "station_address_id INTEGER UNIQUE REFERENCES station_address (id));"
+        get = "SELECT format_name, codec, sample_rate, channels FROM radio "\
+            "INNER JOIN station_address ON "\
+            "radio.id = station_address.radio_id AND radio.name = %s "\
+            "INNER JOIN station_probe ON "\
+            "station_address.id = station_probe.station_address_id;"
+        insert = "INSERT INTO station_probe "\
+            "(station_address_id, format_name, codec, sample_rate, channels) "\
+            "VALUES ((SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id "\
+            "WHERE radio.name = %s), %s, %s, %s, %s) "\
+            "ON CONFLICT (station_address_id) DO UPDATE SET "\
+            "format_name = excluded.format_name, codec = excluded.codec, "\
+            "sample_rate = excluded.sample_rate, channels = excluded.channels;"
+        delete = "DELETE FROM station_probe WHERE station_address_id IN "\
+            "(SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id "\
+            "WHERE radio.name = %s);"
+        return StationProbeTable(create, get, insert, delete)
+
+    @property
+    def __station_provider(self) -> StationProviderTable:
+        create = "CREATE TABLE IF NOT EXISTS station_provider("\
+            "id SERIAL PRIMARY KEY, "\
+            "kind TEXT NOT NULL, "\
+            "options TEXT NOT NULL, "\
+            "radio_id INTEGER UNIQUE REFERENCES radio (id));"
+        get = "SELECT kind, options FROM radio "\
+            "INNER JOIN station_provider ON radio.id = station_provider.radio_id "\
+            "WHERE radio.name = %s;"
+        insert = "INSERT INTO station_provider (radio_id, kind, options) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), %s, %s) "\
+            "ON CONFLICT (radio_id) DO UPDATE SET "\
+            "kind = excluded.kind, options = excluded.options;"
+        return StationProviderTable(create, get, insert)
+
+    @property
+    def __now_playing_message(self) -> NowPlayingMessageTable:
+        create = "CREATE TABLE IF NOT EXISTS now_playing_message("\
+            "id SERIAL PRIMARY KEY, "\
+            "guild_id BIGINT NOT NULL UNIQUE, "\
+            "channel_id BIGINT, "\
+            "message_id BIGINT);"
+        select = "SELECT guild_id, channel_id, message_id FROM now_playing_message;"
+        insert = "INSERT INTO now_playing_message (guild_id, channel_id, message_id) "\
+            "VALUES (%s, %s, %s) ON CONFLICT (guild_id) DO UPDATE SET "\
+            "channel_id = excluded.channel_id, message_id = excluded.message_id;"
+        delete = "DELETE FROM now_playing_message WHERE guild_id = %s;"
+        return NowPlayingMessageTable(create, select, insert, delete)
+
+    @property
+    def __schema_version(self) -> SchemaVersionTable:
+        create = "CREATE TABLE IF NOT EXISTS schema_version("\
+            "version INTEGER PRIMARY KEY, "\
+            "name TEXT NOT NULL);"
+        get = "SELECT MAX(version) FROM schema_version;"
+        insert = "INSERT INTO schema_version (version, name) VALUES (%s, %s);"
+        return SchemaVersionTable(create, get, insert)
+
+    @property
+    def __radio_import(self) -> RadioImportTable:
+        radio = "INSERT INTO radio (name) VALUES (%s);"
+        station_address = "INSERT INTO station_address (radio_id, url) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), %s);"
+        station_address_params = "INSERT INTO station_address_params (station_address_id, params) "\
+            "VALUES ((SELECT station_address.id FROM station_address "\
+            "INNER JOIN radio ON radio.id = station_address.radio_id WHERE radio.name = %s), %s);"
+        scoreboard_address = "INSERT INTO scoreboard_address (radio_id, url) "\
+            "VALUES ((SELECT id FROM radio WHERE name = %s), %s);"
+        scoreboard_address_params = "INSERT INTO scoreboard_address_params "\
+            "(scoreboard_address_id, params) "\
+            "VALUES ((SELECT scoreboard_address.id FROM scoreboard_address "\
+            "INNER JOIN radio ON radio.id = scoreboard_address.radio_id "\
+            "WHERE radio.name = %s), %s);"
+        return RadioImportTable(radio, station_address, station_address_params,
+                                scoreboard_address, scoreboard_address_params)
@@ -0,0 +1,62 @@
+from typing import Tuple
+
+from my_types.database import Migration
+
+# Plain SQL understood by both SQLite and PostgreSQL.
+# Append new migrations with the next version, never edit applied ones
+
+DUPLICATE_RADIO = "SELECT id FROM radio WHERE id NOT IN (SELECT MIN(id) FROM radio GROUP BY name)"
+
+MIGRATIONS: Tuple[Migration, ...] = (
+    Migration(1, 'unique radio name, guild activity and silence', (
+        # Rows of duplicated radio names are dropped, the first radio is kept
+        "DELETE FROM station_probe WHERE station_address_id IN "
+        f"(SELECT id FROM station_address WHERE radio_id IN ({DUPLICATE_RADIO}));",
+        "DELETE FROM station_address_params WHERE station_address_id IN "
+        f"(SELECT id FROM station_address WHERE radio_id IN ({DUPLICATE_RADIO}));",
+        f"DELETE FROM station_address WHERE radio_id IN ({DUPLICATE_RADIO});",
+        "DELETE FROM scoreboard_address_params WHERE scoreboard_address_id IN "
+        f"(SELECT id FROM scoreboard_address WHERE radio_id IN ({DUPLICATE_RADIO}));",
+        f"DELETE FROM scoreboard_address WHERE radio_id IN ({DUPLICATE_RADIO});",
+        f"DELETE FROM last_scoreboard_data WHERE radio_id IN ({DUPLICATE_RADIO});",
+        f"DELETE FROM current_scoreboard_data WHERE radio_id IN ({DUPLICATE_RADIO});",
+        f"DELETE FROM radio_play_count WHERE radio_id IN ({DUPLICATE_RADIO});",
+        f"DELETE FROM station_provider WHERE radio_id IN ({DUPLICATE_RADIO});",
+        f"DELETE FROM radio WHERE id IN ({DUPLICATE_RADIO});",
+        # The newest activity of guild is the radio it listens now
+        "DELETE FROM radio_activity WHERE id NOT IN "
+        "(SELECT MAX(id) FROM radio_activity GROUP BY guild_id);",
+        "DELETE FROM silence_group WHERE id NOT IN "
+        "(SELECT MIN(id) FROM silence_group GROUP BY guild_id);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS radio_name ON radio (name);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS radio_activity_guild_id "
+        "ON radio_activity (guild_id);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS silence_group_guild_id ON silence_group (guild_id);",
+    )),
+    Migration(2, 'index radio foreign keys', (
+        "CREATE INDEX IF NOT EXISTS station_address_radio_id ON station_address (radio_id);",
+        "CREATE INDEX IF NOT EXISTS station_address_params_station_address_id "
+        "ON station_address_params (station_address_id);",
+        "CREATE INDEX IF NOT EXISTS scoreboard_address_radio_id "
+        "ON scoreboard_address (radio_id);",
+        "CREATE INDEX IF NOT EXISTS scoreboard_address_params_scoreboard_address_id "
+        "ON scoreboard_address_params (scoreboard_address_id);",
+        "CREATE INDEX IF NOT EXISTS last_scoreboard_data_radio_id "
+        "ON last_scoreboard_data (radio_id);",
+        "CREATE INDEX IF NOT EXISTS current_scoreboard_data_radio_id "
+        "ON current_scoreboard_data (radio_id);",
+    )),
+    Migration(3, 'one scoreboard row per radio', (
+        # Both rows were always written together, the newest one is current
+        "DELETE FROM last_scoreboard_data WHERE id NOT IN "
+        "(SELECT MAX(id) FROM last_scoreboard_data GROUP BY radio_id);",
+        "DELETE FROM current_scoreboard_data WHERE id NOT IN "
+        "(SELECT MAX(id) FROM current_scoreboard_data GROUP BY radio_id);",
+        "DROP INDEX IF EXISTS last_scoreboard_data_radio_id;",
+        "DROP INDEX IF EXISTS current_scoreboard_data_radio_id;",
+        "CREATE UNIQUE INDEX IF NOT EXISTS last_scoreboard_data_radio "
+        "ON last_scoreboard_data (radio_id);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS current_scoreboard_data_radio "
+        "ON current_scoreboard_data (radio_id);",
+    )),
+)
@@ -0,0 +1,92 @@
+from typing import Dict, List, Set, Tuple
+
+from db.database import AsyncConnect
+
+
+class GuildRecord:  # pylint: disable=too-few-public-methods
+    """Radio which guild listens and text channel for its notifications"""
+    __slots__ = ('radio', 'channel_id')
+
+    def __init__(self, radio: str, channel_id: int) -> None:
+        self.radio = radio
+        self.channel_id = channel_id
+
+
+class GuildRegistry:
+    """
+    In-memory state of guilds: which radio they listen and who silenced notifications.
+    Loaded once from database, every change is written through to database.
+    Memory is changed before awaiting database, so state is consistent between awaits
+    """
+
+    def __init__(self, connector: AsyncConnect) -> None:
+        self.__db = connector
+        self.__guilds: Dict[int, GuildRecord] = {}
+        self.__radios: Dict[str, Set[int]] = {}
+        self.__silenced: Set[int] = set()
+
+    async def load(self) -> None:
+        """Read radio activity and silence group from database"""
+        radios = await self.__db.get_radio_activity_by_radio()
+        silenced = await self.__db.get_silence_group()
+        self.__guilds.clear()
+        self.__radios.clear()
+        for radio, activities in radios.items():
+            self.__radios[radio] = {activity.guild_id for activity in activities}
+            for activity in activities:
+                self.__guilds[activity.guild_id] = GuildRecord(radio, activity.channel_id)
+        self.__silenced = set(silenced)
+
+    @property
+    def radios(self) -> List[str]:
+        """Radios which are listened by at least one guild"""
+        return list(self.__radios)
+
+    def subscribers(self, radio: str) -> List[Tuple[int, int]]:
+        """(guild id, channel id) of every guild which listens radio"""
+        return [(guild_id, self.__guilds[guild_id].channel_id)
+                for guild_id in self.__radios.get(radio, ())]
+
+    def radio_of(self, guild_id: int) -> str | None:
+        """Radio which guild listens"""
+        record = self.__guilds.get(guild_id)
+        return record.radio if record else None
+
+    async def listen(self, guild_id: int, channel_id: int, radio: str) -> None:
+        """Guild starts listening radio, notifications go to channel"""
+        self.__forget(guild_id)
+        self.__remember(guild_id, channel_id, radio)
+        # Activity row of guild is replaced, guild_id is unique
+        await self.__db.set_radio_activity(guild_id, channel_id, radio)
+
+    async def leave(self, guild_id: int) -> None:
+        """Guild stops listening"""
+        if self.__forget(guild_id):
+            await self.__db.delete_radio_activity(guild_id)
+
+    def is_silenced(self, guild_id: int) -> bool:
+        """True if guild turned notifications off"""
+        return guild_id in self.__silenced
+
+    async def silence(self, guild_id: int, silenced: bool) -> None:
+        """Turn notifications of guild off or on"""
+        if silenced and guild_id not in self.__silenced:
+            self.__silenced.add(guild_id)
+            await self.__db.add_in_silence_group(guild_id)
+        elif not silenced and guild_id in self.__silenced:
+            self.__silenced.discard(guild_id)
+            await self.__db.delete_from_silence_group(guild_id)
+
+    def __remember(self, guild_id: int, channel_id: int, radio: str) -> None:
+        self.__guilds[guild_id] = GuildRecord(radio, channel_id)
+        self.__radios.setdefault(radio, set()).add(guild_id)
+
+    def __forget(self, guild_id: int) -> bool:
+        record = self.__guilds.pop(guild_id, None)
+        if record is None:
+            return False
+        guilds = self.__radios[record.radio]
+        guilds.discard(guild_id)
+        if not guilds:
+            del self.__radios[record.radio]
+        return True
@@ -4,7 +4,9 @@ from discord import Intents
 from discord.ext import commands
 
 from db.engine import SQLite
-from db.database import Connect
+from db.database import AsyncConnect, Connect
+from guilds import GuildRegistry
+from radio import ScoreboardClient
 from setup import add_radio, clear_activity
 from discord_token import TOKEN
 
@@ -25,6 +27,9 @@ class Bot(commands.Bot):
 
     def __init__(self, connector: Connect):
         self.connector = connector
+        self.database = AsyncConnect(connector)
+        self.guild_registry = GuildRegistry(self.database)
+        self.scoreboard_client = ScoreboardClient()
         intents = Intents.all()
         super().__init__(
             command_prefix=commands.when_mentioned_or('>'),
@@ -32,9 +37,16 @@ class Bot(commands.Bot):
         )
 
     async def setup_hook(self):
+        await self.scoreboard_client.open()
+        await self.guild_registry.load()
         for extension in extensions:
             await self.load_extension(extension)
 
+    async def close(self):
+        await super().close()
+        await self.scoreboard_client.close()
+        await self.database.close()
+
 
 def main():
     """main function for run application"""
@@ -0,0 +1,50 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterable, Tuple
+
+SAMPLES_LIMIT = 1000
+
+
+class Metrics:
+    """In-process counters and timing samples, shown by bot status commands"""
+
+    def __init__(self, samples_limit: int = SAMPLES_LIMIT) -> None:
+        self.__samples_limit = samples_limit
+        self.__counters: Dict[str, int] = {}
+        self.__samples: Dict[str, Deque[float]] = {}
+        self.__lock = threading.Lock()
+
+    def inc(self, name: str, value: int = 1) -> None:
+        """Increase counter"""
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        """Save timing sample, only last samples_limit values are kept"""
+        with self.__lock:
+            samples = self.__samples.setdefault(
+                name, deque(maxlen=self.__samples_limit))
+            samples.append(value)
+
+    def counter(self, name: str) -> int:
+        """Get counter value"""
+        return self.__counters.get(name, 0)
+
+    def percentiles(self, name: str, percents: Iterable[int] = (50, 95, 99)) \
+            -> Tuple[float, ...] | None:
+        """Get percentiles of saved samples or None if there are no samples"""
+        with self.__lock:
+            samples = sorted(self.__samples.get(name, ()))
+        if not samples:
+            return None
+        return tuple(samples[min(len(samples) - 1, len(samples) * percent // 100)]
+                     for percent in percents)
+
+    def counters(self, prefix: str = '') -> Dict[str, int]:
+        """Snapshot of counters which names start with prefix"""
+        with self.__lock:
+            return {name: value for name, value in self.__counters.items()
+                    if name.startswith(prefix)}
+
+
+METRICS = Metrics()
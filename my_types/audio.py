@@ -0,0 +1,28 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class StreamKey:
+    """
+    Key of shared station stream.
+    Guilds with equal key listen to the same ffmpeg process
+    """
+    radio: str
+    opus: bool = False
+    volume: int = 100
+    bitrate: int = 64   # kbps, Opus encoder tier
+
+
+@dataclass(frozen=True)
+class Upstream:
+    """Station upstream url with ffmpeg input options"""
+    url: str
+    before_options: str | None = None
+
+
+@dataclass
+class DecoderUsage:
+    """Resources used by ffmpeg decoder process"""
+    pid: int
+    cpu_percent: float
+    rss_mb: float
@@ -1,7 +1,13 @@
 from dataclasses import dataclass
-from typing import List, Tuple, TypeAlias, Any
+from typing import Dict, List, Tuple, TypeAlias, Any
 from abc import ABC, abstractmethod
-from my_types.radio import StationAddress, StationScoreboardAddress, Station
+from my_types.radio import (
+    StationAddress,
+    StationScoreboardAddress,
+    Station,
+    StationProbe,
+    StationProvider
+)
 
 
 @dataclass
@@ -12,11 +18,27 @@ class RadioActivity:
     channel_id: int
 
 
+@dataclass
+class Migration:
+    """Numbered schema change, its commands are applied in one transaction"""
+    version: int
+    name: str
+    commands: Tuple[str, ...]
+
+
+@dataclass
+class NowPlayingMessage:
+    """Struct for storing edited now playing message of guild"""
+    guild_id: int
+    channel_id: int | None
+    message_id: int | None
+
+
 sql_command: TypeAlias = str
 lastrowid: TypeAlias = int
 
 
-class Connector(ABC):
+class Connector(ABC):  # pylint: disable=too-many-public-methods
     """Abstract Connector class for show need methods and hinting"""
     @abstractmethod
     def get_radio_list(self) -> List[str | None]:
@@ -35,6 +57,10 @@ class Connector(ABC):
         scoreboard_params: dict = None) -> None:    # pylint: disable=too-many-arguments
         """Insert data into radio and scoreboard table"""
 
+    @abstractmethod
+    def set_radios(self, stations: List[Station]) -> None:
+        """Insert stations which are not in radio table, all in one transaction"""
+
     @abstractmethod
     def get_radio(self, radio_name: str) -> Station:
         """Get data from radio table"""
@@ -51,6 +77,14 @@ class Connector(ABC):
     def get_radio_activity(self) -> List[RadioActivity] | None:
         """Get all data from radio activity table"""
 
+    @abstractmethod
+    def get_radio_activity_by_radio(self) -> Dict[str, List[RadioActivity]]:
+        """Get all data from radio activity table grouped by radio name"""
+
+    @abstractmethod
+    def clear_radio_activity(self) -> None:
+        """Delete all data from radio activity table"""
+
     @abstractmethod
     def get_last_scoreboard(self, radio_name: str) -> str | None:
         """Get data from last scoreboard table"""
@@ -83,6 +117,55 @@ class Connector(ABC):
     def delete_current_scoreboard(self, radio_name: str) -> None:
         """Delete radio_name row from current scoreboard table"""
 
+    @abstractmethod
+    def upsert_scoreboard(self, radio_name: str, data: str) -> None:
+        """Insert or update radio_name row in current and last scoreboard tables at once"""
+
+    @abstractmethod
+    def add_radio_play(self, radio_name: str) -> None:
+        """Increase play counter of radio"""
+
+    @abstractmethod
+    def get_popular_radio(self, limit: int) -> List[str]:
+        """Get most played radio names"""
+
+    @abstractmethod
+    def get_station_probe(self, radio_name: str) -> StationProbe | None:
+        """Get cached probe result of radio upstream"""
+
+    @abstractmethod
+    def set_station_probe(self, radio_name: str, probe: StationProbe) -> None:
+        """Insert or replace probe result of radio upstream"""
+
+    @abstractmethod
+    def delete_station_probe(self, radio_name: str) -> None:
+        """Delete probe result of radio upstream"""
+
+    @abstractmethod
+    def get_station_provider(self, radio_name: str) -> StationProvider | None:
+        """Get scoreboard provider of radio"""
+
+    @abstractmethod
+    def set_station_provider(self, radio_name: str, provider: StationProvider) -> None:
+        """Insert or replace scoreboard provider of radio"""
+
+    @abstractmethod
+    def get_now_playing_messages(self) -> List[NowPlayingMessage]:
+        """Get now playing messages of guilds which turned on edit mode"""
+
+    @abstractmethod
+    def set_now_playing_message(self, guild_id: int, channel_id: int | None,
+                                message_id: int | None) -> None:
+        """Insert or replace now playing message of guild"""
+
+    @abstractmethod
+    def delete_now_playing_message(self, guild_id: int) -> None:
+        """Delete now playing message of guild"""
+
+    @abstractmethod
+    def get_silence_group(self) -> List[int]:
+        """Get all guild ids from silence group table"""
+
     @abstractmethod
     def get_from_silence_group(self, guild_id: int) -> Tuple[int]:
         """Get (id, guild_id) from silence group table"""
@@ -95,6 +178,14 @@ class Connector(ABC):
     def add_in_silence_group(self, guild_id: int) -> None:
         """Insert guild id into silence group table"""
 
+    @abstractmethod
+    def get_schema_version(self) -> int:
+        """Get version of the last applied migration"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Close connection of database engine"""
+
 
 @dataclass
 class RadioTable:
@@ -142,6 +233,7 @@ class LastRadioScoreboardDataTable:
     set: sql_command
     update: sql_command
     delete: sql_command
+    upsert: sql_command
 
 
 @dataclass
@@ -152,6 +244,7 @@ class CurrentRadioScoreboardDataTable:
     set: sql_command
     update: sql_command
     delete: sql_command
+    upsert: sql_command
 
 
 @dataclass
@@ -161,17 +254,72 @@ class RadioActivityTable:
     list: sql_command
     set: sql_command
     delete: sql_command
+    by_radio: sql_command
+    clear: sql_command
 
 
 @dataclass
 class SilenceGroupTable:
     """Raw commands struct for work with silence_group table"""
     create: sql_command
+    list: sql_command
     get: sql_command
     set: sql_command
     delete: sql_command
 
 
+@dataclass
+class RadioPlayCountTable:
+    """Raw commands struct for work with radio_play_count table"""
+    create: sql_command
+    list: sql_command
+    set: sql_command
+
+
+@dataclass
+class StationProbeTable:
+    """Raw commands struct for work with station_probe table"""
+    create: sql_command
+    get: sql_command
+    set: sql_command
+    delete: sql_command
+
+
+@dataclass
+class StationProviderTable:
+    """Raw commands struct for work with station_provider table"""
+    create: sql_command
+    get: sql_command
+    set: sql_command
+
+
+@dataclass
+class NowPlayingMessageTable:
+    """Raw commands struct for work with now_playing_message table"""
+    create: sql_command
+    list: sql_command
+    set: sql_command
+    delete: sql_command
+
+
+@dataclass
+class RadioImportTable:
+    """Raw commands struct for bulk insert of stations, rows are linked by radio name"""
+    radio: sql_command
+    station_address: sql_command
+    station_address_params: sql_command
+    scoreboard_address: sql_command
+    scoreboard_address_params: sql_command
+
+
+@dataclass
+class SchemaVersionTable:
+    """Raw commands struct for work with schema_version table"""
+    create: sql_command
+    get: sql_command
+    set: sql_command
+
+
 @dataclass
 class Tables:   # pylint: disable=too-many-instance-attributes
     """Struct for works with raw commands in database"""
@@ -184,6 +332,12 @@ class Tables:   # pylint: disable=too-many-instance-attributes
     current_radio_scoreboard_data: CurrentRadioScoreboardDataTable
     radio_activity: RadioActivityTable
     silence_group: SilenceGroupTable
+    radio_play_count: RadioPlayCountTable
+    station_probe: StationProbeTable
+    station_provider: StationProviderTable
+    now_playing_message: NowPlayingMessageTable
+    schema_version: SchemaVersionTable
+    radio_import: RadioImportTable
 
 
 class Engine(ABC):  # pylint: disable=too-few-public-methods
@@ -200,3 +354,14 @@ class Engine(ABC):  # pylint: disable=too-few-public-methods
         data: Any | None
         method: str set method as "fetchone", "fetchall", "lastrowid", "commit"
         """
+
+    @abstractmethod
+    def execute_transaction(self, commands: List[Tuple[sql_command, tuple]]) -> None:
+        """Execute (cmd, data) pairs in one transaction, nothing is applied on error"""
+
+    @abstractmethod
+    def execute_batch(self, commands: List[Tuple[sql_command, List[tuple]]]) -> None:
+        """Execute every DML cmd for all its rows in one transaction, nothing is applied on error"""
+
+    def close(self) -> None:
+        """Close database connection"""
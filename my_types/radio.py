@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -24,9 +24,28 @@ class Station:
 
 
 @dataclass
+class StationProbe:
+    """Stream parameters of station upstream found by ffprobe"""
+    format_name: str
+    codec: str
+    sample_rate: int
+    channels: int
+
+
+@dataclass
+class StationProvider:
+    """
+    Scoreboard provider of station, kind is key in provider registry
+    and options are provider specific settings
+    """
+    kind: str
+    options: dict = field(default_factory=dict)
+
+
+@dataclass(frozen=True, slots=True)
 class MusicInfo:
     """
-    Music info struct
+    Music info struct, immutable and hashable to compare tracks cheaply
     """
     artist: str = None
     title: str = None
@@ -36,11 +55,14 @@ class MusicInfo:
 
     @property
     def __formatted_text(self):
-        text = f"Music: {self.artist} - {self.title}\n"\
-            f"Year: {self.year}\n"\
-            f"Duration: {self.duration}\n"\
-            f"Composer: {self.composer}"
-        return text
+        song = f"{self.artist} - {self.title}" if self.artist else self.title
+        lines = [f"Music: {song}"]
+        # Stream metadata such as ICY carries only artist and title
+        for name, value in (('Year', self.year), ('Duration', self.duration),
+                            ('Composer', self.composer)):
+            if value is not None:
+                lines.append(f"{name}: {value}")
+        return '\n'.join(lines)
 
     def __repr__(self) -> str:
         return self.__formatted_text
@@ -5,6 +5,7 @@ import re
 import aiohttp
 
 from my_types.radio import MusicInfo, StationScoreboardAddress
+from scoreboard.fastjson import loads
 
 
 def wtf_time_to_std_time(wtf_time: str = None) -> str:
@@ -20,41 +21,132 @@ def wtf_time_to_std_time(wtf_time: str = None) -> str:
     return duration.strftime("%M:%S.%f")[:-3]
 
 
-def __update_time_in_scoreboard(scoreboard: StationScoreboardAddress) -> StationScoreboardAddress:
+def std_time_to_seconds(std_time: str = None) -> float | None:
+    '''
+    Get std_time type(str) as "mm:ss.ms"
+    return seconds or None if time is unknown
+    '''
+    regex_result = re.match(r"^(\d+):(\d+)\.(\d+)$", std_time or "")
+    if regex_result is None:
+        return None
+    minute, secs, millisecs = map(int, regex_result.groups())
+    seconds = minute * 60 + secs + millisecs / 1000
+    return seconds or None
+
+
+def parse_samcloud(payload: bytes | str) -> MusicInfo | None:
+    """Get current song from samcloud scoreboard response"""
+    marker = b'm_Item2' if isinstance(payload, bytes) else 'm_Item2'
+    if marker not in payload:
+        return None
+    try:
+        content = loads(payload)
+    except ValueError:
+        return None
+    info = content.get('m_Item2') if isinstance(content, dict) else None
+    if not isinstance(info, dict):
+        return None
+    return MusicInfo(
+        artist=info.get('Artist'),
+        title=info.get('Title'),
+        year=info.get('Year'),
+        duration=wtf_time_to_std_time(info.get('Duration') or ''),
+        composer=info.get('Composer'),
+    )
+
+
+def update_time_in_scoreboard(scoreboard: StationScoreboardAddress) -> StationScoreboardAddress:
+    """Set anti-cache timestamp param of scoreboard request"""
     scoreboard.params['_'] = str(int(time.time() // 1))
     return scoreboard
 
 
-async def __request_get(url: str, params: dict):
-    with open('headers.json', 'r', encoding="utf-8") as json_file:
-        headers = json.load(json_file)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url=url, params=params, headers=headers) as response:
+HEADERS_FILE = 'headers.json'
+CONNECTIONS_LIMIT = 100
+CONNECTIONS_PER_HOST = 10
+DNS_CACHE_TTL = 300     # seconds
+REQUEST_TIMEOUT = 10    # seconds
+
+
+class ScoreboardClient:
+    """
+    Long-lived HTTP client for scoreboard polling.
+    Keeps alive connections, caches DNS and loads headers only once
+    """
+
+    def __init__(self, headers_file: str = HEADERS_FILE) -> None:
+        self.__headers_file = headers_file
+        self.__session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self) -> 'ScoreboardClient':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """Create HTTP session, call from running event loop"""
+        with open(self.__headers_file, 'r', encoding="utf-8") as json_file:
+            headers = json.load(json_file)
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTIONS_LIMIT,
+            limit_per_host=CONNECTIONS_PER_HOST,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        self.__session = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+        )
+
+    async def close(self) -> None:
+        """Close HTTP session and its connections"""
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def get(self, url: str, params: dict) -> str | None:
+        """GET request, return response text or None if status is not 200"""
+        async with self.__session.get(url=url, params=params) as response:
             if response.status == 200:
-                data = await response.text()
-            else:
-                return None
-    return data
+                return await response.text()
+            return None
 
+    async def read(self, url: str, params: dict = None) -> bytes | None:
+        """GET request, return raw response body or None if status is not 200"""
+        async with self.__session.get(url=url, params=params) as response:
+            if response.status == 200:
+                return await response.read()
+            return None
 
-async def what_plays_on_asiadreamradio(scoreboard: StationScoreboardAddress) -> MusicInfo | None:
-    """Getting info about current song play in asiadreamradio"""
+    def stream(self, url: str, headers: dict = None):
+        """
+        GET request of endless stream as async context manager of response.
+        Only connect and every socket read are limited by timeout
+        """
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=REQUEST_TIMEOUT, sock_read=REQUEST_TIMEOUT)
+        return self.__session.get(url=url, headers=headers, timeout=timeout)
+
+
+async def __request_get(url: str, params: dict, client: ScoreboardClient = None):
+    if client is not None:
+        return await client.get(url, params)
+    async with ScoreboardClient() as temporary_client:
+        return await temporary_client.get(url, params)
+
+
+async def what_plays_on_asiadreamradio(scoreboard: StationScoreboardAddress,
+                                       client: ScoreboardClient = None) -> MusicInfo | None:
+    """
+    Getting info about current song play in asiadreamradio.
+    Pass bot-owned client to reuse its connections
+    """
     if scoreboard is None or scoreboard.params is None:
         return None
-    __update_time_in_scoreboard(scoreboard)
-    response = await __request_get(scoreboard.url, scoreboard.params)
+    update_time_in_scoreboard(scoreboard)
+    response = await __request_get(scoreboard.url, scoreboard.params, client)
     if response is None:
         return None
-    try:
-        content: dict = json.loads(response)
-        info = content.get('m_Item2')
-        assert info is not None
-        return MusicInfo(
-            artist=info.get('Artist'),
-            title=info.get('Title'),
-            year=info.get('Year'),
-            duration=wtf_time_to_std_time(info.get('Duration')),
-            composer=info.get('Composer'),
-        )
-    except json.decoder.JSONDecodeError:
-        return None
+    return parse_samcloud(response)
@@ -0,0 +1,123 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict
+
+import aiohttp
+
+from metrics import METRICS
+from my_types.radio import MusicInfo
+
+_log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+FAILURE_THRESHOLD = 3   # failures in a row which open breaker
+OPEN_DELAY = 30         # seconds before the first half-open probe
+OPEN_DELAY_MAX = 1800   # doubled after each failed probe up to this limit
+
+
+class EndpointHealth:   # pylint: disable=too-few-public-methods
+    """Breaker state and last known track of one scoreboard endpoint"""
+    __slots__ = ('state', 'failures', 'delay', 'retry_at', 'last_error', 'last_track')
+
+    def __init__(self, delay: float = OPEN_DELAY) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self.delay = delay
+        self.retry_at = 0.0
+        self.last_error: str | None = None
+        self.last_track: MusicInfo | None = None
+
+
+class CircuitBreakers:
+    """
+    Per endpoint circuit breaker.
+    Endpoint which fails FAILURE_THRESHOLD times in a row is not requested
+    until backoff delay passes, then one half-open probe decides whether it is back.
+    Last known track is served while endpoint is failing
+    """
+
+    def __init__(self, threshold: int = FAILURE_THRESHOLD, delay: float = OPEN_DELAY,
+                 delay_max: float = OPEN_DELAY_MAX,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.__threshold = threshold
+        self.__delay = delay
+        self.__delay_max = delay_max
+        self.__clock = clock
+        self.__endpoints: Dict[str, EndpointHealth] = {}
+
+    @property
+    def endpoints(self) -> Dict[str, EndpointHealth]:
+        """Health of every requested endpoint"""
+        return dict(self.__endpoints)
+
+    def allow(self, endpoint: str) -> bool:
+        """True if endpoint may be requested now, open breaker lets through one probe"""
+        health = self.__health(endpoint)
+        if health.state == CLOSED:
+            return True
+        if health.state == OPEN and self.__clock() >= health.retry_at:
+            health.state = HALF_OPEN
+            return True
+        return False
+
+    def success(self, endpoint: str, track: MusicInfo) -> None:
+        """Close breaker and remember track"""
+        health = self.__health(endpoint)
+        if health.state != CLOSED:
+            _log.info('Scoreboard "%s" is back after %d failures', endpoint, health.failures)
+        health.state = CLOSED
+        health.failures = 0
+        health.delay = self.__delay
+        health.last_track = track
+
+    def failure(self, endpoint: str, error: str) -> None:
+        """Count failure, open breaker after threshold or failed probe"""
+        health = self.__health(endpoint)
+        health.failures += 1
+        health.last_error = error
+        if health.state == HALF_OPEN:
+            health.delay = min(health.delay * 2, self.__delay_max)
+        elif health.state == OPEN or health.failures < self.__threshold:
+            return
+        health.state = OPEN
+        health.retry_at = self.__clock() + health.delay
+        METRICS.inc('scoreboard.breaker.opened')
+        _log.warning('Scoreboard "%s" is broken (%s), next try in %d s',
+                     endpoint, error, health.delay)
+
+    def last_track(self, endpoint: str) -> MusicInfo | None:
+        """Last track received from endpoint"""
+        health = self.__endpoints.get(endpoint)
+        return health.last_track if health else None
+
+    def __health(self, endpoint: str) -> EndpointHealth:
+        health = self.__endpoints.get(endpoint)
+        if health is None:
+            health = self.__endpoints[endpoint] = EndpointHealth(self.__delay)
+        return health
+
+    async def call(self, endpoint: str,
+                   request: Callable[[], Awaitable[MusicInfo | None]]) -> MusicInfo | None:
+        """Request endpoint through breaker, stale track is returned on error"""
+        if not self.allow(endpoint):
+            METRICS.inc('scoreboard.breaker.skipped')
+            return self.last_track(endpoint)
+        try:
+            track = await request()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as error:
+            self.failure(endpoint, repr(error))
+            return self.last_track(endpoint)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # Provider failed to parse response, the breaker must not stay half-open
+            _log.exception('Scoreboard "%s" request failed', endpoint)
+            self.failure(endpoint, repr(error))
+            return self.last_track(endpoint)
+        if track is None:
+            self.failure(endpoint, 'no track in response')
+            return self.last_track(endpoint)
+        self.success(endpoint, track)
+        return track
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Tuple
+
+import discord
+
+from metrics import METRICS
+
+_log = logging.getLogger(__name__)
+
+DISPATCH_CONCURRENCY = 16   # messages sent to discord at once
+
+Send = Callable[[], Awaitable[object]]
+
+
+class NotificationDispatcher:
+    """
+    Send notifications concurrently, one at a time per rate-limit bucket.
+    Discord limits message creation per channel, so channel id is the bucket.
+    Notification waiting in bucket is dropped when a newer one is submitted
+    """
+
+    def __init__(self, concurrency: int = DISPATCH_CONCURRENCY) -> None:
+        self.__semaphore = asyncio.Semaphore(concurrency)
+        self.__pending: Dict[Hashable, Tuple[Send, float]] = {}
+        self.__workers: Dict[Hashable, asyncio.Task] = {}
+
+    @property
+    def queued(self) -> int:
+        """Count of notifications waiting to be sent"""
+        return len(self.__pending)
+
+    def submit(self, bucket: Hashable, send: Send) -> None:
+        """Queue notification, older not sent notification of bucket is superseded"""
+        if bucket in self.__pending:
+            METRICS.inc('notify.superseded')
+        self.__pending[bucket] = (send, time.perf_counter())
+        if bucket not in self.__workers:
+            self.__workers[bucket] = asyncio.create_task(self.__drain(bucket))
+
+    async def join(self) -> None:
+        """Wait until all queued notifications are sent"""
+        while self.__workers:
+            await asyncio.gather(*self.__workers.values(), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Drop queued notifications and stop sending"""
+        self.__pending.clear()
+        workers = list(self.__workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    async def __drain(self, bucket: Hashable) -> None:
+        try:
+            while bucket in self.__pending:
+                async with self.__semaphore:
+                    # Taken only when slot is free, so waiting notification can still be replaced
+                    send, queued = self.__pending.pop(bucket, (None, 0.0))
+                    if send is None:
+                        break
+                    try:
+                        await send()
+                    except discord.HTTPException as error:
+                        _log.warning('Notification to "%s" failed: %r', bucket, error)
+                        continue
+                    except Exception:  # pylint: disable=broad-exception-caught
+                        # Worker keeps running, next notification of bucket is still sent
+                        _log.exception('Notification to "%s" failed', bucket)
+                        continue
+                    METRICS.observe('notify.delivery', time.perf_counter() - queued)
+        finally:
+            self.__workers.pop(bucket, None)
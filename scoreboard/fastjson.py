@@ -0,0 +1,8 @@
+"""
+JSON decoding for scoreboard payloads.
+orjson is used when it is installed, both decoders raise ValueError on bad input
+"""
+try:
+    from orjson import loads    # pylint: disable=no-name-in-module,unused-import
+except ImportError:
+    from json import loads      # pylint: disable=unused-import
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, Iterable, List
+
+import aiohttp
+
+from my_types.radio import MusicInfo
+from radio import ScoreboardClient
+
+_log = logging.getLogger(__name__)
+
+ICY_HEADERS = {'Icy-MetaData': '1'}
+READ_CHUNK = 16 * 1024
+RECONNECT_DELAY = 1     # seconds, doubled after each failed reconnect
+RECONNECT_DELAY_MAX = 60
+
+TrackCallback = Callable[[str, MusicInfo], Awaitable[None]]
+
+__STREAM_TITLE = re.compile(r"StreamTitle='(.*?)';(?=\w+=|$)", re.DOTALL)
+
+
+def parse_stream_title(block: bytes) -> MusicInfo | None:
+    """Get track from ICY metadata block as "StreamTitle='Artist - Title';" """
+    text = block.rstrip(b'\x00').decode('utf-8', errors='replace').strip()
+    regex_result = __STREAM_TITLE.search(text)
+    if regex_result is None or not regex_result.group(1).strip():
+        return None
+    artist, separator, title = regex_result.group(1).strip().partition(' - ')
+    if not separator:
+        return MusicInfo(title=artist)
+    return MusicInfo(artist=artist, title=title)
+
+
+class IcyMetadataParser:    # pylint: disable=too-few-public-methods
+    """
+    Split ICY stream into metadata blocks.
+    Audio between blocks is skipped without copying
+    """
+
+    def __init__(self, metaint: int) -> None:
+        self.__metaint = metaint
+        self.__audio_left = metaint
+        self.__meta_left: int | None = None
+        self.__meta = bytearray()
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """Consume next piece of stream, return completed metadata blocks"""
+        blocks = []
+        position = 0
+        while position < len(chunk):
+            if self.__audio_left:
+                skip = min(self.__audio_left, len(chunk) - position)
+                self.__audio_left -= skip
+                position += skip
+            elif self.__meta_left is None:
+                self.__meta_left = chunk[position] * 16
+                position += 1
+                if not self.__meta_left:
+                    self.__finish_block()
+            else:
+                end = min(position + self.__meta_left, len(chunk))
+                self.__meta += chunk[position:end]
+                self.__meta_left -= end - position
+                position = end
+                if not self.__meta_left:
+                    blocks.append(bytes(self.__meta))
+                    self.__finish_block()
+        return blocks
+
+    def __finish_block(self) -> None:
+        self.__meta.clear()
+        self.__meta_left = None
+        self.__audio_left = self.__metaint
+
+
+class IcyUnsupported(Exception):
+    """Station stream doesn't carry ICY metadata"""
+
+
+async def read_icy(client: ScoreboardClient, url: str):
+    """Async generator of tracks from ICY metadata of station stream"""
+    async with client.stream(url, ICY_HEADERS) as response:
+        metaint = response.headers.get('icy-metaint', '')
+        if response.status != 200 or not metaint.isdigit() or not int(metaint):
+            raise IcyUnsupported(url)
+        parser = IcyMetadataParser(int(metaint))
+        async for chunk in response.content.iter_chunked(READ_CHUNK):
+            for block in parser.feed(chunk):
+                info = parse_stream_title(block)
+                if info is not None:
+                    yield info
+
+
+class IcyWatcher:
+    """
+    Keep metadata-only connection to stream of every watched station
+    and report track change as soon as ICY metadata block arrives
+    """
+
+    def __init__(self, client: ScoreboardClient, on_track: TrackCallback) -> None:
+        self.__client = client
+        self.__on_track = on_track
+        self.__tasks: Dict[str, asyncio.Task] = {}
+        self.__live: set[str] = set()
+        self.__pending: set[str] = set()    # first connection is not finished yet
+        self.__unsupported: set[str] = set()
+
+    def covers(self, radio: str) -> bool:
+        """True if station track is reported by watcher and needn't to be polled"""
+        return radio in self.__live or radio in self.__pending
+
+    @property
+    def live(self) -> int:
+        """Count of stations which ICY connection delivers metadata now"""
+        return len(self.__live)
+
+    def watch(self, radios: Iterable[str], stream_url: Callable[[str], str | None]) -> None:
+        """Watch exactly given stations, stream_url is called only for new ones"""
+        radios = set(radios)
+        for radio in set(self.__tasks) - radios:
+            self.__tasks.pop(radio).cancel()
+            self.__live.discard(radio)
+            self.__pending.discard(radio)
+        for radio in radios - set(self.__tasks) - self.__unsupported:
+            url = stream_url(radio)
+            if url is not None:
+                self.__pending.add(radio)
+                self.__tasks[radio] = asyncio.create_task(
+                    self.__run(radio, url), name=f'icy:{radio}')
+
+    async def close(self) -> None:
+        """Close all ICY connections"""
+        tasks = list(self.__tasks.values())
+        self.__tasks.clear()
+        self.__live.clear()
+        self.__pending.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __run(self, radio: str, url: str) -> None:
+        delay = RECONNECT_DELAY
+        last: str | None = None
+        while True:
+            try:
+                async for info in read_icy(self.__client, url):
+                    self.__live.add(radio)
+                    delay = RECONNECT_DELAY
+                    if repr(info) != last:
+                        last = repr(info)
+                        await self.__report(radio, info)
+            except IcyUnsupported:
+                _log.info('Stream of "%s" has no ICY metadata', radio)
+                self.__unsupported.add(radio)
+                return
+            except (asyncio.TimeoutError, aiohttp.ClientError) as error:
+                _log.warning('ICY stream of "%s" dropped: %r', radio, error)
+            finally:
+                self.__live.discard(radio)
+                self.__pending.discard(radio)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, RECONNECT_DELAY_MAX)
+
+    async def __report(self, radio: str, info: MusicInfo) -> None:
+        try:
+            await self.__on_track(radio, info)
+        except Exception:   # pylint: disable=broad-exception-caught
+            _log.exception('Track change of "%s" is not reported', radio)
@@ -0,0 +1,170 @@
+import logging
+from abc import ABC, abstractmethod
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Any, Dict, Tuple, Type
+
+from audio.sources import station_url
+from my_types.radio import MusicInfo, Station, StationProvider
+from radio import ScoreboardClient, parse_samcloud, update_time_in_scoreboard
+from scoreboard.fastjson import loads
+from scoreboard.icy import IcyUnsupported, parse_stream_title, read_icy
+
+_log = logging.getLogger(__name__)
+
+MUSIC_FIELDS = ('artist', 'title', 'year', 'duration', 'composer')
+
+
+class ScoreboardProvider(ABC):
+    """Source of info about song which plays on radio station now"""
+
+    def __init__(self, client: ScoreboardClient) -> None:
+        self.client = client
+
+    @abstractmethod
+    def endpoint(self, station: Station, options: dict) -> str | None:
+        """Url which is requested for song of station, key of its health state"""
+
+    @abstractmethod
+    async def now_playing(self, station: Station, options: dict) -> MusicInfo | None:
+        """Current song of station or None if it is unknown"""
+
+    @abstractmethod
+    def parse(self, payload: bytes, options: dict) -> MusicInfo | None:
+        """Get song from raw provider response, None if response is not valid"""
+
+
+class SamcloudProvider(ScoreboardProvider):
+    """Song from samcloud scoreboard of station"""
+
+    def endpoint(self, station: Station, options: dict) -> str | None:
+        scoreboard = station.scoreboard_address
+        return scoreboard.url if scoreboard else None
+
+    async def now_playing(self, station: Station, options: dict) -> MusicInfo | None:
+        scoreboard = station.scoreboard_address
+        if scoreboard is None or scoreboard.params is None:
+            return None
+        update_time_in_scoreboard(scoreboard)
+        payload = await self.client.read(scoreboard.url, scoreboard.params)
+        return None if payload is None else self.parse(payload, options)
+
+    def parse(self, payload: bytes, options: dict) -> MusicInfo | None:
+        return parse_samcloud(payload)
+
+
+class IcyProvider(ScoreboardProvider):
+    """Song from ICY metadata of station stream, read until the first metadata block"""
+
+    def endpoint(self, station: Station, options: dict) -> str | None:
+        return station.station_address.url
+
+    async def now_playing(self, station: Station, options: dict) -> MusicInfo | None:
+        tracks = read_icy(self.client, station_url(station.station_address))
+        try:
+            async with aclosing(tracks):
+                async for info in tracks:
+                    return info
+        except IcyUnsupported:
+            return None
+        return None
+
+    def parse(self, payload: bytes, options: dict) -> MusicInfo | None:
+        return parse_stream_title(payload)
+
+
+@lru_cache(maxsize=256)
+def split_path(path: str) -> Tuple[str | int, ...]:
+    """Split "now.0.title" into dict keys and list indexes"""
+    return tuple(int(step) if step.isdigit() else step for step in path.split('.'))
+
+
+def json_path(content: Any, path: str) -> Any:
+    """Value found by dotted path in decoded JSON or None"""
+    for step in split_path(path):
+        if isinstance(step, int) and isinstance(content, list):
+            content = content[step] if step < len(content) else None
+        elif isinstance(content, dict):
+            content = content.get(step)
+        else:
+            return None
+    return content
+
+
+class JsonPathProvider(ScoreboardProvider):
+    """
+    Song from any JSON scoreboard.
+    options: "url", optional "params" and dotted path per song field,
+    as {"title": "now.0.title", "artist": "now.0.artist"}. Title path is required
+    """
+
+    def endpoint(self, station: Station, options: dict) -> str | None:
+        return options.get('url')
+
+    async def now_playing(self, station: Station, options: dict) -> MusicInfo | None:
+        payload = await self.client.read(options['url'], options.get('params'))
+        return None if payload is None else self.parse(payload, options)
+
+    def parse(self, payload: bytes, options: dict) -> MusicInfo | None:
+        try:
+            content = loads(payload)
+        except ValueError:
+            return None
+        values = {name: json_path(content, options[name])
+                  for name in MUSIC_FIELDS if name in options}
+        if not values.get('title'):
+            return None
+        duration = values.get('duration')
+        if isinstance(duration, (int, float)):
+            minute, secs = divmod(duration, 60)
+            values['duration'] = f'{int(minute):02d}:{secs:06.3f}'
+        return MusicInfo(**{name: value if value is None else str(value)
+                            for name, value in values.items()})
+
+
+PROVIDERS: Dict[str, Type[ScoreboardProvider]] = {
+    'samcloud': SamcloudProvider,
+    'icy': IcyProvider,
+    'jsonpath': JsonPathProvider,
+}
+
+
+def default_provider(station: Station) -> StationProvider:
+    """Provider of station without stored one, stations were samcloud only before"""
+    return StationProvider('samcloud' if station.scoreboard_address else 'icy')
+
+
+class ProviderRegistry:
+    """One provider instance per provider kind, shared by all stations"""
+
+    def __init__(self, client: ScoreboardClient,
+                 providers: Dict[str, Type[ScoreboardProvider]] = None) -> None:
+        self.__providers = {kind: provider(client)
+                            for kind, provider in (providers or PROVIDERS).items()}
+
+    def get(self, kind: str) -> ScoreboardProvider | None:
+        """Provider by kind or None if kind is unknown"""
+        return self.__providers.get(kind)
+
+    def endpoint(self, station: Station, provider: StationProvider = None) -> str | None:
+        """Endpoint requested for song of station, None if provider is unknown"""
+        provider = provider or default_provider(station)
+        instance = self.get(provider.kind)
+        return instance.endpoint(station, provider.options) if instance else None
+
+    def icy_url(self, station: Station, provider: StationProvider = None) -> str | None:
+        """Stream url watched for ICY metadata, None if station is polled by other provider"""
+        provider = provider or default_provider(station)
+        if provider.kind != 'icy' or station.station_address is None:
+            return None
+        return station_url(station.station_address)
+
+    async def now_playing(self, station: Station,
+                          provider: StationProvider = None) -> MusicInfo | None:
+        """Current song of station from its provider"""
+        provider = provider or default_provider(station)
+        instance = self.get(provider.kind)
+        if instance is None:
+            _log.warning('Unknown scoreboard provider "%s" of "%s"', provider.kind, station.name)
+            return None
+        return await instance.now_playing(station, provider.options)
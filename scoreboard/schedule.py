@@ -0,0 +1,62 @@
+from typing import Dict, Iterable, List
+
+from my_types.radio import MusicInfo
+from radio import std_time_to_seconds
+
+FALLBACK_INTERVAL = 30  # seconds, used while track duration is unknown
+MIN_INTERVAL = 5        # dense polling near expected track change
+MAX_INTERVAL = 180      # longest back off in the middle of track
+BOUNDARY_LEAD = 10      # dense polling starts this long before expected track end
+OVERRUN_GRACE = 60      # dense polling lasts this long after expected track end
+
+
+class StationSchedule:   # pylint: disable=too-few-public-methods
+    """Poll plan of one station"""
+    __slots__ = ('track', 'ends_at', 'next_poll')
+
+    def __init__(self) -> None:
+        self.track: str | None = None
+        self.ends_at: float | None = None
+        self.next_poll = 0.0
+
+
+class PollScheduler:
+    """
+    Plan next scoreboard poll of every station from track start time and duration.
+    Poll rarely in the middle of track and densely near its expected end
+    """
+
+    def __init__(self) -> None:
+        self.__stations: Dict[str, StationSchedule] = {}
+
+    def due(self, radios: Iterable[str], now: float) -> List[str]:
+        """Radios which should be polled now, forget radios nobody listens"""
+        radios = list(radios)
+        for radio in set(self.__stations) - set(radios):
+            del self.__stations[radio]
+        return [radio for radio in radios
+                if self.__stations.setdefault(radio, StationSchedule()).next_poll <= now]
+
+    def update(self, radio: str, info: MusicInfo | None, now: float) -> None:
+        """Save poll result and plan next poll"""
+        station = self.__stations.setdefault(radio, StationSchedule())
+        if info is not None and repr(info) != station.track:
+            duration = std_time_to_seconds(info.duration)
+            # Start time of the first seen track is unknown, track change time is known
+            if station.track is not None and duration:
+                station.ends_at = now + duration
+            else:
+                station.ends_at = None
+            station.track = repr(info)
+        station.next_poll = now + self.__interval(station, now)
+
+    @staticmethod
+    def __interval(station: StationSchedule, now: float) -> float:
+        if station.ends_at is None:
+            return FALLBACK_INTERVAL
+        until_end = station.ends_at - now
+        if until_end > BOUNDARY_LEAD:
+            return min(until_end - BOUNDARY_LEAD, MAX_INTERVAL)
+        if until_end > -OVERRUN_GRACE:
+            return MIN_INTERVAL
+        return FALLBACK_INTERVAL
@@ -0,0 +1,40 @@
+import hashlib
+from typing import Dict
+
+from db.database import AsyncConnect
+from my_types.radio import MusicInfo
+
+DIGEST_SIZE = 16
+
+
+def track_digest(text: str) -> bytes:
+    """Stable hash of track text, unlike hash() it doesn't change between runs"""
+    return hashlib.blake2b(text.encode(), digest_size=DIGEST_SIZE).digest()
+
+
+class TrackState:
+    """
+    Last notified track of every station kept in memory.
+    Track change is found without database, which is written only on change
+    """
+
+    def __init__(self, connector: AsyncConnect) -> None:
+        self.__db = connector
+        self.__digests: Dict[str, bytes] = {}
+
+    async def load(self) -> None:
+        """Rebuild state from last scoreboard table, call once at startup"""
+        for radio in await self.__db.get_radio_list():
+            last = await self.__db.get_last_scoreboard(radio)
+            if last is not None:
+                self.__digests[radio] = track_digest(last)
+
+    async def update(self, radio: str, info: MusicInfo) -> bool:
+        """Remember track of station, return True and save it only if track is changed"""
+        text = repr(info)
+        digest = track_digest(text)
+        if self.__digests.get(radio) == digest:
+            return False
+        self.__digests[radio] = digest
+        await self.__db.upsert_scoreboard(radio, text)
+        return True
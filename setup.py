@@ -108,19 +108,8 @@ BASIC_STATIONS = {
 
 def add_radio(connector: Engine):
     """Func to add basic radiostation into database"""
-    radio_list = connector.get_radio_list()
-    for radio, data in BASIC_STATIONS.items():
-        if radio not in radio_list:
-            connector.set_radio(
-                radio,
-                data.station_address.url,
-                data.station_address.params,
-                data.scoreboard_address.url,
-                data.scoreboard_address.params
-            )
+    connector.set_radios(list(BASIC_STATIONS.values()))
 
 def clear_activity(connector: Engine):
     """Func to clear radio activity table"""
-    activity_list = connector.get_radio_activity()
-    for activity in activity_list:
-        connector.delete_radio_activity(activity.guild_id)
+    connector.clear_radio_activity()
@@ -0,0 +1,519 @@
+import asyncio
+import gc
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import numpy
+import pytest
+
+from discord import AudioSource, ClientException
+from discord.player import OPUS_SILENCE
+
+from audio.broadcast import BroadcastManager, PCM_SILENCE
+from audio.listeners import ListenerCounter
+from audio.playback import PlaybackQueue
+from audio.pool import DRAIN_FRAMES, WarmPool, WarmSource
+from audio.probe import before_options, parse_probe
+from audio.scheduler import CLOCK_TICKS, PAGE_SIZE, PlaybackScheduler, process_usage
+from audio.sources import bitrate_tier, ffmpeg_options
+from audio.volume import VolumeTransformer
+from metrics import METRICS
+from my_types.audio import StreamKey, Upstream
+from my_types.radio import StationProbe
+
+FRAME = b'\x01' * len(PCM_SILENCE)
+STATION_KEY = StreamKey('test')
+OPUS_STATION_KEY = StreamKey('test', opus=True, volume=50)
+UPSTREAM = Upstream('http://radio.com/')
+GUILD_ID = 321
+PROBE = StationProbe('mp3', 'mp3', 44100, 2)
+FFPROBE_OUTPUT = b'{"programs": [], "streams": [{"codec_name": "mp3", '\
+    b'"sample_rate": "44100", "channels": 2}], "format": {"format_name": "mp3"}}'
+
+
+class FakeSource(AudioSource):
+    """AudioSource which gives frames only after release"""
+
+    spawned = 0
+
+    def __init__(self, frames: int = 3, delay: float = 0) -> None:
+        FakeSource.spawned += 1
+        self.frames = frames
+        self.delay = delay
+        self.released = threading.Event()
+        self.cleaned = threading.Event()
+
+    def read(self) -> bytes:
+        self.released.wait(5)
+        time.sleep(self.delay)
+        if self.frames <= 0:
+            return b''
+        self.frames -= 1
+        return FRAME
+
+    def cleanup(self) -> None:
+        self.cleaned.set()
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    """Wait until condition is true"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_broadcast_fan_out():
+    """Test one upstream is shared between all readers"""
+    manager = BroadcastManager()
+    source = FakeSource()
+    FakeSource.spawned = 0
+    first = manager.subscribe(STATION_KEY, lambda key: source)
+    second = manager.subscribe(STATION_KEY, lambda key: FakeSource())
+    source.released.set()
+    assert source.cleaned.wait(5)
+    assert FakeSource.spawned == 0
+    for reader in (first, second):
+        assert [reader.read() for _ in range(4)] == [FRAME, FRAME, FRAME, PCM_SILENCE]
+        reader.cleanup()
+
+
+def test_broadcast_stop_on_last_reader():
+    """Test upstream is closed when last reader leave"""
+    manager = BroadcastManager()
+    source = FakeSource(frames=1000, delay=0.001)
+    first = manager.subscribe(STATION_KEY, lambda key: source)
+    second = manager.subscribe(STATION_KEY, lambda key: source)
+    assert first.read() == PCM_SILENCE
+    first.cleanup()
+    source.released.set()
+    assert not source.cleaned.wait(0.1)
+    second.cleanup()
+    assert source.cleaned.wait(5)
+    assert wait_for(lambda: not manager.broadcasters)
+
+
+def test_broadcast_reconnect(monkeypatch):
+    """Test dropped upstream is reconnected and reader keeps playing"""
+    monkeypatch.setattr('audio.broadcast.RECONNECT_DELAY', 0.01)
+    monkeypatch.setattr('audio.broadcast.REBUFFER_FRAMES', 2)
+    sources = []
+
+    def factory(key):
+        assert key == STATION_KEY
+        source = FakeSource(frames=2)
+        source.released.set()
+        sources.append(source)
+        return source
+
+    reconnects = METRICS.counter(f'audio.reconnects.{STATION_KEY.radio}')
+    underruns = METRICS.counter(f'audio.underruns.{STATION_KEY.radio}')
+    manager = BroadcastManager()
+    reader = manager.subscribe(STATION_KEY, factory)
+    assert wait_for(lambda: len(sources) >= 3)
+    reader.cleanup()
+    assert wait_for(lambda: not manager.broadcasters)
+    assert METRICS.counter(f'audio.reconnects.{STATION_KEY.radio}') > reconnects
+    frames = [reader.read() for _ in range(6)]
+    assert frames[:4] == [FRAME] * 4
+    assert METRICS.counter(f'audio.underruns.{STATION_KEY.radio}') == underruns
+
+
+def test_reader_rebuffer(monkeypatch):
+    """Test reader plays silence after underrun until buffer is refilled"""
+    monkeypatch.setattr('audio.broadcast.REBUFFER_FRAMES', 2)
+    manager = BroadcastManager()
+    source = FakeSource()
+    reader = manager.subscribe(STATION_KEY, lambda key: source)
+    underruns = METRICS.counter(f'audio.underruns.{STATION_KEY.radio}')
+    reader.push(FRAME)
+    assert reader.read() == FRAME
+    assert reader.read() == PCM_SILENCE
+    reader.push(FRAME)
+    assert reader.read() == PCM_SILENCE
+    reader.push(FRAME)
+    assert [reader.read(), reader.read()] == [FRAME, FRAME]
+    assert METRICS.counter(f'audio.underruns.{STATION_KEY.radio}') == underruns + 1
+    reader.cleanup()
+    source.released.set()
+    assert source.cleaned.wait(5)
+
+
+def test_opus_reader():
+    """Test opus reader gives opus silence while upstream is connecting"""
+    manager = BroadcastManager()
+    source = FakeSource()
+    reader = manager.subscribe(OPUS_STATION_KEY, lambda key: source)
+    assert reader.is_opus()
+    assert reader.read() == OPUS_SILENCE
+    reader.cleanup()
+    source.released.set()
+    assert source.cleaned.wait(5)
+
+
+def test_warm_pool():
+    """Test warm pool gives connected reader and refill itself"""
+    sources = []
+
+    def factory(key, upstream):
+        assert (key, upstream) == (STATION_KEY, UPSTREAM)
+        source = FakeSource(frames=1000, delay=0.001)
+        source.released.set()
+        sources.append(source)
+        return source
+
+    pool = WarmPool(factory, size=1)
+    assert pool.take(STATION_KEY) is None
+    pool.set_targets({STATION_KEY: UPSTREAM})
+    assert wait_for(lambda: pool.ready)
+    source = pool.take(STATION_KEY)
+    assert source.read() == FRAME
+    sources[0].frames = 1
+    assert [source.read() for _ in range(DRAIN_FRAMES + 1)][-1] == b''
+    pool.close()
+    assert len(sources) <= 2
+
+
+def test_warm_pool_idle():
+    """Test reader which isn't taken expires and its station isn't warmed until played"""
+    sources = []
+
+    def factory(*_):
+        source = FakeSource(frames=1000, delay=0.001)
+        source.released.set()
+        sources.append(source)
+        return source
+
+    pool = WarmPool(factory, size=1, idle_timeout=0.1)
+    pool.set_targets({STATION_KEY: UPSTREAM})
+    assert wait_for(lambda: pool.ready)
+    time.sleep(0.2)
+    pool.set_targets({STATION_KEY: UPSTREAM})
+    assert sources[0].cleaned.is_set()
+    time.sleep(0.1)
+    assert len(sources) == 1 and pool.ready == 0
+    assert pool.take(STATION_KEY) is None
+    assert wait_for(lambda: pool.ready)
+    assert len(sources) == 2
+    pool.close()
+
+
+def test_warm_pool_drain():
+    """Test pooled reader is drained and keeps only latest frames"""
+    sources = []
+
+    def factory(*_):
+        source = FakeSource(frames=50)
+        source.released.set()
+        sources.append(source)
+        return source
+
+    pool = WarmPool(factory, size=1)
+    pool.set_targets({STATION_KEY: UPSTREAM})
+    # Upstream ended while pooled, the reader is dropped
+    assert wait_for(lambda: sources and sources[0].cleaned.is_set())
+    assert sources[0].frames == 0
+    assert pool.ready == 0
+    pool.close()
+
+    source = WarmSource(FakeSource(frames=50), FRAME)
+    source.original.released.set()
+    while source.drain():
+        pass
+    assert [source.read() for _ in range(DRAIN_FRAMES + 1)] == [FRAME] * DRAIN_FRAMES + [b'']
+    assert not source.drain()
+
+
+def test_ffmpeg_options():
+    """Test volume of stream key is applied by ffmpeg filter"""
+    assert ffmpeg_options(STATION_KEY) is None
+    assert ffmpeg_options(OPUS_STATION_KEY) == '-filter:a volume=0.50 -compression_level 6'
+
+
+def test_bitrate_tier():
+    """Test encoder tier is chosen from voice channel bitrate"""
+    assert bitrate_tier(8000) == 32
+    assert bitrate_tier(64000) == 64
+    assert bitrate_tier(100000) == 96
+    assert bitrate_tier(384000) == 384
+
+
+def test_broadcast_failure():
+    """Test failure is reported when upstream ends before first frame"""
+    failed = []
+    manager = BroadcastManager(on_failure=failed.append)
+    source = FakeSource(frames=0)
+    reader = manager.subscribe(STATION_KEY, lambda key: source)
+    source.released.set()
+    assert wait_for(lambda: failed)
+    assert failed[0] == STATION_KEY
+    assert reader.read() == PCM_SILENCE
+    reader.cleanup()
+    assert wait_for(lambda: not manager.broadcasters)
+
+
+class ExitingSource(FakeSource):
+    """FakeSource behind ffmpeg process which exits with given code when frames end"""
+
+    def __init__(self, frames: int, returncode: int) -> None:
+        super().__init__(frames)
+        self._process = SimpleNamespace(pid=42, wait=lambda timeout: returncode)
+        self.released.set()
+
+
+@pytest.mark.parametrize('returncode', [1, 0])
+def test_broadcast_failure_after_frames(returncode):
+    """Test failure is reported when ffmpeg exits with error in the middle of stream"""
+    reported = []
+    manager = BroadcastManager(on_failure=reported.append)
+    reconnected = FakeSource()
+    sources = [ExitingSource(5, returncode), reconnected]
+    reader = manager.subscribe(STATION_KEY, lambda key: sources.pop(0))
+    assert wait_for(lambda: not sources)
+    assert reported == ([STATION_KEY] if returncode else [])
+    reader.cleanup()
+    reconnected.released.set()
+    assert wait_for(lambda: not manager.broadcasters)
+
+
+def test_parse_probe():
+    """Test parse ffprobe output"""
+    assert parse_probe(FFPROBE_OUTPUT) == PROBE
+    assert parse_probe(b'{"streams": []}') is None
+    assert parse_probe(b'') is None
+
+
+def test_before_options():
+    """Test known format skips ffmpeg analysis"""
+    assert before_options(None) is None
+    assert before_options(PROBE) == '-f mp3 -probesize 32 -analyzeduration 0'
+
+
+class OpusSource(AudioSource):
+    """Source which gives opus packets"""
+
+    def read(self) -> bytes:
+        return OPUS_SILENCE
+
+    def is_opus(self) -> bool:
+        return True
+
+
+class ConstantSource(AudioSource):
+    """Source which gives the same PCM frame"""
+
+    def __init__(self, frame: bytes) -> None:
+        self.frame = frame
+
+    def read(self) -> bytes:
+        return self.frame
+
+
+def samples(frame: bytes) -> numpy.ndarray:
+    """Decode 16 bit PCM frame"""
+    return numpy.frombuffer(frame, dtype=numpy.int16)
+
+
+def test_volume_transformer():
+    """Test gain is applied to frame and clipped"""
+    frame = numpy.full(len(PCM_SILENCE) // 2, 30000, dtype=numpy.int16).tobytes()
+    source = VolumeTransformer(ConstantSource(frame))
+    assert source.read() is frame
+    source = VolumeTransformer(ConstantSource(frame), 0.5)
+    assert (samples(source.read()) == 15000).all()
+    source = VolumeTransformer(ConstantSource(frame), 1.5)
+    assert (samples(source.read()) == 32767).all()
+    source = VolumeTransformer(ConstantSource(frame), 0)
+    assert source.read() == PCM_SILENCE
+
+
+def test_volume_transformer_ramp():
+    """Test volume change is ramped over one frame"""
+    frame = numpy.full(len(PCM_SILENCE) // 2, 10000, dtype=numpy.int16).tobytes()
+    source = VolumeTransformer(ConstantSource(frame))
+    source.volume = 0.5
+    ramp = samples(source.read())
+    assert ramp[0] == ramp[1] == 10000
+    assert 5000 < ramp[-1] < 5100
+    assert (numpy.diff(ramp) <= 0).all()
+    assert (samples(source.read()) == 5000).all()
+
+
+def test_volume_transformer_opus(monkeypatch):
+    """Test opus source can't be transformed and rejected transformer is deleted cleanly"""
+    unraisable = []
+    monkeypatch.setattr(sys, 'unraisablehook', unraisable.append)
+    with pytest.raises(ClientException):
+        VolumeTransformer(OpusSource())
+    gc.collect()
+    assert not unraisable
+
+
+def test_process_usage(tmp_path):
+    """Test read decoder usage from /proc"""
+    (tmp_path / '42').mkdir()
+    (tmp_path / '42' / 'stat').write_text(
+        '42 (ffmpeg (x)) S 1 42 42 0 -1 0 0 0 0 0 300 100 0 0 20 0 3 0 1000 0 0',
+        encoding='utf-8')
+    (tmp_path / '42' / 'statm').write_text('1000 256 100 1 0 500 0', encoding='utf-8')
+    (tmp_path / 'uptime').write_text('50.00 100.00', encoding='utf-8')
+    usage = process_usage(42, proc=str(tmp_path))
+    assert usage.pid == 42
+    cpu_seconds = 400 / CLOCK_TICKS
+    assert usage.cpu_percent == pytest.approx(100 * cpu_seconds / (50 - 1000 / CLOCK_TICKS))
+    assert usage.rss_mb == pytest.approx(256 * PAGE_SIZE / 2 ** 20)
+    assert process_usage(43, proc=str(tmp_path)) is None
+
+
+@pytest.mark.asyncio
+async def test_playback_scheduler(monkeypatch):
+    """Test new decoder waits for free slot and existing stream is always admitted"""
+    monkeypatch.setattr('audio.scheduler.QUEUE_POLL', 0.01)
+    monkeypatch.setattr('audio.scheduler.host_saturated', lambda: False)
+    live = {STATION_KEY}
+    scheduler = PlaybackScheduler(live.__contains__, live.__len__,
+                                  max_decoders=1, queue_timeout=0.05)
+    assert await scheduler.admit(STATION_KEY)
+    assert not await scheduler.admit(OPUS_STATION_KEY)
+    assert scheduler.queued == 0
+    live.clear()
+    assert await scheduler.admit(OPUS_STATION_KEY)
+
+
+@pytest.mark.asyncio
+async def test_playback_scheduler_shed(monkeypatch):
+    """Test warm readers are counted as decoders and shed before listener is rejected"""
+    monkeypatch.setattr('audio.scheduler.host_saturated', lambda: False)
+    live = {STATION_KEY}
+    warm = [OPUS_STATION_KEY]
+
+    def shed():
+        return bool(warm) and warm.pop() is not None
+    scheduler = PlaybackScheduler(live.__contains__, lambda: len(live) + len(warm),
+                                  max_decoders=2, queue_timeout=0, shed=shed)
+    assert await scheduler.admit(StreamKey('other'))
+    assert not warm
+    live.add(StreamKey('other'))
+    assert not await scheduler.admit(StreamKey('third'))
+
+
+def test_warm_pool_shed():
+    """Test pool counts its readers and stops the oldest one on shed"""
+    def factory(*_):
+        source = FakeSource(frames=1000, delay=0.001)
+        source.released.set()
+        return source
+
+    pool = WarmPool(factory, size=2)
+    pool.set_targets({STATION_KEY: UPSTREAM, OPUS_STATION_KEY: UPSTREAM})
+    assert pool.decoders == 2
+    assert wait_for(lambda: pool.ready == 2)
+    assert pool.decoders == 2 and not pool.pids
+    assert pool.shed()
+    assert pool.decoders == pool.ready == 1
+    assert pool.shed()
+    assert not pool.shed()
+    pool.close()
+
+
+@pytest.mark.asyncio
+async def test_playback_queue():
+    """Test burst of requests starts only the last one"""
+    queue = PlaybackQueue(window=0.05)
+    started = []
+
+    async def start(radio):
+        await asyncio.sleep(0.01)
+        started.append(radio)
+        return True
+
+    assert await queue.request(GUILD_ID, lambda: start('first'))
+    results = await asyncio.gather(*(
+        queue.request(GUILD_ID, lambda radio=radio: start(radio))
+        for radio in ('second', 'third', 'fourth')))
+    assert results == [False, False, True]
+    assert started == ['first', 'fourth']
+
+
+@pytest.mark.asyncio
+async def test_playback_queue_cancel():
+    """Test pending request is dropped by cancel"""
+    queue = PlaybackQueue(window=0.05)
+    await queue.request(GUILD_ID, lambda: asyncio.sleep(0, True))
+    pending = asyncio.ensure_future(queue.request(GUILD_ID, lambda: asyncio.sleep(0, True)))
+    await asyncio.sleep(0)
+    queue.cancel(GUILD_ID)
+    assert not await pending
+
+
+def voice_channel(channel_id: int, humans: int = 0) -> SimpleNamespace:
+    """Voice channel with human members and the bot"""
+    members = [SimpleNamespace(bot=False) for _ in range(humans)]
+    return SimpleNamespace(id=channel_id, members=members + [SimpleNamespace(bot=True)])
+
+
+@pytest.fixture(name="counter")
+def fixture_counter():
+    """Listener counter with short grace period, left channels are exposed as counter.left"""
+    left = []
+
+    async def on_empty(channel):
+        left.append(channel.id)
+    counter = ListenerCounter(on_empty, grace=0.05)
+    counter.left = left
+    yield counter
+    counter.close()
+
+
+@pytest.mark.asyncio
+async def test_listener_counter(counter):
+    """Test join and leave of humans are counted, empty channel is left after grace"""
+    channel = voice_channel(1, humans=1)
+    counter.bot_moved(None, channel)
+    assert counter.listeners(1) == 1 and not counter.leaving(1)
+    counter.member_moved(None, channel)
+    counter.member_moved(voice_channel(2), channel)
+    assert counter.listeners(1) == 3
+    for _ in range(3):
+        counter.member_moved(channel, None)
+    assert counter.listeners(1) == 0 and counter.leaving(1)
+    counter.member_moved(channel, None)
+    assert counter.listeners(1) == 0
+    counter.member_moved(None, voice_channel(2))
+    assert counter.listeners(2) is None
+    await asyncio.sleep(0.1)
+    assert counter.left == [1] and not counter.leaving(1)
+
+
+@pytest.mark.asyncio
+async def test_listener_counter_rejoin(counter):
+    """Test listener joining during grace period cancels leaving"""
+    channel = voice_channel(1)
+    counter.bot_moved(None, channel)
+    assert counter.listeners(1) == 0 and counter.leaving(1)
+    counter.member_moved(None, channel)
+    assert not counter.leaving(1)
+    await asyncio.sleep(0.1)
+    assert not counter.left
+    counter.member_moved(channel, None)
+    await asyncio.sleep(0.1)
+    assert counter.left == [1]
+
+
+@pytest.mark.asyncio
+async def test_listener_counter_bot_move(counter):
+    """Test bot moved out of empty channel forgets it and counts new channel"""
+    counter.bot_moved(None, voice_channel(1))
+    assert counter.leaving(1)
+    counter.bot_moved(voice_channel(1), voice_channel(2, humans=2))
+    assert counter.listeners(1) is None and not counter.leaving(1)
+    assert counter.listeners(2) == 2 and not counter.leaving(2)
+    counter.sync([voice_channel(3)])
+    assert counter.listeners(2) is None and counter.leaving(3)
+    counter.bot_moved(voice_channel(3), None)
+    await asyncio.sleep(0.1)
+    assert not counter.left
@@ -0,0 +1,318 @@
+import asyncio
+import itertools
+import threading
+import time
+from types import SimpleNamespace
+
+import discord
+import pytest
+import pytest_asyncio
+
+from audio.broadcast import BroadcastManager
+from cogs.music import Radio
+from cogs.notificator import RadioNotify
+from db.database import AsyncConnect, Connect
+from db.engine import SQLite
+from guilds import GuildRegistry
+from my_types.radio import MusicInfo, StationProbe
+from tests.audio_test import FakeSource
+
+RADIO = 'test'
+SCOREBOARD_RADIO = 'scoreboard'
+GUILD_ID = 321
+CHANNEL_ID = 123
+CHANNEL_ID2 = 789
+VOICE_CHANNEL_ID = 456
+
+
+class FakeVoiceClient:
+    """Voice client which remembers played source"""
+
+    def __init__(self) -> None:
+        self.channel = SimpleNamespace(id=VOICE_CHANNEL_ID, bitrate=64000)
+        self.source = None
+
+    def is_connected(self) -> bool:
+        """Always connected"""
+        return True
+
+    def is_playing(self) -> bool:
+        """True after play"""
+        return self.source is not None
+
+    def play(self, source, **_) -> None:
+        """Remember source"""
+        self.source = source
+
+    async def disconnect(self) -> None:
+        """Stop playing like discord does"""
+        if self.source is not None:
+            self.source.cleanup()
+            self.source = None
+
+
+def fake_context(voice_client: FakeVoiceClient) -> SimpleNamespace:
+    """Command context of guild with voice client"""
+    async def send(_):
+        pass
+    return SimpleNamespace(
+        voice_client=voice_client, send=send,
+        message=SimpleNamespace(guild=SimpleNamespace(id=GUILD_ID),
+                                channel=SimpleNamespace(id=CHANNEL_ID)))
+
+
+@pytest.fixture(name="connector")
+def fixture_connector(tmp_path):
+    """Connector to database with one radio"""
+    connector = Connect(SQLite(db_path=str(tmp_path / 'cogs.db')))
+    connector.set_radio(RADIO, 'http://radio.com/', {})
+    connector.set_radio(SCOREBOARD_RADIO, 'http://radio.com/', {}, 'http://radio.com/now',
+                        {'mount': 'radio'})
+    return connector
+
+
+@pytest_asyncio.fixture(name="radio_cog")
+async def fixture_radio_cog(connector, monkeypatch):
+    """Radio cog with fake ffmpeg and probe, broadcast manager is exposed as cog.manager"""
+    managers = []
+
+    class RecordingManager(BroadcastManager):
+        """BroadcastManager which is remembered by test"""
+
+        def __init__(self, *args, **kwargs) -> None:
+            super().__init__(*args, **kwargs)
+            managers.append(self)
+
+    def ffmpeg_source(*_):
+        source = FakeSource(frames=10000, delay=0.001)
+        source.released.set()
+        return source
+
+    async def probe_station(_):
+        return None
+
+    monkeypatch.setattr('cogs.music.BroadcastManager', RecordingManager)
+    monkeypatch.setattr('cogs.music.ffmpeg_source', ffmpeg_source)
+    monkeypatch.setattr('cogs.music.probe_station', probe_station)
+    database = AsyncConnect(connector)
+    guilds = GuildRegistry(database)
+    await guilds.load()
+    bot = SimpleNamespace(database=database, guild_registry=guilds,
+                          loop=asyncio.get_running_loop(), voice_clients=[])
+    cog = Radio(bot)
+    cog.manager = managers[0]
+    yield cog
+    await cog.cog_unload()
+    await database.close()
+
+
+async def wait_until(condition, timeout: float = 5) -> bool:
+    """Wait on event loop until condition is true"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+
+@pytest.mark.asyncio
+async def test_cancelled_start_stops_broadcaster(radio_cog, connector):
+    """Test startup stopped after subscribe doesn't leave decoder without listeners"""
+    written = threading.Event()
+    add_radio_play = connector.add_radio_play
+    connector.add_radio_play = lambda radio: written.wait(5) and add_radio_play(radio)
+    voice_client = FakeVoiceClient()
+    ctx = fake_context(voice_client)
+
+    play = asyncio.ensure_future(radio_cog.play.callback(radio_cog, ctx, radio=RADIO))
+    assert await wait_until(lambda: radio_cog.manager.broadcasters)
+    await radio_cog.stop.callback(radio_cog, ctx)
+    written.set()
+    await play
+    assert voice_client.source is None
+    assert await wait_until(lambda: not radio_cog.manager.broadcasters)
+
+
+@pytest.mark.asyncio
+async def test_start_plays_station(radio_cog):
+    """Test finished startup plays reader until stop"""
+    voice_client = FakeVoiceClient()
+    ctx = fake_context(voice_client)
+    await radio_cog.play.callback(radio_cog, ctx, radio=RADIO)
+    assert voice_client.source.key.radio == RADIO
+    assert len(radio_cog.manager.broadcasters) == 1
+    await radio_cog.stop.callback(radio_cog, ctx)
+    assert await wait_until(lambda: not radio_cog.manager.broadcasters)
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_queries_database_thread(radio_cog, connector, monkeypatch):
+    """Test upstream of broadcaster is read and failed probe is deleted on database thread"""
+    connector.set_station_probe(RADIO, StationProbe('mp3', 'mp3', 44100, 2))
+    get_station_probe = connector.get_station_probe
+    threads = []
+    for name in ('get_station_probe', 'delete_station_probe'):
+        query = getattr(connector, name)
+        monkeypatch.setattr(connector, name, lambda *args, query=query: threads.append(
+            threading.current_thread().name) or query(*args))
+    failing = FakeSource(frames=0)
+    failing.released.set()
+    monkeypatch.setattr('cogs.music.ffmpeg_source', lambda *_: failing)
+
+    voice_client = FakeVoiceClient()
+    await radio_cog.play.callback(radio_cog, fake_context(voice_client), radio=RADIO)
+    assert await wait_until(lambda: get_station_probe(RADIO) is None)
+    assert threads and all(name.startswith('database') for name in threads)
+    await radio_cog.stop.callback(radio_cog, fake_context(voice_client))
+
+
+class FakeChannel:
+    """Text channel which records sent and edited messages"""
+
+    message_ids = itertools.count(1)
+
+    def __init__(self, channel_id: int) -> None:
+        self.id = channel_id
+        self.sent = {}  # message id -> content
+        self.edited = []
+        self.deleted = set()
+
+    async def send(self, content: str) -> SimpleNamespace:
+        """Record new message"""
+        message = SimpleNamespace(id=next(self.message_ids))
+        self.sent[message.id] = content
+        return message
+
+    def get_partial_message(self, message_id: int) -> SimpleNamespace:
+        """Message which edit fails if it was deleted"""
+        async def edit(content: str) -> None:
+            if message_id in self.deleted:
+                raise discord.NotFound(SimpleNamespace(status=404, reason='Not Found'),
+                                       'Unknown Message')
+            self.edited.append((message_id, content))
+        return SimpleNamespace(id=message_id, edit=edit)
+
+
+@pytest_asyncio.fixture(name="notify")
+async def fixture_notify(connector, monkeypatch):
+    """
+    Notification cog in now playing edit mode of guild with text channels,
+    polled scoreboard gives notify.song
+    """
+    async def now_playing(*_):
+        return notify.song
+
+    clock = itertools.count(step=1000)
+    monkeypatch.setattr('cogs.notificator.time',
+                        SimpleNamespace(monotonic=lambda: next(clock),
+                                        perf_counter=time.perf_counter))
+    monkeypatch.setattr('scoreboard.providers.ProviderRegistry.now_playing', now_playing)
+    database = AsyncConnect(connector)
+    guilds = GuildRegistry(database)
+    await guilds.load()
+    channels = {CHANNEL_ID: FakeChannel(CHANNEL_ID), CHANNEL_ID2: FakeChannel(CHANNEL_ID2)}
+    bot = SimpleNamespace(database=database, guild_registry=guilds,
+                          scoreboard_client=None, get_channel=channels.get)
+    notify = SimpleNamespace(cog=RadioNotify(bot), guilds=guilds, channels=channels, song=None)
+    await guilds.listen(GUILD_ID, CHANNEL_ID, SCOREBOARD_RADIO)
+    await notify.cog.nowplaying.callback(notify.cog, fake_context(None), mode='edit')
+    yield notify
+    await notify.cog.cog_unload()
+    await database.close()
+
+
+async def announce(notify: SimpleNamespace, song: str, channel: FakeChannel) -> str:
+    """Poll new song and wait until channel shows it, expected text is returned"""
+    notify.song = MusicInfo(title=song)
+    text = f'Radio: {SCOREBOARD_RADIO}\n{notify.song}'
+    await notify.cog.send_notification()
+    assert await wait_until(lambda: text in channel.sent.values() or
+                            text in (content for _, content in channel.edited))
+    return text
+
+
+def now_playing_message(connector: Connect) -> tuple:
+    """Stored channel and message id of guild now playing message"""
+    message, = connector.get_now_playing_messages()
+    return message.channel_id, message.message_id
+
+
+@pytest.mark.asyncio
+async def test_now_playing_edit(notify, connector):
+    """Test now playing message is sent once and edited on song change"""
+    channel = notify.channels[CHANNEL_ID]
+    await announce(notify, 'first', channel)
+    (message_id, _), = channel.sent.items()
+    assert now_playing_message(connector) == (CHANNEL_ID, message_id)
+    text = await announce(notify, 'second', channel)
+    assert channel.edited == [(message_id, text)]
+    assert len(channel.sent) == 1
+
+
+@pytest.mark.asyncio
+async def test_now_playing_deleted(notify, connector):
+    """Test deleted now playing message is replaced by new one"""
+    channel = notify.channels[CHANNEL_ID]
+    await announce(notify, 'first', channel)
+    channel.deleted.update(channel.sent)
+    text = await announce(notify, 'second', channel)
+    assert not channel.edited
+    message_id = max(channel.sent)
+    assert channel.sent[message_id] == text
+    assert now_playing_message(connector) == (CHANNEL_ID, message_id)
+
+
+@pytest.mark.asyncio
+async def test_now_playing_moved(notify, connector):
+    """Test radio moved to other channel gets new now playing message there"""
+    await announce(notify, 'first', notify.channels[CHANNEL_ID])
+    await notify.guilds.listen(GUILD_ID, CHANNEL_ID2, SCOREBOARD_RADIO)
+    channel = notify.channels[CHANNEL_ID2]
+    text = await announce(notify, 'second', channel)
+    (message_id, content), = channel.sent.items()
+    assert content == text
+    assert not notify.channels[CHANNEL_ID].edited
+    assert now_playing_message(connector) == (CHANNEL_ID2, message_id)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_polling(notify, connector, monkeypatch):
+    """Test stations are polled concurrently up to limit, slow or broken one doesn't stop others"""
+    monkeypatch.setattr('cogs.notificator.POLL_CONCURRENCY', 2)
+    monkeypatch.setattr('cogs.notificator.POLL_TIMEOUT', 0.2)
+    polling = []
+    concurrency = []
+
+    async def now_playing(_, station, *__):
+        polling.append(station.name)
+        concurrency.append(len(polling))
+        try:
+            await asyncio.sleep(10 if station.name == 'slow' else 0.05)
+        finally:
+            polling.remove(station.name)
+        return MusicInfo(title=station.name)
+
+    def endpoint(_, station, *__):
+        if station.name == 'broken':
+            raise ValueError('broken station')
+        return f'http://radio.com/{station.name}'
+
+    monkeypatch.setattr('scoreboard.providers.ProviderRegistry.now_playing', now_playing)
+    monkeypatch.setattr('scoreboard.providers.ProviderRegistry.endpoint', endpoint)
+    radios = ['slow', 'broken', 'first', 'second', 'third']
+    for guild_id, radio in enumerate(radios, 1):
+        connector.set_radio(radio, 'http://radio.com/', {}, f'http://radio.com/{radio}',
+                            {'mount': radio})
+        notify.channels[guild_id] = FakeChannel(guild_id)
+        await notify.guilds.listen(guild_id, guild_id, radio)
+
+    started = time.perf_counter()
+    await notify.cog.send_notification()
+    assert time.perf_counter() - started < 1
+    assert max(concurrency) == 2
+    for guild_id, radio in enumerate(radios, 1):
+        if radio in ('slow', 'broken'):
+            assert not notify.channels[guild_id].sent
+        else:
+            assert await wait_until(lambda channel=notify.channels[guild_id]: channel.sent)
@@ -1,8 +1,21 @@
-import pytest
+import sqlite3
+import threading
+from types import SimpleNamespace
 
-from db.database import Connect, RadioActivity
-from db.engine import SQLite
-from my_types.radio import Station, StationAddress, StationScoreboardAddress
+import psycopg2
+import pytest
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from db.database import AsyncConnect, Connect, NowPlayingMessage, RadioActivity
+from db.engine import PostgreSQL, SQLite, is_idempotent
+from db.migrations import MIGRATIONS
+from my_types.radio import (
+    Station,
+    StationAddress,
+    StationProbe,
+    StationProvider,
+    StationScoreboardAddress
+)
 
 TEST_DB = 'test_db.database'
 STATION_NAME = 'test'
@@ -16,6 +29,11 @@ DATA_SCOREBOARD2 = "MusicInfo Test 2"
 CHANNEL_ID = 123
 GUILD_ID = 321
 RADIO_ACTIVITY = RadioActivity(STATION_NAME, GUILD_ID, CHANNEL_ID)
+STATION_PROBE = StationProbe("mp3", "mp3", 44100, 2)
+STATION_PROBE2 = StationProbe("aac", "aac", 48000, 2)
+STATION_PROVIDER = StationProvider(
+    "jsonpath", {"url": "http://radio.com/now", "title": "now.title"})
+STATION_PROVIDER2 = StationProvider("icy")
 
 
 @pytest.fixture(autouse=True, scope="module", name="database")
@@ -125,6 +143,54 @@ def test_delete_current_scoreboard(database):
     assert database.get_current_scoreboard(STATION_NAME) is None
 
 
+def test_add_radio_play(database):
+    """Test increase play counter of radio"""
+    database.add_radio_play(STATION_NAME2)
+    database.add_radio_play(STATION_NAME)
+    database.add_radio_play(STATION_NAME)
+
+
+def test_get_popular_radio(database):
+    """Test get most played radio"""
+    assert database.get_popular_radio(2) == [STATION_NAME, STATION_NAME2]
+    assert database.get_popular_radio(1) == [STATION_NAME]
+
+
+def test_set_station_probe(database):
+    """Test insert and replace data in station probe table"""
+    assert database.get_station_probe(STATION_NAME) is None
+    database.set_station_probe(STATION_NAME, STATION_PROBE)
+    assert database.get_station_probe(STATION_NAME) == STATION_PROBE
+    database.set_station_probe(STATION_NAME, STATION_PROBE2)
+    assert database.get_station_probe(STATION_NAME) == STATION_PROBE2
+
+
+def test_delete_station_probe(database):
+    """Test delete from station probe table"""
+    database.delete_station_probe(STATION_NAME)
+    assert database.get_station_probe(STATION_NAME) is None
+
+
+def test_set_station_provider(database):
+    """Test insert and replace data in station provider table"""
+    assert database.get_station_provider(STATION_NAME) is None
+    database.set_station_provider(STATION_NAME, STATION_PROVIDER)
+    assert database.get_station_provider(STATION_NAME) == STATION_PROVIDER
+    database.set_station_provider(STATION_NAME, STATION_PROVIDER2)
+    assert database.get_station_provider(STATION_NAME) == STATION_PROVIDER2
+
+
+def test_now_playing_message(database):
+    """Test insert, replace and delete in now playing message table"""
+    assert not database.get_now_playing_messages()
+    database.set_now_playing_message(GUILD_ID, None, None)
+    database.set_now_playing_message(GUILD_ID, CHANNEL_ID, 555)
+    assert database.get_now_playing_messages() == [
+        NowPlayingMessage(GUILD_ID, CHANNEL_ID, 555)]
+    database.delete_now_playing_message(GUILD_ID)
+    assert not database.get_now_playing_messages()
+
+
 def test_get_from_silence_group(database):
     """Test get from silence group table"""
     assert database.get_from_silence_group(GUILD_ID) is None
@@ -134,9 +200,253 @@ def test_add_in_silence_group(database):
     """Test insert to silence group table"""
     database.add_in_silence_group(GUILD_ID)
     assert database.get_from_silence_group(GUILD_ID) == (1, GUILD_ID)
+    assert database.get_silence_group() == [GUILD_ID]
 
 
 def test_delete_from_silence_group(database):
     """Test delete from silence group table"""
     database.delete_from_silence_group(GUILD_ID)
     assert database.get_from_silence_group(GUILD_ID) is None
+
+
+def test_sqlite_connection(tmp_path):
+    """Test SQLite engine keeps one WAL connection until close"""
+    engine = SQLite(db_path=str(tmp_path / TEST_DB))
+    assert engine.execute("PRAGMA journal_mode;", method="fetchone") == ('wal',)
+    engine.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        engine.execute("SELECT 1;", method="fetchone")
+
+
+def test_migrations(tmp_path):
+    """Test legacy database is deduplicated and gets unique indexes once"""
+    db_path = str(tmp_path / TEST_DB)
+    engine = SQLite(db_path=db_path)
+    for table in ('radio', 'station_address', 'station_address_params',
+                  'radio_activity', 'silence_group'):
+        engine.execute(getattr(engine.tables, table).create)
+    for _ in range(2):
+        radio_id = engine.execute(engine.tables.radio.set, (STATION_NAME,), "lastrowid")
+        address_id = engine.execute(engine.tables.station_address.set,
+                                    (radio_id, STATION_ADDRESS.url), "lastrowid")
+        engine.execute(engine.tables.station_address_params.set,
+                       (address_id, str(STATION_ADDRESS.params)))
+    insert_activity = "INSERT INTO radio_activity (radio_name, guild_id, channel_id) "\
+        "VALUES (?, ?, ?);"
+    engine.execute(insert_activity, (STATION_NAME2, GUILD_ID, CHANNEL_ID))
+    engine.execute(insert_activity, (STATION_NAME, GUILD_ID, CHANNEL_ID))
+    engine.execute("INSERT INTO silence_group(guild_id) VALUES(?);", (GUILD_ID,))
+    engine.execute("INSERT INTO silence_group(guild_id) VALUES(?);", (GUILD_ID,))
+
+    connector = Connect(engine)
+    assert connector.get_schema_version() == MIGRATIONS[-1].version
+    assert connector.get_radio_list() == [STATION_NAME]
+    assert connector.get_radio_station_address(STATION_NAME) == STATION_ADDRESS
+    assert connector.get_radio_activity() == [RADIO_ACTIVITY]
+    assert connector.get_silence_group() == [GUILD_ID]
+    with pytest.raises(sqlite3.IntegrityError):
+        engine.execute(engine.tables.radio.set, (STATION_NAME,))
+
+    connector.set_radio_activity(GUILD_ID, CHANNEL_ID, STATION_NAME2)
+    connector.add_in_silence_group(GUILD_ID)
+    assert connector.get_radio_activity() == [RadioActivity(STATION_NAME2, GUILD_ID, CHANNEL_ID)]
+    assert connector.get_silence_group() == [GUILD_ID]
+    connector.close()
+
+    restarted = Connect(SQLite(db_path=db_path))
+    assert restarted.get_schema_version() == MIGRATIONS[-1].version
+    assert restarted.execute("SELECT COUNT(*) FROM schema_version;", method="fetchone") == \
+        (len(MIGRATIONS),)
+    restarted.close()
+
+
+def test_bulk_operations(tmp_path):
+    """Test bulk station import, scoreboard upsert and grouped activity"""
+    connector = Connect(SQLite(db_path=str(tmp_path / TEST_DB)))
+    connector.set_radio(STATION_NAME, STATION_ADDRESS.url, STATION_ADDRESS.params)
+    stations = [STATION, Station(STATION_NAME2, STATION_ADDRESS, None)] + [
+        Station(f'bulk {index}', STATION_ADDRESS, SCOREBOARD_ADDRESS) for index in range(100)]
+    connector.set_radios(stations)
+    assert len(connector.get_radio_list()) == 102
+    assert connector.get_radio(STATION_NAME) == Station(STATION_NAME, STATION_ADDRESS, None)
+    assert connector.get_radio(STATION_NAME2) == stations[1]
+    assert connector.get_radio('bulk 99') == stations[-1]
+
+    connector.upsert_scoreboard(STATION_NAME, DATA_SCOREBOARD1)
+    connector.upsert_scoreboard(STATION_NAME, DATA_SCOREBOARD2)
+    assert connector.get_current_scoreboard(STATION_NAME) == DATA_SCOREBOARD2
+    assert connector.get_last_scoreboard(STATION_NAME) == DATA_SCOREBOARD2
+
+    connector.set_radio_activity(GUILD_ID, CHANNEL_ID, STATION_NAME)
+    connector.set_radio_activity(654, CHANNEL_ID, STATION_NAME)
+    connector.set_radio_activity(987, CHANNEL_ID, STATION_NAME2)
+    assert connector.get_radio_activity_by_radio() == {
+        STATION_NAME: [RADIO_ACTIVITY, RadioActivity(STATION_NAME, 654, CHANNEL_ID)],
+        STATION_NAME2: [RadioActivity(STATION_NAME2, 987, CHANNEL_ID)],
+    }
+    connector.clear_radio_activity()
+    assert connector.get_radio_activity_by_radio() == {}
+    connector.close()
+
+
+@pytest.mark.asyncio
+async def test_async_connect(tmp_path):
+    """Test async connector runs queries in order on database thread"""
+    database = AsyncConnect(Connect(SQLite(db_path=str(tmp_path / TEST_DB))))
+    assert await database.run(lambda: threading.current_thread().name) != \
+        threading.current_thread().name
+    await database.run(database.connector.set_radio, STATION_NAME, STATION_ADDRESS.url,
+                       STATION_ADDRESS.params)
+    await database.set_radio_activity(GUILD_ID, CHANNEL_ID, STATION_NAME)
+    assert await database.get_radio_activity_by_radio() == {STATION_NAME: [RADIO_ACTIVITY]}
+    assert await database.get_radio(STATION_NAME) == Station(STATION_NAME, STATION_ADDRESS, None)
+    await database.close()
+
+
+class FakeServer:   # pylint: disable=too-few-public-methods
+    """PostgreSQL server of fake pool, drops connections on demand"""
+
+    def __init__(self) -> None:
+        self.statements = []
+        self.connections = []
+        self.drops = 0     # next statements which lose connection
+
+    def run(self, connect: 'FakeConnection', statement: str) -> None:
+        """Record statement or lose connection"""
+        if connect.dead or self.drops:
+            self.drops = max(0, self.drops - 1)
+            connect.closed = 2
+            raise psycopg2.OperationalError('server closed the connection unexpectedly')
+        self.statements.append(statement)
+
+
+class FakeCursor:
+    """Cursor of fake connection"""
+
+    def __init__(self, connect: 'FakeConnection') -> None:
+        self.connect = connect
+
+    def __enter__(self) -> 'FakeCursor':
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+    def execute(self, statement, _=None) -> None:
+        """Run statement on fake server"""
+        self.connect.server.run(self.connect, statement)
+
+    def mogrify(self, statement, _=None) -> bytes:
+        """Statement without parameters"""
+        return statement.encode()
+
+    def fetchone(self) -> tuple:
+        """Always one row"""
+        return (1,)
+
+    def fetchall(self) -> list:
+        """Always no rows"""
+        return []
+
+
+class FakeConnection:
+    """Connection of fake pool"""
+
+    def __init__(self, server: FakeServer) -> None:
+        self.server = server
+        self.closed = 0
+        self.dead = False   # dropped by server, not noticed by client yet
+        self.info = SimpleNamespace(transaction_status=TRANSACTION_STATUS_IDLE)
+
+    def __enter__(self) -> 'FakeConnection':
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+    def cursor(self) -> FakeCursor:
+        """New cursor"""
+        return FakeCursor(self)
+
+    def rollback(self) -> None:
+        """Nothing to roll back"""
+
+
+@pytest.fixture(name="postgres")
+def fixture_postgres(monkeypatch):
+    """PostgreSQL engine with fake connection pool, its server is engine.server"""
+    server = FakeServer()
+
+    class FakePool:
+        """ThreadedConnectionPool which keeps connections in memory"""
+
+        def __init__(self, *_, **__) -> None:
+            self.free = []
+
+        def getconn(self) -> FakeConnection:
+            """Free connection or new one"""
+            if self.free:
+                return self.free.pop()
+            server.connections.append(FakeConnection(server))
+            return server.connections[-1]
+
+        def putconn(self, connect: FakeConnection, close: bool = False) -> None:
+            """Keep connection unless closed"""
+            if not close:
+                self.free.append(connect)
+
+        def closeall(self) -> None:
+            """Drop all connections"""
+            self.free.clear()
+
+    monkeypatch.setattr('db.engine.ThreadedConnectionPool', FakePool)
+    monkeypatch.setattr('db.engine.POSTGRES_RETRY_DELAY', 0)
+    engine = PostgreSQL('user', 'password', 'localhost', 5432)
+    engine.server = server
+    return engine
+
+
+def test_is_idempotent(postgres):
+    """Test only statements which can be repeated safely are retried"""
+    tables = postgres.tables
+    assert is_idempotent(tables.radio.list)
+    assert is_idempotent(tables.radio_activity.delete)
+    assert is_idempotent(tables.radio_activity.set)
+    assert is_idempotent(tables.silence_group.set)
+    assert is_idempotent(tables.current_radio_scoreboard_data.upsert)
+    assert not is_idempotent(tables.radio.set)
+    assert not is_idempotent(tables.radio_play_count.set)
+    assert not is_idempotent(tables.current_radio_scoreboard_data.update)
+
+
+def test_postgres_retry(postgres):
+    """Test lost connection is retried for idempotent statements only and never raises"""
+    tables = postgres.tables
+    postgres.server.drops = 1
+    assert postgres.execute(tables.radio.list, method="fetchall") == []
+    assert postgres.server.statements == [tables.radio.list]
+
+    postgres.server.drops = 1
+    postgres.execute_batch([(tables.current_radio_scoreboard_data.upsert, [(STATION_NAME, '')]),
+                            (tables.last_radio_scoreboard_data.upsert, [(STATION_NAME, '')])])
+    # execute_batch sends rows as one joined statement
+    assert postgres.server.statements[1:] == [tables.current_radio_scoreboard_data.upsert.encode(),
+                                              tables.last_radio_scoreboard_data.upsert.encode()]
+
+    postgres.server.drops = 1
+    postgres.execute_batch([(tables.radio_import.radio, [(STATION_NAME,)])])
+    assert postgres.execute(tables.radio_play_count.set, (STATION_NAME,)) is None
+    assert len(postgres.server.statements) == 4
+
+
+def test_postgres_liveness_check(postgres, monkeypatch):
+    """Test connection idle since failover is replaced before non-idempotent write"""
+    tables = postgres.tables
+    postgres.execute(tables.radio.list, method="fetchall")
+    assert len(postgres.server.connections) == 1
+    postgres.server.connections[0].dead = True
+
+    monkeypatch.setattr('db.engine.POSTGRES_IDLE_CHECK', 0)
+    assert postgres.execute(tables.radio.set, (STATION_NAME,), "lastrowid") == 1
+    assert len(postgres.server.connections) == 2
+    assert postgres.server.statements[-1] == tables.radio.set
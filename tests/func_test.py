@@ -1,8 +1,11 @@
 import pytest
+import pytest_asyncio
+from aiohttp import web
 
 from my_types.radio import StationScoreboardAddress
-from radio import what_plays_on_asiadreamradio
+from radio import ScoreboardClient, what_plays_on_asiadreamradio
 from setup import BASIC_STATIONS
+from tests.helpers import start_server
 
 TEST_STATION = "Japan Hits"
 
@@ -54,3 +57,38 @@ class TestWhatPlaysOnAsiaDreamRadio:
         scoreboard.params = None
         result = await what_plays_on_asiadreamradio(scoreboard)
         assert result is None
+
+
+@pytest_asyncio.fixture(name="scoreboard_server")
+async def fixture_scoreboard_server():
+    """Local scoreboard server which echoes User-Agent header"""
+    async def handler(request):
+        if request.query.get('token') != 'test':
+            return web.Response(status=404)
+        return web.Response(text=request.headers.get('User-Agent', ''))
+
+    app = web.Application()
+    app.router.add_get('/', handler)
+    runner, url = await start_server(app)
+    yield f'{url}/'
+    await runner.cleanup()
+
+
+class TestScoreboardClient:
+    """Testing "ScoreboardClient"""
+
+    @pytest.mark.asyncio
+    async def test_get_with_headers(self, scoreboard_server, tmp_path):
+        """Testing headers are loaded once and sent with every request"""
+        headers_file = tmp_path / 'headers.json'
+        headers_file.write_text('{"User-Agent": "radio-test"}', encoding='utf-8')
+        async with ScoreboardClient(str(headers_file)) as client:
+            headers_file.unlink()
+            for _ in range(2):
+                assert await client.get(scoreboard_server, {'token': 'test'}) == 'radio-test'
+
+    @pytest.mark.asyncio
+    async def test_get_with_wrong_params(self, scoreboard_server):
+        """Testing not 200 response gives None"""
+        async with ScoreboardClient() as client:
+            assert await client.get(scoreboard_server, {'token': 'wrong'}) is None
@@ -0,0 +1,76 @@
+import pytest
+import pytest_asyncio
+
+from db.database import AsyncConnect, Connect
+from db.engine import SQLite
+from guilds import GuildRegistry
+
+RADIO = 'test'
+RADIO2 = 'test2'
+GUILD_ID = 321
+GUILD_ID2 = 654
+CHANNEL_ID = 123
+
+
+@pytest.fixture(name="connector")
+def fixture_connector(tmp_path):
+    """Connector to empty database with two radio"""
+    connector = Connect(SQLite(db_path=str(tmp_path / 'guilds.db')))
+    connector.set_radio(RADIO, 'http://radio.com/', {})
+    connector.set_radio(RADIO2, 'http://radio2.com/', {})
+    return connector
+
+
+@pytest_asyncio.fixture(name="database")
+async def fixture_database(connector):
+    """Async connector used by registry"""
+    database = AsyncConnect(connector)
+    yield database
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_listen_and_leave(connector, database):
+    """Test subscribers follow listen and leave and are saved into database"""
+    registry = GuildRegistry(database)
+    await registry.load()
+    await registry.listen(GUILD_ID, CHANNEL_ID, RADIO)
+    await registry.listen(GUILD_ID2, CHANNEL_ID, RADIO)
+    assert sorted(registry.subscribers(RADIO)) == [(GUILD_ID, CHANNEL_ID), (GUILD_ID2, CHANNEL_ID)]
+
+    await registry.listen(GUILD_ID, CHANNEL_ID, RADIO2)
+    assert registry.subscribers(RADIO) == [(GUILD_ID2, CHANNEL_ID)]
+    assert registry.radio_of(GUILD_ID) == RADIO2
+    assert len(connector.get_radio_activity()) == 2
+
+    await registry.leave(GUILD_ID2)
+    assert registry.radios == [RADIO2]
+    assert registry.subscribers(RADIO) == []
+    assert [activity.guild_id for activity in connector.get_radio_activity()] == [GUILD_ID]
+
+
+@pytest.mark.asyncio
+async def test_silence(connector, database):
+    """Test silence group is kept in memory and database"""
+    registry = GuildRegistry(database)
+    await registry.load()
+    await registry.silence(GUILD_ID, True)
+    await registry.silence(GUILD_ID, True)
+    assert registry.is_silenced(GUILD_ID)
+    assert connector.get_silence_group() == [GUILD_ID]
+    await registry.silence(GUILD_ID, False)
+    assert not registry.is_silenced(GUILD_ID)
+    assert connector.get_silence_group() == []
+
+
+@pytest.mark.asyncio
+async def test_load(database):
+    """Test state is rebuilt from database"""
+    registry = GuildRegistry(database)
+    await registry.listen(GUILD_ID, CHANNEL_ID, RADIO)
+    await registry.silence(GUILD_ID2, True)
+
+    restarted = GuildRegistry(database)
+    await restarted.load()
+    assert restarted.subscribers(RADIO) == [(GUILD_ID, CHANNEL_ID)]
+    assert restarted.is_silenced(GUILD_ID2)
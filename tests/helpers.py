@@ -0,0 +1,11 @@
+from aiohttp import web
+
+
+async def start_server(app: web.Application) -> tuple[web.AppRunner, str]:
+    """Run aiohttp application on free local port, return runner and base url"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}'
@@ -0,0 +1,26 @@
+"""Recorded scoreboard responses of every provider kind"""
+import json
+
+SAMCLOUD_TRACK = {
+    'Artist': 'YOASOBI', 'Title': 'Idol', 'Album': 'THE BOOK 3', 'Year': '2023',
+    'Duration': 'PT3M33.120S', 'Composer': 'Ayase', 'Genre': 'J-Pop',
+    'Picture': 'https://listen.samcloud.com/img/123.jpg', 'Buycd': '', 'Website': '',
+}
+SAMCLOUD_PAYLOAD = json.dumps({
+    'm_Item1': [dict(SAMCLOUD_TRACK, Title=f'History {index}') for index in range(5)],
+    'm_Item2': SAMCLOUD_TRACK,
+}).encode()
+
+JSONPATH_PAYLOAD = json.dumps({
+    'station': {'name': 'Test FM', 'listeners': 42},
+    'now': [{'song': {'artist': 'Aimer', 'title': 'Zankyosanka', 'length': 185.5}}],
+    'history': [{'song': {'artist': 'LiSA', 'title': f'Song {index}'}} for index in range(5)],
+}).encode()
+JSONPATH_OPTIONS = {
+    'url': 'http://radio.com/now',
+    'artist': 'now.0.song.artist',
+    'title': 'now.0.song.title',
+    'duration': 'now.0.song.length',
+}
+
+ICY_BLOCK = b"StreamTitle='Kenshi Yonezu - KICK BACK';StreamUrl='';".ljust(64, b'\x00')
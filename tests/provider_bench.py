@@ -0,0 +1,44 @@
+"""
+Micro-benchmark of scoreboard response parsing per provider.
+Run as "python -m tests.provider_bench"
+"""
+import json
+import time
+
+from radio import wtf_time_to_std_time
+from scoreboard.fastjson import loads
+from scoreboard.providers import ProviderRegistry
+from tests.payloads import ICY_BLOCK, JSONPATH_OPTIONS, JSONPATH_PAYLOAD, SAMCLOUD_PAYLOAD
+
+PARSES = 50000
+
+
+def parses_per_second(parse, payload: bytes, options: dict) -> float:
+    """Count how many payloads parse function handles per second"""
+    started = time.perf_counter()
+    for _ in range(PARSES):
+        parse(payload, options)
+    return PARSES / (time.perf_counter() - started)
+
+
+def stdlib_samcloud(payload: bytes, _) -> dict:
+    """Samcloud parsing as it was done before the provider registry"""
+    info = json.loads(payload.decode()).get('m_Item2')
+    return dict(info, Duration=wtf_time_to_std_time(info.get('Duration')))
+
+
+def main():
+    """Print parses/sec of every provider over recorded payloads"""
+    registry = ProviderRegistry(None)
+    cases = (
+        ('samcloud json.loads', stdlib_samcloud, SAMCLOUD_PAYLOAD, {}),
+        (f'samcloud {loads.__module__}', registry.get('samcloud').parse, SAMCLOUD_PAYLOAD, {}),
+        ('jsonpath', registry.get('jsonpath').parse, JSONPATH_PAYLOAD, JSONPATH_OPTIONS),
+        ('icy', registry.get('icy').parse, ICY_BLOCK, {}),
+    )
+    for name, parse, payload, options in cases:
+        print(f'{name:<28}{parses_per_second(parse, payload, options):>12.0f} parses/sec')
+
+
+if __name__ == '__main__':
+    main()
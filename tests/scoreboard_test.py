@@ -0,0 +1,429 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from db.database import AsyncConnect, Connect
+from db.engine import SQLite
+from my_types.radio import (
+    MusicInfo,
+    Station,
+    StationAddress,
+    StationProvider,
+    StationScoreboardAddress
+)
+from radio import ScoreboardClient, parse_samcloud, std_time_to_seconds
+from scoreboard.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreakers
+from scoreboard.dispatch import NotificationDispatcher
+from scoreboard.icy import IcyMetadataParser, IcyWatcher, parse_stream_title
+from scoreboard.providers import IcyProvider, ProviderRegistry, default_provider, json_path
+from scoreboard.schedule import (BOUNDARY_LEAD, FALLBACK_INTERVAL, MAX_INTERVAL,
+                                 MIN_INTERVAL, OVERRUN_GRACE, PollScheduler)
+from scoreboard.state import TrackState
+from tests.helpers import start_server
+from tests.payloads import ICY_BLOCK, JSONPATH_OPTIONS, JSONPATH_PAYLOAD, SAMCLOUD_PAYLOAD
+
+RADIO = 'test'
+METAINT = 64
+
+
+def icy_block(title: str) -> bytes:
+    """ICY metadata block with length byte"""
+    meta = f"StreamTitle='{title}';".encode()
+    meta += b'\x00' * (-len(meta) % 16)
+    return bytes([len(meta) // 16]) + meta
+
+
+def icy_stream(*titles: str) -> bytes:
+    """Stream with METAINT bytes of audio before every metadata block"""
+    return b''.join(b'\xff' * METAINT + icy_block(title) for title in titles)
+
+
+def track(title: str, duration: str = '03:00.000') -> MusicInfo:
+    """MusicInfo with given title and duration"""
+    return MusicInfo(artist='artist', title=title, year='2000', duration=duration)
+
+
+def test_std_time_to_seconds():
+    """Test duration string is converted to seconds"""
+    assert std_time_to_seconds('03:25.500') == 205.5
+    assert std_time_to_seconds('00:00.000') is None
+    assert std_time_to_seconds('') is None
+    assert std_time_to_seconds(None) is None
+
+
+def test_schedule_new_radio_is_due():
+    """Test station without poll history is polled at once"""
+    schedule = PollScheduler()
+    assert schedule.due([RADIO], 0) == [RADIO]
+
+
+def test_schedule_first_track_uses_fallback():
+    """Test start of the first seen track is unknown"""
+    schedule = PollScheduler()
+    schedule.due([RADIO], 0)
+    schedule.update(RADIO, track('first'), 0)
+    assert schedule.due([RADIO], FALLBACK_INTERVAL - 1) == []
+    assert schedule.due([RADIO], FALLBACK_INTERVAL) == [RADIO]
+
+
+def test_schedule_follows_track_duration():
+    """Test polls back off mid track and become dense near its end"""
+    schedule = PollScheduler()
+    schedule.update(RADIO, track('first'), 0)
+    # Track change is seen at 100, it ends at 280
+    schedule.update(RADIO, track('second'), 100)
+    assert schedule.due([RADIO], 280 - BOUNDARY_LEAD - 1) == []
+    assert schedule.due([RADIO], 280 - BOUNDARY_LEAD) == [RADIO]
+
+    # Dense polling near the end and while track overruns
+    now = 280 - BOUNDARY_LEAD
+    schedule.update(RADIO, track('second'), now)
+    assert schedule.due([RADIO], now + MIN_INTERVAL) == [RADIO]
+    now = 280 + OVERRUN_GRACE
+    schedule.update(RADIO, track('second'), now)
+    assert schedule.due([RADIO], now + MIN_INTERVAL) == []
+    assert schedule.due([RADIO], now + FALLBACK_INTERVAL) == [RADIO]
+
+
+def test_schedule_long_track():
+    """Test long track is still checked every MAX_INTERVAL"""
+    schedule = PollScheduler()
+    schedule.update(RADIO, track('first'), 0)
+    schedule.update(RADIO, track('second', '10:00.000'), 100)
+    assert schedule.due([RADIO], 100 + MAX_INTERVAL - 1) == []
+    assert schedule.due([RADIO], 100 + MAX_INTERVAL) == [RADIO]
+
+
+def test_schedule_unknown_duration_and_failed_poll():
+    """Test fixed interval without track duration"""
+    schedule = PollScheduler()
+    schedule.update(RADIO, track('first'), 0)
+    schedule.update(RADIO, track('second', '00:00.000'), 10)
+    assert schedule.due([RADIO], 10 + FALLBACK_INTERVAL - 1) == []
+    schedule.update(RADIO, None, 10 + FALLBACK_INTERVAL)
+    assert schedule.due([RADIO], 10 + 2 * FALLBACK_INTERVAL) == [RADIO]
+
+
+def test_schedule_forget_unused_radio():
+    """Test stations nobody listens are forgotten"""
+    schedule = PollScheduler()
+    schedule.update(RADIO, track('first'), 0)
+    assert schedule.due([], 0) == []
+    assert schedule.due([RADIO], 0) == [RADIO]
+
+
+def test_parse_stream_title():
+    """Test ICY StreamTitle is split into artist and title"""
+    info = parse_stream_title(b"StreamTitle='Ado - Show';StreamUrl='';\x00\x00")
+    assert (info.artist, info.title) == ('Ado', 'Show')
+    assert parse_stream_title(b"StreamTitle='It's me';").title == "It's me"
+    assert parse_stream_title(b"StreamTitle='';") is None
+    assert parse_stream_title(b"StreamUrl='';") is None
+
+
+def test_icy_parser_in_any_chunks():
+    """Test metadata blocks are found however stream is chunked"""
+    stream = icy_stream('A - 1', 'A - 1', 'B - 2')
+    # Empty metadata block between audio
+    stream = stream[:METAINT] + b'\x00' + b'\xff' * METAINT + stream[METAINT:]
+    for size in (1, 7, 100, len(stream)):
+        parser = IcyMetadataParser(METAINT)
+        blocks = []
+        for start in range(0, len(stream), size):
+            blocks.extend(parser.feed(stream[start:start + size]))
+        titles = [parse_stream_title(block).title for block in blocks]
+        assert titles == ['1', '1', '2']
+
+
+@pytest_asyncio.fixture(name="icy_server")
+async def fixture_icy_server():
+    """Local stream server, /icy carries ICY metadata and /plain doesn't"""
+    async def icy(request):
+        if request.headers.get('Icy-MetaData') != '1':
+            return web.Response(status=400)
+        response = web.StreamResponse(headers={'icy-metaint': str(METAINT)})
+        await response.prepare(request)
+        await response.write(icy_stream('A - 1', 'A - 1'))
+        await asyncio.sleep(0.05)
+        await response.write(icy_stream('B - 2'))
+        await asyncio.sleep(1)
+        return response
+
+    async def plain(_):
+        return web.Response(body=b'\xff' * METAINT)
+
+    app = web.Application()
+    app.router.add_get('/icy', icy)
+    app.router.add_get('/plain', plain)
+    runner, url = await start_server(app)
+    yield url
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_icy_provider(icy_server):
+    """Test provider reads only the first metadata block"""
+    async with ScoreboardClient() as client:
+        provider = IcyProvider(client)
+        station = Station(RADIO, StationAddress(f'{icy_server}/icy', {}), None)
+        assert (await provider.now_playing(station, {})).title == '1'
+        station = Station(RADIO, StationAddress(f'{icy_server}/plain', {}), None)
+        assert await provider.now_playing(station, {}) is None
+
+
+@pytest.mark.asyncio
+async def test_icy_watcher(icy_server):
+    """Test every track change is reported once and unsupported stream is left"""
+    tracks = []
+
+    async def on_track(radio, info):
+        tracks.append((radio, info.title))
+
+    async with ScoreboardClient() as client:
+        watcher = IcyWatcher(client, on_track)
+        urls = {'icy': f'{icy_server}/icy?', 'plain': f'{icy_server}/plain?'}
+        watcher.watch(urls, urls.get)
+        assert watcher.covers('icy') and watcher.covers('plain')
+        for _ in range(100):
+            if len(tracks) == 2 and not watcher.covers('plain'):
+                break
+            await asyncio.sleep(0.01)
+        assert tracks == [('icy', '1'), ('icy', '2')]
+        assert watcher.covers('icy') and watcher.live == 1
+        assert not watcher.covers('plain')
+
+        watcher.watch(['plain'], urls.get)
+        assert not watcher.covers('icy') and watcher.live == 0
+        await watcher.close()
+
+
+def test_music_info_is_hashable():
+    """Test equal tracks have equal hash"""
+    assert len({track('first'), track('first'), track('second')}) == 2
+
+
+def test_parse_samcloud():
+    """Test samcloud response is parsed and invalid one is rejected"""
+    info = parse_samcloud(SAMCLOUD_PAYLOAD)
+    assert (info.artist, info.title, info.duration) == ('YOASOBI', 'Idol', '03:33.120')
+    assert parse_samcloud(SAMCLOUD_PAYLOAD.decode()) == info
+    assert parse_samcloud(b'{"m_Item2": null}') is None
+    assert parse_samcloud(b'{"m_Item2": ') is None
+    assert parse_samcloud(b'<html></html>') is None
+
+
+def test_json_path():
+    """Test dotted path walks dicts and lists"""
+    content = {'now': [{'title': 'song'}]}
+    assert json_path(content, 'now.0.title') == 'song'
+    assert json_path(content, 'now.1.title') is None
+    assert json_path(content, 'now.title') is None
+
+
+def test_registry_parse():
+    """Test every provider parses its recorded response"""
+    registry = ProviderRegistry(None)
+    info = registry.get('jsonpath').parse(JSONPATH_PAYLOAD, JSONPATH_OPTIONS)
+    assert info == MusicInfo(artist='Aimer', title='Zankyosanka', duration='03:05.500')
+    assert registry.get('jsonpath').parse(b'{}', JSONPATH_OPTIONS) is None
+    assert registry.get('samcloud').parse(SAMCLOUD_PAYLOAD, {}).title == 'Idol'
+    assert registry.get('icy').parse(ICY_BLOCK, {}).title == 'KICK BACK'
+    assert registry.get('unknown') is None
+
+
+@pytest.mark.asyncio
+async def test_registry_now_playing(icy_server):
+    """Test station is polled by its stored provider"""
+    station = Station(RADIO, StationAddress(f'{icy_server}/icy', {}),
+                      StationScoreboardAddress(f'{icy_server}/plain', {}))
+    assert default_provider(station).kind == 'samcloud'
+    async with ScoreboardClient() as client:
+        registry = ProviderRegistry(client)
+        assert (await registry.now_playing(station, StationProvider('icy'))).title == '1'
+        assert await registry.now_playing(station) is None
+        assert await registry.now_playing(station, StationProvider('unknown')) is None
+
+
+def test_registry_icy_url():
+    """Test only stations with ICY provider are watched for metadata"""
+    stream = StationAddress('http://radio.com/stream', {})
+    scoreboard = StationScoreboardAddress('http://radio.com/scoreboard', {})
+    registry = ProviderRegistry(None)
+    assert registry.icy_url(Station(RADIO, stream, None)) == 'http://radio.com/stream?'
+    assert registry.icy_url(Station(RADIO, stream, scoreboard)) is None
+    assert registry.icy_url(Station(RADIO, stream, scoreboard),
+                            StationProvider('icy')) == 'http://radio.com/stream?'
+    assert registry.icy_url(Station(RADIO, stream, None), StationProvider('jsonpath')) is None
+    assert registry.icy_url(Station(RADIO, None, None)) is None
+
+
+class FakeEndpoint:  # pylint: disable=too-few-public-methods
+    """Scoreboard request which counts calls and gives preset result"""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.result: MusicInfo | Exception | None = track('first')
+
+    async def request(self) -> MusicInfo | None:
+        """Requested by breaker"""
+        self.calls += 1
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_and_serves_stale_track():
+    """Test broken endpoint isn't requested and last track is still given"""
+    now = [0.0]
+    breakers = CircuitBreakers(threshold=2, delay=10, delay_max=15, clock=lambda: now[0])
+    endpoint = FakeEndpoint()
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+
+    endpoint.result = None
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+    assert breakers.endpoints[RADIO].state == CLOSED
+    endpoint.result = asyncio.TimeoutError()
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+    assert breakers.endpoints[RADIO].state == OPEN
+
+    calls = endpoint.calls
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+    assert endpoint.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_breaker_half_open_probe():
+    """Test one probe after delay, failed probe doubles delay and success closes"""
+    now = [0.0]
+    breakers = CircuitBreakers(threshold=1, delay=10, delay_max=15, clock=lambda: now[0])
+    endpoint = FakeEndpoint()
+    endpoint.result = None
+    await breakers.call(RADIO, endpoint.request)
+    assert breakers.endpoints[RADIO].state == OPEN
+
+    now[0] = 10
+    assert breakers.allow(RADIO)
+    assert breakers.endpoints[RADIO].state == HALF_OPEN
+    assert not breakers.allow(RADIO)
+    breakers.failure(RADIO, 'still broken')
+    assert breakers.endpoints[RADIO].retry_at == 25
+
+    now[0] = 25
+    endpoint.result = track('second')
+    assert await breakers.call(RADIO, endpoint.request) == track('second')
+    health = breakers.endpoints[RADIO]
+    assert (health.state, health.failures, health.delay) == (CLOSED, 0, 10)
+
+
+@pytest.mark.asyncio
+async def test_breaker_probe_error():
+    """Test half-open probe failed by parse error reopens breaker and keeps stale track"""
+    now = [0.0]
+    breakers = CircuitBreakers(threshold=1, delay=10, delay_max=15, clock=lambda: now[0])
+    endpoint = FakeEndpoint()
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+    endpoint.result = None
+    await breakers.call(RADIO, endpoint.request)
+
+    now[0] = 10
+    endpoint.result = KeyError('title')
+    assert await breakers.call(RADIO, endpoint.request) == track('first')
+    health = breakers.endpoints[RADIO]
+    assert (health.state, health.retry_at) == (OPEN, 25)
+    assert health.last_error == "KeyError('title')"
+    now[0] = 25
+    assert breakers.allow(RADIO)
+
+
+@pytest.mark.asyncio
+async def test_track_state(tmp_path):
+    """Test database is written only on track change and state survives restart"""
+    connector = Connect(SQLite(db_path=str(tmp_path / 'state.db')))
+    connector.set_radio(RADIO, 'http://radio.com/', {})
+    writes = []
+    upsert = connector.upsert_scoreboard
+    connector.upsert_scoreboard = lambda *args: writes.append(args) or upsert(*args)
+
+    database = AsyncConnect(connector)
+    state = TrackState(database)
+    await state.load()
+    assert await state.update(RADIO, track('first'))
+    assert not await state.update(RADIO, track('first'))
+    assert writes == [(RADIO, repr(track('first')))]
+    assert await state.update(RADIO, track('second'))
+    assert len(writes) == 2
+    assert connector.get_last_scoreboard(RADIO) == repr(track('second'))
+    assert connector.get_current_scoreboard(RADIO) == repr(track('second'))
+
+    restarted = TrackState(database)
+    await restarted.load()
+    assert not await restarted.update(RADIO, track('second'))
+    assert len(writes) == 2
+    await database.close()
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_concurrency_and_buckets():
+    """Test buckets are sent in parallel up to limit and one at a time per bucket"""
+    dispatcher = NotificationDispatcher(concurrency=2)
+    running = []
+    peak = {'total': 0, 'bucket': 0}
+    sent = []
+
+    async def send(bucket, message):
+        running.append(bucket)
+        peak['total'] = max(peak['total'], len(running))
+        peak['bucket'] = max(peak['bucket'], running.count(bucket))
+        await asyncio.sleep(0.01)
+        running.remove(bucket)
+        sent.append(message)
+
+    for bucket in range(4):
+        dispatcher.submit(bucket, lambda bucket=bucket: send(bucket, f'{bucket}-a'))
+    await asyncio.sleep(0)
+    dispatcher.submit(0, lambda: send(0, '0-b'))
+    await dispatcher.join()
+    assert sorted(sent) == ['0-a', '0-b', '1-a', '2-a', '3-a']
+    assert peak == {'total': 2, 'bucket': 1}
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_drops_superseded():
+    """Test waiting notification is replaced by newer one"""
+    dispatcher = NotificationDispatcher(concurrency=1)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    dispatcher.submit(1, lambda: send('blocker'))
+    dispatcher.submit(2, lambda: send('old'))
+    dispatcher.submit(2, lambda: send('new'))
+    assert dispatcher.queued == 2
+    await dispatcher.join()
+    assert sent == ['blocker', 'new']
+    assert dispatcher.queued == 0
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_survives_error():
+    """Test failed notification is logged and next one of the bucket is still sent"""
+    dispatcher = NotificationDispatcher(concurrency=1)
+    sent = []
+    release = asyncio.Event()
+
+    async def send(message):
+        if message == 'bad':
+            await release.wait()
+            raise TypeError('bad payload')
+        sent.append(message)
+
+    dispatcher.submit(1, lambda: send('bad'))
+    await asyncio.sleep(0)
+    dispatcher.submit(1, lambda: send('good'))
+    release.set()
+    await dispatcher.join()
+    assert sent == ['good']
@@ -0,0 +1,83 @@
+"""
+Micro-benchmark of SQLite engine queries.
+Run as "python -m tests.sqlite_bench"
+"""
+import sqlite3
+import tempfile
+import time
+
+from db.database import Connect
+from db.engine import SQLite
+from my_types.radio import Station, StationAddress, StationScoreboardAddress
+
+QUERIES = 2000
+RADIO = 'bench'
+STATIONS = 1000
+
+
+class ConnectPerQuery(SQLite):  # pylint: disable=too-few-public-methods
+    """SQLite engine as it was before: new connection for every statement"""
+
+    def __init__(self, db_path: str) -> None:
+        super().__init__(db_path)
+        self.path = db_path
+
+    def execute(self, cmd, data=(), method=""):
+        with sqlite3.connect(self.path) as connect:
+            cursor = connect.execute(cmd, data or ())
+            if method == "fetchone":
+                return cursor.fetchone()
+            if method == "fetchall":
+                return cursor.fetchall()
+            return cursor.lastrowid
+
+
+def queries_per_second(query) -> float:
+    """Count how many queries run per second"""
+    started = time.perf_counter()
+    for index in range(QUERIES):
+        query(index)
+    return QUERIES / (time.perf_counter() - started)
+
+
+def report(name: str, connector: Connect) -> None:
+    """Print queries/sec of scoreboard read and write"""
+    connector.set_radio(RADIO, 'http://radio.com/', {}, 'http://scoreboard.com/', {})
+    connector.set_current_scoreboard(RADIO, '')
+    reads = queries_per_second(lambda _: connector.get_current_scoreboard(RADIO))
+    writes = queries_per_second(
+        lambda index: connector.update_current_scoreboard(RADIO, str(index)))
+    print(f'{name:<24}read {reads:>10.0f} queries/sec   write {writes:>10.0f} queries/sec')
+    connector.close()
+
+
+def report_import(db_path: str) -> None:
+    """Print time of catalog import station by station and in one batch"""
+    stations = [Station(f'station {index}', StationAddress('http://radio.com/', {}),
+                        StationScoreboardAddress('http://scoreboard.com/', {'format': 'json'}))
+                for index in range(STATIONS)]
+    connector = Connect(SQLite(db_path))
+    started = time.perf_counter()
+    for station in stations[:STATIONS // 2]:
+        connector.set_radio(station.name, station.station_address.url,
+                            station.station_address.params, station.scoreboard_address.url,
+                            station.scoreboard_address.params)
+    one_by_one = time.perf_counter() - started
+    started = time.perf_counter()
+    connector.set_radios(stations[STATIONS // 2:])
+    batch = time.perf_counter() - started
+    print(f'import {STATIONS // 2} stations   set_radio {one_by_one:.3f} s   '
+          f'set_radios {batch:.3f} s')
+    connector.close()
+
+
+def main():
+    """Print queries/sec with connection per query and with persistent connection"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report('connection per query', Connect(ConnectPerQuery(f'{temp_dir}/old.db')))
+        report('persistent connection', Connect(SQLite(f'{temp_dir}/new.db')))
+        report_import(f'{temp_dir}/import.db')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Micro-benchmark of PCM volume scaling.
+Run as "python -m tests.volume_bench"
+"""
+import time
+
+import numpy
+from discord import AudioSource, PCMVolumeTransformer
+from discord.opus import Encoder as OpusEncoder
+
+from audio.volume import VolumeTransformer
+
+FRAMES = 20000
+
+
+class LoopSource(AudioSource):
+    """Endless PCM source with one random frame"""
+
+    def __init__(self) -> None:
+        generator = numpy.random.default_rng(0)
+        self.frame = generator.integers(
+            -32768, 32767, OpusEncoder.FRAME_SIZE // 2, dtype=numpy.int16).tobytes()
+
+    def read(self) -> bytes:
+        return self.frame
+
+
+def frames_per_second(source: AudioSource, change_volume: bool = False) -> float:
+    """Count how many frames source reads per second"""
+    started = time.perf_counter()
+    for index in range(FRAMES):
+        if change_volume:
+            source.volume = 0.5 if index % 2 else 0.6
+        source.read()
+    return FRAMES / (time.perf_counter() - started)
+
+
+def main():
+    """Print frames/sec of discord PCMVolumeTransformer and VolumeTransformer"""
+    cases = (
+        ('PCMVolumeTransformer 100%', PCMVolumeTransformer(LoopSource(), 1.0), False),
+        ('PCMVolumeTransformer 50%', PCMVolumeTransformer(LoopSource(), 0.5), False),
+        ('PCMVolumeTransformer 150%', PCMVolumeTransformer(LoopSource(), 1.5), False),
+        ('VolumeTransformer 100%', VolumeTransformer(LoopSource(), 1.0), False),
+        ('VolumeTransformer 50%', VolumeTransformer(LoopSource(), 0.5), False),
+        ('VolumeTransformer 150%', VolumeTransformer(LoopSource(), 1.5), False),
+        ('VolumeTransformer ramp', VolumeTransformer(LoopSource(), 0.5), True),
+    )
+    for name, source, change_volume in cases:
+        print(f'{name:<28}{frames_per_second(source, change_volume):>12.0f} frames/sec')
+
+
+if __name__ == '__main__':
+    main()